@@ -6,13 +6,18 @@ import os
 import json
 from config import Config
 from utils.decorators import login_required, role_required, permission_required
-from utils.db import get_db, init_db
+from utils.db import get_db, init_db, init_app as init_db_app
+from utils.assets import init_app as init_assets
+from utils.fragment_cache import init_app as init_fragment_cache
 from utils.rbac import check_permission
 from routes.auth import auth_bp
 from routes.user import user_bp
 from routes.officer import officer_bp
 from routes.admin import admin_bp
 from routes.api import api_bp
+from services.overdue import get_sweeper
+from services.reports import get_refresher
+from services.reconcile import payment_reference
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -27,25 +32,15 @@ def format_number(value):
     except (ValueError, TypeError):
         return str(value)
 
-def from_json(value):
-    """Convert JSON string to Python object"""
-    if value is None or value == '':
-        return []
-    try:
-        return json.loads(value)
-    except (json.JSONDecodeError, TypeError):
-        if isinstance(value, list):
-            return value
-        if isinstance(value, str):
-            return [item.strip() for item in value.split(',') if item.strip()]
-        return value
-
 # Register filters
 app.jinja_env.filters['format_number'] = format_number
-app.jinja_env.filters['fromjson'] = from_json
+app.jinja_env.filters['payment_reference'] = payment_reference
 
 # Initialize database
 init_db()
+init_db_app(app)
+init_fragment_cache(app)
+init_assets(app)
 
 # Register blueprints
 app.register_blueprint(auth_bp)
@@ -54,6 +49,12 @@ app.register_blueprint(officer_bp)
 app.register_blueprint(admin_bp)
 app.register_blueprint(api_bp)
 
+# Start (or, after a fork, restart) this process's overdue sweeper
+@app.before_request
+def start_background_jobs():
+    get_sweeper()
+    get_refresher()
+
 @app.route('/')
 def home():
     return render_template('index.html')
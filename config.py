@@ -3,11 +3,96 @@ from datetime import timedelta
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    DATABASE = 'traffic_system.db'
+    DATABASE = os.environ.get('DATABASE') or 'traffic_system.db'
+    
+    # SQLite connection pool and pragma tuning
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    DB_JOURNAL_MODE = os.environ.get('DB_JOURNAL_MODE', 'WAL')
+    DB_SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')
+    DB_CACHE_SIZE = int(os.environ.get('DB_CACHE_SIZE', -16000))  # negative = KiB, so 16 MB
+    DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 128 * 1024 * 1024))
+    DB_BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', 5000))  # milliseconds
+    DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 256))
+    
+    # How often each process re-checks traffic_laws for edits made elsewhere
+    RULES_REFRESH_SECONDS = float(os.environ.get('RULES_REFRESH_SECONDS', 5))
+    # Answer check_violations from a precomputed decision table instead of walking the rules
+    DECISION_TABLE = os.environ.get('DECISION_TABLE', '1') != '0'
+    
+    # Repeat offenders: fine multiplier by offenses already on record for the
+    # plate or license in the rolling window, as "offenses:multiplier" steps
+    # (the highest step reached applies; empty turns escalation off)
+    REPEAT_OFFENSE_WINDOW_MONTHS = int(os.environ.get('REPEAT_OFFENSE_WINDOW_MONTHS', 12))
+    REPEAT_OFFENSE_MULTIPLIERS = os.environ.get('REPEAT_OFFENSE_MULTIPLIERS', '1:1.5,3:2,5:3')
+    
+    # Signed-in identities (user + officer row) cached per session; entries are
+    # dropped on edit in this process and expire after the TTL everywhere else
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+    IDENTITY_CACHE_TTL = float(os.environ.get('IDENTITY_CACHE_TTL', 300))
+
+    # Appeals: decision target for the SLA stats, and decisions per batch review request
+    APPEAL_SLA_HOURS = float(os.environ.get('APPEAL_SLA_HOURS', 72))
+    APPEAL_REVIEW_MAX_BATCH = int(os.environ.get('APPEAL_REVIEW_MAX_BATCH', 1000))
+    
+    # Rendered template fragments ({% cache %}, utils/fragment_cache.py): LRU entries
+    # per process (0 = off) and their TTL; compiled templates are kept in JINJA_CACHE_DIR
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 2000))
+    FRAGMENT_CACHE_TTL = float(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+    JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(DATABASE)), 'jinja_cache'))
+    
+    # Static assets fingerprinted and precompressed by `python -m utils.assets`
+    # (paths under static/), and how long browsers may keep them
+    ASSETS = tuple(os.environ.get('ASSETS', 'app.js,css/base.css').split(','))
+    ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', 365 * 24 * 3600))  # seconds
+    
+    # Overdue sweeper (services/overdue.py): unpaid fines older than the grace
+    # period become overdue; one run per interval (0 = off), in chunked transactions
+    OVERDUE_GRACE_DAYS = float(os.environ.get('OVERDUE_GRACE_DAYS', 30))
+    OVERDUE_SWEEP_INTERVAL = float(os.environ.get('OVERDUE_SWEEP_INTERVAL', 3600))  # seconds
+    OVERDUE_SWEEP_CHUNK = int(os.environ.get('OVERDUE_SWEEP_CHUNK', 500))
+    OVERDUE_SWEEP_PAUSE_MS = float(os.environ.get('OVERDUE_SWEEP_PAUSE_MS', 20))
+    
+    # Records persisted per transaction by /api/violations/batch
+    BATCH_COMMIT_SIZE = int(os.environ.get('BATCH_COMMIT_SIZE', 500))
+    
+    # Rows per page on list views (?limit= is capped at MAX_PAGE_SIZE)
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 200))
+    
+    # Each process refreshes dirty report days in the background this often
+    # (0 = off, leaving it to `python -m services.reports`)
+    REPORTS_REFRESH_INTERVAL = float(os.environ.get('REPORTS_REFRESH_INTERVAL', 60))  # seconds
+    
+    # Group-commit writer for single violation inserts (services/writer.py)
+    WRITER_DURABILITY = os.environ.get('WRITER_DURABILITY', 'normal')  # full | normal | async
+    WRITER_MAX_BATCH = int(os.environ.get('WRITER_MAX_BATCH', 256))
+    WRITER_MAX_DELAY_MS = float(os.environ.get('WRITER_MAX_DELAY_MS', 1))
+    WRITER_QUEUE_SIZE = int(os.environ.get('WRITER_QUEUE_SIZE', 2048))
+    WRITER_ENQUEUE_TIMEOUT = float(os.environ.get('WRITER_ENQUEUE_TIMEOUT', 2))  # seconds before WriterBusy
+    WRITER_COMMIT_TIMEOUT = float(os.environ.get('WRITER_COMMIT_TIMEOUT', 10))  # seconds waiting for the commit
+    
+    # Notification pipeline (services/notifications.py): batched inserts, SSE push
+    NOTIFY_MAX_BATCH = int(os.environ.get('NOTIFY_MAX_BATCH', 256))
+    NOTIFY_MAX_DELAY_MS = float(os.environ.get('NOTIFY_MAX_DELAY_MS', 50))
+    NOTIFY_QUEUE_SIZE = int(os.environ.get('NOTIFY_QUEUE_SIZE', 4096))  # further notifications are dropped
+    NOTIFY_SUBSCRIBER_QUEUE = int(os.environ.get('NOTIFY_SUBSCRIBER_QUEUE', 100))  # events buffered per stream
+    NOTIFY_HEARTBEAT_SECONDS = float(os.environ.get('NOTIFY_HEARTBEAT_SECONDS', 15))
+    # Open streams each hold a worker thread (see gunicorn.conf.py); past these
+    # limits /api/notifications/stream answers 429 and the page polls instead
+    NOTIFY_MAX_STREAMS = int(os.environ.get('NOTIFY_MAX_STREAMS', 16))  # per process, keep below GUNICORN_THREADS
+    NOTIFY_MAX_STREAMS_PER_USER = int(os.environ.get('NOTIFY_MAX_STREAMS_PER_USER', 2))
+    NOTIFY_POLL_SECONDS = int(os.environ.get('NOTIFY_POLL_SECONDS', 60))
+    
+    # Audit trail (services/audit.py): buffered, one SQLite file per month in AUDIT_DIR
+    AUDIT_DIR = os.environ.get('AUDIT_DIR') or os.path.join(os.path.dirname(os.path.abspath(DATABASE)), 'audit')
+    AUDIT_MAX_BATCH = int(os.environ.get('AUDIT_MAX_BATCH', 500))
+    AUDIT_FLUSH_MS = float(os.environ.get('AUDIT_FLUSH_MS', 1000))
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))  # further entries are dropped
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_REFRESH_EACH_REQUEST = True
     
-    # Role permissions mapping
+    # Role permissions mapping; compiled to bitmasks by utils/rbac.py, where each
+    # role also inherits the permissions of every role below it in ROLE_HIERARCHY
     ROLE_PERMISSIONS = {
         'admin': ['view_all', 'manage_users', 'manage_officers', 'manage_laws', 'view_reports', 'manage_appeals', 'system_settings'],
         'officer': ['view_violations', 'create_violations', 'manage_own_violations', 'view_assigned_cases'],
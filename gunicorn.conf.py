@@ -0,0 +1,12 @@
+"""Gunicorn settings, read from the working directory by `gunicorn app:app`.
+
+/api/notifications/stream keeps a request open for as long as a page is, so
+sync workers (one request each) would be used up by open tabs. gthread workers
+run every request on a thread of their own; Config.NOTIFY_MAX_STREAMS keeps
+the streams to a part of those threads.
+"""
+import os
+
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
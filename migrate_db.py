@@ -1,124 +1,87 @@
 # migrate_db.py
+"""Apply pending schema migrations to the configured database.
+
+    python migrate_db.py                   # migrate Config.DATABASE
+    python migrate_db.py --database x.db   # migrate another file
+    python migrate_db.py --status          # list applied/pending migrations
+    python migrate_db.py --check-plans     # EXPLAIN the hot queries, fail on full scans
+    python migrate_db.py --rebuild-stats   # recompute violation_stats from violation_records
+    python migrate_db.py --rebuild-offenses  # recompute the repeat-offender counters
+    python migrate_db.py --rebuild-unread    # recompute the unread notification counts
+"""
+import argparse
 import sqlite3
-import os
+import sys
+from config import Config
+from utils.migrations import MIGRATIONS, get_schema_version, run_migrations, check_query_plans
+
+
+def print_status(conn):
+    current = get_schema_version(conn)
+    for version, description, _ in MIGRATIONS:
+        state = 'applied' if version <= current else 'pending'
+        print(f"{version:>4}  {state:<8} {description}")
 
-def migrate_database():
-    """Add missing columns to existing database"""
-    
-    # Your database is likely named 'traffic_law.db' or similar
-    # Check what database file exists
-    possible_db_files = ['traffic_law.db', 'instance/traffic_law.db', 'traffic_law_expert.db']
-    
-    db_file = None
-    for file in possible_db_files:
-        if os.path.exists(file):
-            db_file = file
-            break
-    
-    if not db_file:
-        # Check for any .db file in current directory
-        for file in os.listdir('.'):
-            if file.endswith('.db'):
-                db_file = file
-                break
-    
-    if not db_file:
-        print("No database file found!")
-        print("Looking for: traffic_law.db, instance/traffic_law.db, or any .db file")
-        return
-    
-    print(f"Found database: {db_file}")
-    print("Connecting to database...")
-    
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
-    
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply pending schema migrations')
+    parser.add_argument('--database', default=Config.DATABASE, help='SQLite file (default: %(default)s)')
+    parser.add_argument('--target', type=int, help='stop after this migration version')
+    parser.add_argument('--status', action='store_true', help='show migration status and exit')
+    parser.add_argument('--check-plans', action='store_true',
+                        help='verify the indexed query shapes do not fall back to full scans')
+    parser.add_argument('--rebuild-stats', action='store_true',
+                        help='recompute the violation_stats summary table from violation_records')
+    parser.add_argument('--rebuild-offenses', action='store_true',
+                        help='recompute offense_counters (repeat offenders) from violation_records')
+    parser.add_argument('--rebuild-unread', action='store_true',
+                        help='recompute notification_unread from notifications')
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.database)
     try:
-        # Check if violation_records table exists
+        cursor = conn.cursor()
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='violation_records'")
         if not cursor.fetchone():
-            print("violation_records table doesn't exist!")
-            print("You need to run the application first to create the tables.")
-            return
-        
-        # Check current table structure
-        cursor.execute("PRAGMA table_info(violation_records)")
-        columns = cursor.fetchall()
-        
-        print("\nCurrent table structure:")
-        print("Column Name | Type")
-        print("-" * 30)
-        for col in columns:
-            print(f"{col[1]:<12} | {col[2]}")
-        
-        # Check for driver_name column
-        column_names = [col[1] for col in columns]
-        
-        if 'driver_name' not in column_names:
-            print("\n✗ Missing 'driver_name' column!")
-            print("Adding driver_name column...")
-            cursor.execute('ALTER TABLE violation_records ADD COLUMN driver_name TEXT')
-            print("✓ Column 'driver_name' added successfully!")
-        else:
-            print("\n✓ 'driver_name' column already exists")
-        
-        # Check other important columns
-        missing_columns = []
-        important_columns = [
-            ('license_number', 'TEXT'),
-            ('plate_number', 'TEXT'), 
-            ('vehicle_type', 'TEXT'),
-            ('has_helmet', 'TEXT'),
-            ('speed', 'INTEGER'),
-            ('has_license', 'TEXT'),
-            ('violations', 'TEXT'),
-            ('total_fine', 'INTEGER')
-        ]
-        
-        for col_name, col_type in important_columns:
-            if col_name not in column_names:
-                missing_columns.append((col_name, col_type))
-        
-        if missing_columns:
-            print(f"\nFound {len(missing_columns)} missing columns:")
-            for col_name, col_type in missing_columns:
-                print(f"  - {col_name} ({col_type})")
-            
-            print("\nAdding missing columns...")
-            for col_name, col_type in missing_columns:
-                try:
-                    cursor.execute(f'ALTER TABLE violation_records ADD COLUMN {col_name} {col_type}')
-                    print(f"✓ Added {col_name} column")
-                except Exception as e:
-                    print(f"✗ Error adding {col_name}: {e}")
+            print(f"{args.database}: violation_records table doesn't exist, run the application first")
+            return 1
+
+        if args.status:
+            print_status(conn)
+            return 0
+
+        if args.check_plans:
+            failures = check_query_plans(conn)
+            for name, plan in failures.items():
+                print(f"✗ {name}: {' / '.join(plan)}")
+            print(f"{len(failures)} query shape(s) fall back to a scan" if failures else "✓ All query shapes use indexes")
+            return 1 if failures else 0
+
+        applied = run_migrations(conn, target=args.target)
+        if applied:
+            print(f"✓ Applied migration(s) {', '.join(map(str, applied))} to {args.database}")
         else:
-            print("\n✓ All important columns are present")
-        
-        conn.commit()
-        print("\n" + "="*50)
-        print("✓ MIGRATION COMPLETED SUCCESSFULLY!")
-        print("="*50)
-        
-    except Exception as e:
-        print(f"\n✗ ERROR: {e}")
-        conn.rollback()
+            print(f"✓ {args.database} is up to date (version {get_schema_version(conn)})")
+
+        if args.rebuild_stats:
+            from models.violation_stats import ViolationStats
+            ViolationStats.rebuild(conn)
+            conn.commit()
+            print(f"✓ Rebuilt violation_stats in {args.database}")
+        if args.rebuild_offenses:
+            from models.offense_counters import OffenseCounters
+            OffenseCounters.rebuild(conn)
+            conn.commit()
+            print(f"✓ Rebuilt offense_counters in {args.database}")
+        if args.rebuild_unread:
+            from models.notification import Notification
+            Notification.rebuild_unread(conn)
+            conn.commit()
+            print(f"✓ Rebuilt notification_unread in {args.database}")
+        return 0
     finally:
         conn.close()
 
+
 if __name__ == "__main__":
-    print("="*50)
-    print("DATABASE MIGRATION TOOL")
-    print("="*50)
-    print("\nThis tool will fix the 'driver_name' column issue.")
-    print("\nPress Enter to continue or Ctrl+C to cancel...")
-    
-    try:
-        input()
-        migrate_database()
-    except KeyboardInterrupt:
-        print("\n\nMigration cancelled by user.")
-    except Exception as e:
-        print(f"\nError: {e}")
-    
-    print("\nPress Enter to exit...")
-    input()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import math
+from models.violation_items import ViolationItems
+from utils.db import get_db
+from utils.pagination import Page, encode_key
+
+DECISIONS = {'approve': 'approved', 'reject': 'rejected'}
+
+# appeals.fine is the fine under appeal: copied from the violation when the
+# appeal is filed, kept in step while it is pending, and frozen once decided.
+# It lets the triage queue (biggest fine first, then oldest) come straight off
+# a partial index of pending appeals instead of joining every violation.
+_QUEUE_SELECT = '''
+    SELECT a.id, a.violation_id, a.user_id, a.reason, a.status, a.fine, a.created_at,
+           u.username, vr.driver_name, vr.plate_number, vr.violations
+    FROM appeals a
+    LEFT JOIN users u ON a.user_id = u.id
+    LEFT JOIN violation_records vr ON a.violation_id = vr.id
+    WHERE a.status = 'pending'
+'''
+
+
+def schema_statements():
+    """Queue and SLA indexes plus the triggers keeping appeals.fine (current schema; migration 13 runs a frozen copy)"""
+    return [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_appeals_pending_queue
+        ON appeals (fine DESC, created_at) WHERE status = 'pending'
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_appeals_reviewed
+        ON appeals (reviewed_at) WHERE reviewed_at IS NOT NULL
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS appeals_fine_insert AFTER INSERT ON appeals WHEN NEW.fine IS NULL
+        BEGIN
+            UPDATE appeals SET fine = COALESCE((SELECT total_fine FROM violation_records WHERE id = NEW.violation_id), 0)
+            WHERE id = NEW.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS appeals_fine_sync AFTER UPDATE OF total_fine ON violation_records
+        BEGIN
+            UPDATE appeals SET fine = COALESCE(NEW.total_fine, 0) WHERE violation_id = NEW.id AND status = 'pending';
+        END
+        ''',
+    ]
+
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class Appeal:
+    @staticmethod
+    def backfill_fines(cursor):
+        """Set fine on appeals from before migration 13; the caller commits"""
+        cursor.execute('''
+            UPDATE appeals
+            SET fine = COALESCE((SELECT total_fine FROM violation_records WHERE id = appeals.violation_id), 0)
+            WHERE fine IS NULL
+        ''')
+
+    @staticmethod
+    def queue(after=None, limit=50):
+        """One page of pending appeals, largest fine first and oldest first within a fine.
+
+        after is the (fine, created_at, id) key of the last row already shown.
+        """
+        conn = get_db()
+        cursor = conn.cursor()
+        sql, params = _QUEUE_SELECT, []
+        if after:
+            sql += ' AND a.fine <= ?1 AND (a.fine < ?1 OR (a.fine = ?1 AND (a.created_at, a.id) > (?2, ?3)))'
+            params.extend(after)
+        cursor.execute(sql + f' ORDER BY a.fine DESC, a.created_at, a.id LIMIT ?{len(params) + 1}',
+                       params + [limit + 1])
+        rows = cursor.fetchall()
+        conn.close()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        last = rows[-1] if rows else None
+        return Page(rows, limit, next_cursor=encode_key(last['fine'], last['created_at'], last['id']) if more else None)
+
+    @staticmethod
+    def review(decisions, reviewer_id):
+        """Decide pending appeals and update their violations, all in one transaction.
+
+        decisions is a list of {'id', 'decision': 'approve'|'reject', 'response',
+        'fine'}. Approving without a fine dismisses the violation and clears its
+        fine; approving with a fine (below the current one) only reduces it.
+        Either way its violation_items are scaled to the new fine. A paid
+        violation cannot be approved (ValueError): its fine was settled and
+        would need a refund. Rejecting leaves the violation as it is. Appeals
+        that are missing or no longer pending are skipped. Returns {'decided': [row, ...], 'skipped': [id, ...]}
+        where each row has the appeal's id, user_id, violation_id and new status.
+        """
+        by_id = {}
+        for decision in decisions:
+            appeal_id = decision.get('id')
+            if not isinstance(appeal_id, int) or decision.get('decision') not in DECISIONS:
+                raise ValueError('each decision needs an integer "id" and "decision": "approve" or "reject"')
+            fine = decision.get('fine')
+            if fine is not None and (not isinstance(fine, int) or fine < 0):
+                raise ValueError(f'appeal {appeal_id}: "fine" must be a non-negative integer')
+            by_id[appeal_id] = decision
+        if not by_id:
+            return {'decided': [], 'skipped': []}
+
+        conn = get_db()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'''
+                SELECT a.id, a.user_id, a.violation_id, a.fine, vr.payment_status FROM appeals a
+                LEFT JOIN violation_records vr ON vr.id = a.violation_id
+                WHERE a.status = 'pending' AND a.id IN ({', '.join('?' * len(by_id))})
+            ''', list(by_id))
+            pending = {row['id']: row for row in cursor.fetchall()}
+
+            appeal_updates, violation_updates, decided = [], [], []
+            for appeal_id, row in pending.items():
+                decision = by_id[appeal_id]
+                status = DECISIONS[decision['decision']]
+                appeal_updates.append((status, decision.get('response'), reviewer_id, appeal_id))
+                if status == 'approved' and row['violation_id'] is not None:
+                    fine = decision.get('fine')
+                    if fine is not None and fine > (row['fine'] or 0):
+                        raise ValueError(f'appeal {appeal_id}: "fine" cannot exceed the fine under appeal')
+                    if row['payment_status'] == 'paid':
+                        raise ValueError(f'appeal {appeal_id}: the violation is already paid; refund it first')
+                    violation_updates.append((fine or 0, row['violation_id']))
+                decided.append({'id': appeal_id, 'user_id': row['user_id'],
+                                'violation_id': row['violation_id'], 'status': status})
+
+            # Appeals first, so the fine sync trigger leaves the decided ones alone
+            cursor.executemany('''
+                UPDATE appeals
+                SET status = ?, officer_response = ?, reviewed_by = ?, reviewed_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', appeal_updates)
+            # Items follow the fine, so per-law totals still add up to total_fine.
+            # The violation update marks its report day dirty (services/reports.py
+            # triggers), and the law rollup is then recomputed from these items.
+            ViolationItems.rescale(cursor, {violation_id: fine for fine, violation_id in violation_updates})
+            cursor.executemany('''
+                UPDATE violation_records
+                SET total_fine = ?1, status = CASE WHEN ?1 = 0 THEN 'dismissed' ELSE status END
+                WHERE id = ?2
+            ''', violation_updates)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return {'decided': decided, 'skipped': [appeal_id for appeal_id in by_id if appeal_id not in pending]}
+
+    @staticmethod
+    def sla_stats(days=30, sla_hours=72):
+        """Pending backlog and time-to-decision for appeals decided in the last days"""
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*) as pending, COALESCE(SUM(fine), 0) as pending_fines, MIN(created_at) as oldest,
+                   COALESCE(SUM(created_at < datetime('now', ?)), 0) as over_sla
+            FROM appeals WHERE status = 'pending'
+        ''', (f'-{sla_hours} hours',))
+        backlog = cursor.fetchone()
+        cursor.execute('''
+            SELECT status, (julianday(reviewed_at) - julianday(created_at)) * 24 as hours
+            FROM appeals
+            WHERE reviewed_at IS NOT NULL AND reviewed_at >= datetime('now', ?)
+        ''', (f'-{days} days',))
+        decided = cursor.fetchall()
+        oldest_hours = None
+        if backlog['oldest']:
+            cursor.execute("SELECT (julianday('now') - julianday(?)) * 24", (backlog['oldest'],))
+            oldest_hours = cursor.fetchone()[0]
+        conn.close()
+
+        hours = sorted(row['hours'] for row in decided if row['hours'] is not None)
+        approved = sum(1 for row in decided if row['status'] == 'approved')
+        return {
+            'sla_hours': sla_hours,
+            'days': days,
+            'pending': backlog['pending'],
+            'pending_fines': backlog['pending_fines'],
+            'pending_over_sla': backlog['over_sla'],
+            'oldest_pending_hours': round(oldest_hours, 1) if oldest_hours is not None else None,
+            'decided': len(decided),
+            'approved': approved,
+            'rejected': len(decided) - approved,
+            'approval_rate': round(approved / len(decided), 3) if decided else None,
+            'hours_to_decision': {
+                'avg': round(sum(hours) / len(hours), 1) if hours else None,
+                'p50': round(_percentile(hours, 0.5), 1) if hours else None,
+                'p90': round(_percentile(hours, 0.9), 1) if hours else None,
+                'max': round(hours[-1], 1) if hours else None,
+            },
+            'decided_within_sla': round(sum(1 for h in hours if h <= sla_hours) / len(hours), 3) if hours else None,
+        }
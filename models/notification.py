@@ -0,0 +1,107 @@
+from utils.db import get_db
+
+# Unread notifications per user, kept by the triggers below (migration 12) so
+# an unread badge is one primary-key read, never a COUNT(*) over notifications.
+UNREAD = "{row}.user_id IS NOT NULL AND COALESCE({row}.is_read, 0) = 0"
+
+
+def schema_statements():
+    """DDL for the unread counter table and its triggers (current schema; migration 12 runs a frozen copy)"""
+    add = '''
+        INSERT INTO notification_unread (user_id, unread) SELECT NEW.user_id, 1 WHERE {when}
+        ON CONFLICT (user_id) DO UPDATE SET unread = unread + 1;'''.format(when=UNREAD.format(row='NEW'))
+    remove = '''
+        UPDATE notification_unread SET unread = unread - 1
+        WHERE user_id = OLD.user_id AND {when};'''.format(when=UNREAD.format(row='OLD'))
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS notification_unread (
+            user_id INTEGER PRIMARY KEY,
+            unread INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS notification_unread_insert AFTER INSERT ON notifications
+        BEGIN {add}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS notification_unread_delete AFTER DELETE ON notifications
+        BEGIN {remove}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS notification_unread_update AFTER UPDATE OF user_id, is_read ON notifications
+        BEGIN {remove} {add}
+        END
+        ''',
+    ]
+
+
+class Notification:
+    COLUMNS = 'id, user_id, title, message, notification_type, is_read, related_id, created_at'
+
+    @staticmethod
+    def rebuild_unread(conn):
+        """Recompute notification_unread from scratch; the caller commits"""
+        conn.execute('DELETE FROM notification_unread')
+        conn.execute(f'''
+            INSERT INTO notification_unread (user_id, unread)
+            SELECT n.user_id, COUNT(*) FROM notifications n WHERE {UNREAD.format(row='n')} GROUP BY n.user_id
+        ''')
+
+    @staticmethod
+    def insert_many(cursor, notifications):
+        """Insert notification dicts in one executemany and return their ids; the caller commits.
+
+        Relies on the rows getting consecutive ids, which holds inside one
+        write transaction.
+        """
+        cursor.executemany('''
+            INSERT INTO notifications (user_id, title, message, notification_type, related_id, created_at)
+            VALUES (:user_id, :title, :message, :notification_type, :related_id, :created_at)
+        ''', notifications)
+        last_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+        return range(last_id - len(notifications) + 1, last_id + 1)
+
+    @staticmethod
+    def recent(user_id, limit=10):
+        """Newest notifications of a user"""
+        conn = get_db()
+        rows = conn.execute(f'''
+            SELECT {Notification.COLUMNS} FROM notifications
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+            LIMIT ?
+        ''', (user_id, limit)).fetchall()
+        conn.close()
+        return rows
+
+    @staticmethod
+    def since(user_id, last_id, limit=50):
+        """Notifications of a user newer than last_id, oldest first (replay for a reconnecting stream)"""
+        conn = get_db()
+        rows = conn.execute(f'''
+            SELECT {Notification.COLUMNS} FROM notifications
+            WHERE user_id = ? AND id > ?
+            ORDER BY created_at, id
+            LIMIT ?
+        ''', (user_id, last_id, limit)).fetchall()
+        conn.close()
+        return rows
+
+    @staticmethod
+    def unread(conn, user_id):
+        row = conn.execute('SELECT unread FROM notification_unread WHERE user_id = ?', (user_id,)).fetchone()
+        return max(row[0], 0) if row else 0
+
+    @staticmethod
+    def mark_read(conn, user_id, ids=None):
+        """Mark a user's notifications (all, or just ids) read; the caller commits"""
+        if ids is None:
+            conn.execute('UPDATE notifications SET is_read = 1 WHERE user_id = ? AND is_read = 0', (user_id,))
+        elif ids:
+            conn.execute(f'''
+                UPDATE notifications SET is_read = 1
+                WHERE user_id = ? AND is_read = 0 AND id IN ({', '.join('?' * len(ids))})
+            ''', (user_id, *ids))
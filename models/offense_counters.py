@@ -0,0 +1,92 @@
+from utils.db import get_db
+
+# Monthly offense counts per normalized plate and license key (the plate_key
+# and license_key columns from migration 9). The triggers created by migration
+# 10 keep one row per (kind, key, month) up to date on every violation_records
+# change, so a rolling window is at most REPEAT_OFFENSE_WINDOW_MONTHS rows of
+# the primary key per kind, however long the history is.
+KINDS = ('plate', 'license')
+
+# A record counts as an offense when it carries a fine and was not dismissed
+COUNTED = "COALESCE({row}.total_fine, 0) > 0 AND COALESCE({row}.status, '') != 'dismissed'"
+MONTH = "strftime('%Y-%m', {row}.created_at)"
+
+
+def _upserts(row, sign):
+    """Trigger body statements adding (sign=+1) or removing (-1) one row's offense"""
+    statements = []
+    for kind in KINDS:
+        statements.append(f'''
+            INSERT INTO offense_counters (kind, key, month, offenses)
+            SELECT '{kind}', {row}.{kind}_key, {MONTH.format(row=row)}, {sign}
+            WHERE {row}.{kind}_key IS NOT NULL AND {row}.created_at IS NOT NULL AND {COUNTED.format(row=row)}
+            ON CONFLICT (kind, key, month) DO UPDATE SET offenses = offenses + excluded.offenses;''')
+    return ''.join(statements)
+
+
+def schema_statements():
+    """DDL for the counter table and its triggers (current schema; migration 10 runs a frozen copy)"""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS offense_counters (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            month TEXT NOT NULL,
+            offenses INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, key, month)
+        ) WITHOUT ROWID
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS offense_counters_insert AFTER INSERT ON violation_records
+        BEGIN {_upserts('NEW', 1)}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS offense_counters_delete AFTER DELETE ON violation_records
+        BEGIN {_upserts('OLD', -1)}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS offense_counters_update
+        AFTER UPDATE OF plate_number, license_number, created_at, total_fine, status ON violation_records
+        BEGIN {_upserts('OLD', -1)} {_upserts('NEW', 1)}
+        END
+        ''',
+    ]
+
+
+class OffenseCounters:
+    @staticmethod
+    def rebuild(conn):
+        """Recompute offense_counters from scratch; the caller commits"""
+        conn.execute('DELETE FROM offense_counters')
+        for kind in KINDS:
+            conn.execute(f'''
+                INSERT INTO offense_counters (kind, key, month, offenses)
+                SELECT '{kind}', vr.{kind}_key, {MONTH.format(row='vr')}, COUNT(*)
+                FROM violation_records vr
+                WHERE vr.{kind}_key IS NOT NULL AND vr.created_at IS NOT NULL AND {COUNTED.format(row='vr')}
+                GROUP BY 2, 3
+            ''')
+
+    @staticmethod
+    def prior_offenses(plate_key=None, license_key=None, months=12):
+        """Offenses in the current calendar month and the months-1 before it.
+
+        The plate's and the license's histories overlap (one stop usually
+        counts for both), so the larger of the two is returned.
+        """
+        if plate_key is None and license_key is None:
+            return 0
+        conn = get_db()
+        row = conn.execute('''
+            SELECT
+                (SELECT COALESCE(SUM(offenses), 0) FROM offense_counters
+                 WHERE kind = 'plate' AND key = ?1 AND month >= w.since),
+                (SELECT COALESCE(SUM(offenses), 0) FROM offense_counters
+                 WHERE kind = 'license' AND key = ?2 AND month >= w.since)
+            FROM (SELECT strftime('%Y-%m', 'now', 'start of month', ?3) as since) w
+        ''', (plate_key, license_key, f'-{max(months, 1) - 1} months')).fetchone()
+        conn.close()
+        return max(row[0], row[1])
+
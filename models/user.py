@@ -1,4 +1,6 @@
 from utils.db import get_db
+from utils.identity import invalidate_user
+from utils.pagination import paginate
 from datetime import datetime
 import hashlib
 
@@ -64,6 +66,29 @@ class User:
         conn.close()
         return results
     
+    @staticmethod
+    def get_page(role=None, after=None, before=None, limit=None):
+        """One page of users, newest first, optionally filtered by role"""
+        conn = get_db()
+        cursor = conn.cursor()
+        conditions, params = (['role = ?'], [role]) if role else ([], [])
+        page = paginate(cursor, 'SELECT * FROM users', conditions, params, after, before, limit)
+        conn.close()
+        return page
+    
+    @staticmethod
+    def count(role=None):
+        """Count users, optionally filtered by role"""
+        conn = get_db()
+        cursor = conn.cursor()
+        if role:
+            cursor.execute('SELECT COUNT(*) as total FROM users WHERE role = ?', (role,))
+        else:
+            cursor.execute('SELECT COUNT(*) as total FROM users')
+        total = cursor.fetchone()['total']
+        conn.close()
+        return total
+    
     @staticmethod
     def delete(user_id):
         """Delete a user"""
@@ -72,6 +97,7 @@ class User:
         try:
             cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
             conn.commit()
+            invalidate_user(user_id)
             return True
         except Exception as e:
             conn.rollback()
@@ -99,6 +125,7 @@ class User:
             query = f'UPDATE users SET {", ".join(fields)} WHERE id = ?'
             cursor.execute(query, values)
             conn.commit()
+            invalidate_user(user_id)
             return True
         except Exception as e:
             conn.rollback()
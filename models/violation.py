@@ -1,9 +1,50 @@
 from utils.db import get_db
+from models.violation_items import ViolationItems
+from models.violation_stats import ViolationStats
+from utils.pagination import paginate
 from datetime import datetime
 
+# Columns accepted by Violation.insert_many, in insert order
+INSERT_COLUMNS = ('user_id', 'officer_id', 'driver_name', 'license_number', 'plate_number', 'vehicle_type',
+                  'has_helmet', 'speed', 'has_license', 'violations', 'total_fine', 'status',
+                  'payment_status', 'description', 'location', 'created_at')
+
+# SQL defaults applied when a record leaves the column out
+_COLUMN_DEFAULTS = {'status': "'pending'", 'payment_status': "'unpaid'", 'created_at': 'CURRENT_TIMESTAMP'}
+
+_INSERT_SQL = '''
+    INSERT INTO violation_records ({})
+    VALUES ({})
+'''.format(', '.join(INSERT_COLUMNS),
+           ', '.join(f'COALESCE(?, {_COLUMN_DEFAULTS[c]})' if c in _COLUMN_DEFAULTS else '?'
+                     for c in INSERT_COLUMNS))
+
 class Violation:
     @staticmethod
-    def create(user_id, vehicle_type, violations, total_fine, status='pending', payment_status='unpaid'):
+    def insert_many(cursor, records):
+        """Insert violation dicts with executemany on an open cursor; the caller commits.
+
+        A record's 'items' (see result_items()) go to violation_items.
+        """
+        if not records:
+            return
+        cursor.executemany(_INSERT_SQL, ([record.get(column) for column in INSERT_COLUMNS] for record in records))
+        if any(record.get('items') for record in records):
+            # Inside one write transaction the new ids are consecutive and end at last_insert_rowid()
+            last_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+            ViolationItems.insert_many(cursor, last_id - len(records) + 1, records)
+    
+    @staticmethod
+    def insert(cursor, record):
+        """Insert one violation dict (and its 'items') on an open cursor and return its id; the caller commits"""
+        cursor.execute(_INSERT_SQL, [record.get(column) for column in INSERT_COLUMNS])
+        row_id = cursor.lastrowid
+        if record.get('items'):
+            ViolationItems.insert(cursor, row_id, record['items'])
+        return row_id
+    
+    @staticmethod
+    def create(user_id, vehicle_type, violations, total_fine, status='pending', payment_status='unpaid', items=()):
         """Create a new violation record"""
         conn = get_db()
         cursor = conn.cursor()
@@ -12,8 +53,10 @@ class Violation:
                 INSERT INTO violation_records (user_id, vehicle_type, violations, total_fine, status, payment_status, created_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (user_id, vehicle_type, violations, total_fine, status, payment_status, datetime.now()))
+            row_id = cursor.lastrowid
+            ViolationItems.insert(cursor, row_id, items)
             conn.commit()
-            return cursor.lastrowid
+            return row_id
         except Exception as e:
             conn.rollback()
             raise e
@@ -42,6 +85,46 @@ class Violation:
         conn.close()
         return results
     
+    @staticmethod
+    def get_page(officer_id=None, user_id=None, law_code=None, after=None, before=None, limit=None):
+        """One page of violations, newest first, with the reporting user and officer names.
+
+        Each row is a dict carrying its violation_items as 'items'.
+        """
+        conditions, params = [], []
+        if officer_id is not None:
+            conditions.append('vr.officer_id = ?')
+            params.append(officer_id)
+        if user_id is not None:
+            conditions.append('vr.user_id = ?')
+            params.append(user_id)
+        source, extra, created, row_id = 'violation_records vr', '', 'vr.created_at', 'vr.id'
+        if law_code:
+            # Walk the law's items newest first; CROSS JOIN keeps that order
+            source = 'violation_items vi CROSS JOIN violation_records vr ON vr.id = vi.violation_id'
+            extra = ' vi.violation_id,'
+            conditions.insert(0, 'vi.law_code = ?')
+            params.insert(0, law_code)
+            created, row_id = 'vi.created_at', 'vi.violation_id'
+        conn = get_db()
+        cursor = conn.cursor()
+        page = paginate(cursor, f'''
+            SELECT vr.*,{extra}
+                   u.username, u.first_name, u.last_name,
+                   u.username as reported_by,
+                   uo.username as officer_name,
+                   uo.first_name as officer_first_name,
+                   uo.last_name as officer_last_name
+            FROM {source}
+            LEFT JOIN users u ON vr.user_id = u.id
+            LEFT JOIN officers o ON vr.officer_id = o.id
+            LEFT JOIN users uo ON o.user_id = uo.id
+        ''', conditions, params, after, before, limit, created=created, row_id=row_id)
+        conn.close()
+        items = ViolationItems.for_violations([row['id'] for row in page])
+        page.items = [dict(row, items=[dict(item) for item in items[row['id']]]) for row in page]
+        return page
+    
     @staticmethod
     def get_by_id(violation_id):
         """Get violation by ID"""
@@ -72,25 +155,12 @@ class Violation:
     
     @staticmethod
     def get_stats():
-        """Get violation statistics"""
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) as total FROM violation_records')
-        total = cursor.fetchone()['total'] or 0
-        
-        cursor.execute('SELECT SUM(total_fine) as collected FROM violation_records WHERE payment_status = "paid"')
-        collected = cursor.fetchone()['collected'] or 0
-        
-        cursor.execute('''
-            SELECT vehicle_type, COUNT(*) as count FROM violation_records
-            GROUP BY vehicle_type
-        ''')
-        by_vehicle = cursor.fetchall()
-        
-        conn.close()
+        """Get violation statistics from the trigger-maintained violation_stats table"""
+        summary = ViolationStats.summary()
+        by_vehicle = ViolationStats.breakdown('vehicle')
         return {
-            'total': total,
-            'collected': collected,
-            'by_vehicle_type': [{'vehicle_type': row['vehicle_type'], 'count': row['count']} for row in by_vehicle] if by_vehicle else []
+            'total': summary['total'],
+            'collected': summary['collected'],
+            'by_vehicle_type': [{'vehicle_type': row['key'] or None, 'count': row['count']} for row in by_vehicle],
+            'by_law': [dict(row) for row in ViolationItems.law_stats()]
         }
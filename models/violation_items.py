@@ -0,0 +1,218 @@
+import json
+import re
+from utils.db import get_db
+from utils.expert_system import SEVERITY_NAMES, SPEED_LIMIT, compile_rules, scale_fines
+
+# One row per law a violation record broke, in the order the engine reported
+# them. law_code is NULL for a legacy message no current law matches; fine and
+# severity are the law's at the time the record was written. created_at is
+# copied from the record so one index serves both the per-law totals and the
+# newest-first list of a law's records.
+_INSERT_SQL = '''
+    INSERT INTO violation_items (violation_id, position, law_code, message, fine, severity, created_at)
+    SELECT ?1, ?2, ?3, ?4, ?5, ?6, created_at FROM violation_records WHERE id = ?1
+'''
+
+
+def schema_statements():
+    """DDL for the item table, its law index and sync triggers (current schema; migration 11 runs a frozen copy)"""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS violation_items (
+            violation_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            law_code TEXT,
+            message TEXT NOT NULL,
+            fine INTEGER NOT NULL DEFAULT 0,
+            severity TEXT,
+            created_at TIMESTAMP,
+            PRIMARY KEY (violation_id, position)
+        ) WITHOUT ROWID
+        ''',
+        # Per-law counts and fine totals, and keyset pages of the records that broke a law
+        '''
+        CREATE INDEX IF NOT EXISTS idx_violation_items_law
+        ON violation_items (law_code, created_at, violation_id, fine)
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS violation_items_delete AFTER DELETE ON violation_records
+        BEGIN
+            DELETE FROM violation_items WHERE violation_id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS violation_items_created AFTER UPDATE OF created_at ON violation_records
+        BEGIN
+            UPDATE violation_items SET created_at = NEW.created_at WHERE violation_id = NEW.id;
+        END
+        ''',
+    ]
+
+
+class LawMatcher:
+    """Maps stored violation messages back to law codes and their fines"""
+
+    def __init__(self, rule_table):
+        self.rules = {}
+        self.exact = {}
+        self.patterns = []
+        for rule in rule_table.rules:
+            self.rules[rule.law_code] = rule
+            if rule.dynamic:
+                self.patterns.append((self._compile(rule.message), rule))
+            else:
+                self.exact.setdefault(rule.message, rule.law_code)
+        self._cache = {}
+
+    @staticmethod
+    def _compile(message):
+        """Regex for a templated message; the first placeholder is captured as the speed"""
+        pattern = re.escape(message)
+        for name in ('speed', 'over_limit'):
+            placeholder = re.escape('{%s}' % name)
+            if placeholder in pattern:
+                group = '(?P<%s>-?\\d+)' % name if '(?P<' not in pattern else '-?\\d+'
+                pattern = pattern.replace(placeholder, group, 1).replace(placeholder, '-?\\d+')
+        return re.compile(pattern + '$')
+
+    def _message_code(self, message):
+        code = self.exact.get(message)
+        if code is not None:
+            return code
+        for pattern, rule in self.patterns:
+            match = pattern.match(message)
+            if not match:
+                continue
+            # Several speeding laws share one message; the number tells them apart
+            groups = match.groupdict()
+            if groups.get('speed') is not None:
+                value = int(groups['speed'])
+            elif groups.get('over_limit') is not None:
+                value = int(groups['over_limit']) + SPEED_LIMIT
+            else:
+                return rule.law_code
+            if rule.minimum is not None and not value > rule.minimum:
+                continue
+            if rule.maximum is not None and not value <= rule.maximum:
+                continue
+            return rule.law_code
+        return None
+
+    def items(self, violations):
+        """(law_code, message, fine, severity) per message of a violations column value
+        (JSON list or comma-joined text)"""
+        items = self._cache.get(violations)
+        if items is None:
+            if not violations:
+                messages = []
+            else:
+                try:
+                    messages = json.loads(violations)
+                except (ValueError, TypeError):
+                    messages = [m.strip() for m in violations.split(',') if m.strip()]
+                if not isinstance(messages, list):
+                    messages = []
+            items, seen = [], set()
+            for message in map(str, messages):
+                rule = self.rules.get(self._message_code(message))
+                if rule is None:
+                    items.append((None, message, 0, None))
+                elif rule.law_code not in seen:  # a law is listed once per record
+                    seen.add(rule.law_code)
+                    items.append((rule.law_code, message, rule.fine, SEVERITY_NAMES[rule.severity]))
+            items = tuple(items)
+            if len(self._cache) < 100000:
+                self._cache[violations] = items
+        return items
+
+
+class ViolationItems:
+    @staticmethod
+    def insert(cursor, violation_id, items):
+        """Insert one record's (law_code, message, fine, severity) items; the caller commits"""
+        cursor.executemany(_INSERT_SQL, [(violation_id, position, *item) for position, item in enumerate(items)])
+
+    @staticmethod
+    def insert_many(cursor, first_id, records):
+        """Items for records inserted back to back from first_id (one executemany); the caller commits"""
+        cursor.executemany(_INSERT_SQL, (
+            (violation_id, position, *item)
+            for violation_id, record in enumerate(records, first_id)
+            for position, item in enumerate(record.get('items') or ())))
+
+    @staticmethod
+    def backfill(cursor, batch=10000):
+        """Derive items from the stored messages of records that have none; the caller commits.
+
+        Inactive laws are matched too, since old records may cite them.
+        """
+        cursor.execute('SELECT * FROM traffic_laws WHERE rule_fact IS NOT NULL ORDER BY rule_order, id')
+        columns = [d[0] for d in cursor.description]
+        matcher = LawMatcher(compile_rules([dict(zip(columns, row)) for row in cursor.fetchall()]))
+        reader = cursor.connection.cursor()
+        reader.execute('''
+            SELECT vr.id, vr.violations FROM violation_records vr
+            WHERE vr.violations IS NOT NULL AND vr.violations NOT IN ('', '[]')
+              AND NOT EXISTS (SELECT 1 FROM violation_items vi WHERE vi.violation_id = vr.id)
+        ''')
+        while True:
+            rows = reader.fetchmany(batch)
+            if not rows:
+                break
+            cursor.executemany(_INSERT_SQL, (
+                (violation_id, position, *item)
+                for violation_id, violations in rows
+                for position, item in enumerate(matcher.items(violations))))
+
+    @staticmethod
+    def rescale(cursor, fines):
+        """Scale the items of each violation in {violation_id: new total fine} to add up to it; the caller commits"""
+        if not fines:
+            return
+        cursor.execute(f'''
+            SELECT violation_id, position, fine FROM violation_items
+            WHERE violation_id IN ({', '.join('?' * len(fines))})
+            ORDER BY violation_id, position
+        ''', list(fines))
+        by_violation = {}
+        for row in cursor.fetchall():
+            by_violation.setdefault(row['violation_id'], []).append((row['position'], row['fine']))
+        updates = []
+        for violation_id, items in by_violation.items():
+            scaled = scale_fines([fine for _, fine in items], fines[violation_id])
+            updates.extend((fine, violation_id, position) for (position, _), fine in zip(items, scaled))
+        cursor.executemany('UPDATE violation_items SET fine = ? WHERE violation_id = ? AND position = ?', updates)
+
+    @staticmethod
+    def for_violations(violation_ids):
+        """{violation_id: [item row, ...]} for a page of records"""
+        items = {violation_id: [] for violation_id in violation_ids}
+        if not items:
+            return items
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT violation_id, law_code, message, fine, severity FROM violation_items
+            WHERE violation_id IN ({', '.join('?' * len(items))})
+            ORDER BY violation_id, position
+        ''', list(items))
+        for row in cursor.fetchall():
+            items[row['violation_id']].append(row)
+        conn.close()
+        return items
+
+    @staticmethod
+    def law_stats():
+        """Times each law was broken and the fines issued for it, most frequent first"""
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT vi.law_code, tl.description, vi.violations, vi.fines
+            FROM (SELECT law_code, COUNT(*) as violations, SUM(fine) as fines
+                  FROM violation_items WHERE law_code IS NOT NULL GROUP BY law_code) vi
+            LEFT JOIN traffic_laws tl ON tl.law_code = vi.law_code
+            ORDER BY vi.violations DESC, vi.law_code
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
@@ -0,0 +1,119 @@
+from utils.db import get_db
+
+# Dimensions kept in violation_stats and the expression that gives a row's key.
+# The triggers created by migration 5 maintain one row per
+# (dimension, key, payment_status) for every violation_records change.
+DIMENSIONS = {
+    'all': "''",
+    'officer': "COALESCE({row}.officer_id, '')",
+    'user': "COALESCE({row}.user_id, '')",
+    'vehicle': "COALESCE({row}.vehicle_type, '')",
+    'day': "COALESCE(date({row}.created_at), '')",
+}
+
+
+def _upserts(row, sign):
+    """Trigger body statements adding (sign=+1) or removing (-1) one row's contribution"""
+    statements = []
+    for dimension, key in DIMENSIONS.items():
+        key = key.format(row=row)
+        statements.append(f'''
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('{dimension}', {key}, COALESCE({row}.payment_status, ''), {sign}, {sign} * COALESCE({row}.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;''')
+    return ''.join(statements)
+
+
+def schema_statements():
+    """DDL for the summary table and its triggers (current schema; migration 5 runs a frozen copy)"""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS violation_stats (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payment_status TEXT NOT NULL,
+            violations INTEGER NOT NULL DEFAULT 0,
+            fines INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, key, payment_status)
+        ) WITHOUT ROWID
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS violation_stats_insert AFTER INSERT ON violation_records
+        BEGIN {_upserts('NEW', 1)}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS violation_stats_delete AFTER DELETE ON violation_records
+        BEGIN {_upserts('OLD', -1)}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS violation_stats_update
+        AFTER UPDATE OF officer_id, user_id, vehicle_type, created_at, payment_status, total_fine
+        ON violation_records
+        BEGIN {_upserts('OLD', -1)} {_upserts('NEW', 1)}
+        END
+        ''',
+    ]
+
+
+class ViolationStats:
+    @staticmethod
+    def rebuild(conn):
+        """Recompute violation_stats from scratch; the caller commits"""
+        conn.execute('DELETE FROM violation_stats')
+        for dimension, key in DIMENSIONS.items():
+            conn.execute(f'''
+                INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+                SELECT '{dimension}', {key.format(row='vr')}, COALESCE(vr.payment_status, ''),
+                       COUNT(*), COALESCE(SUM(vr.total_fine), 0)
+                FROM violation_records vr
+                GROUP BY 2, 3
+            ''')
+
+    @staticmethod
+    def summary(dimension='all', key=''):
+        """Counts and fine totals for one dimension key, split by payment status"""
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT payment_status, violations, fines FROM violation_stats
+            WHERE dimension = ? AND key = ?
+        ''', (dimension, key))
+        rows = cursor.fetchall()
+        conn.close()
+
+        summary = {'total': 0, 'total_fines': 0}
+        for status in ('paid', 'unpaid', 'pending', 'overdue'):
+            summary[f'{status}_count'] = 0
+            summary[f'{status}_fines'] = 0
+        for row in rows:
+            summary['total'] += row['violations']
+            summary['total_fines'] += row['fines']
+            if row['payment_status'] in ('paid', 'unpaid', 'pending', 'overdue'):
+                summary[f"{row['payment_status']}_count"] = row['violations']
+                summary[f"{row['payment_status']}_fines"] = row['fines']
+        summary['collected'] = summary['paid_fines']
+        summary['outstanding'] = summary['unpaid_fines']
+        # Everything still to be paid, including fines the sweeper has marked overdue
+        summary['owed'] = summary['unpaid_fines'] + summary['overdue_fines']
+        return summary
+
+    @staticmethod
+    def breakdown(dimension, keys=None):
+        """Per-key totals for a dimension, e.g. per vehicle type or per day"""
+        conn = get_db()
+        cursor = conn.cursor()
+        query = '''
+            SELECT key, SUM(violations) as count, SUM(fines) as total_fine FROM violation_stats
+            WHERE dimension = ?
+        '''
+        params = [dimension]
+        if keys is not None:
+            query += f" AND key IN ({', '.join('?' * len(keys))})"
+            params.extend(keys)
+        cursor.execute(query + ' GROUP BY key HAVING SUM(violations) > 0 ORDER BY key', params)
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
@@ -1,10 +1,24 @@
-from flask import Blueprint, render_template, request, session, jsonify, flash, redirect, url_for
+from flask import Blueprint, Response, abort, render_template, request, session, jsonify, flash, redirect, url_for, stream_with_context
 from utils.decorators import login_required, role_required
 from utils.db import get_db
+from utils.identity import invalidate_user
+from utils.pagination import InvalidCursor, decode_key, page_args, paginate, wants_json
+from models.appeal import Appeal
 from models.user import User
 from models.violation import Violation
+from models.violation_stats import ViolationStats
 from services.violation_service import ViolationService
+from services import audit
+from services.audit import audited
+from services.notifications import notify_appeal, notify_payment
+from services.export import EXPORT_FORMATS, export
+from services import overdue, reconcile, reports
+from config import Config
+from utils.expert_system import bump_rules_version, invalidate_rules
+from utils.expert_batch import ENUM_FACTS, FLAG_CODES, NUMERIC_FACTS, VEHICLE_CODES
+import csv
 import hashlib
+import io
 from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -18,8 +32,8 @@ def dashboard():
     cursor = conn.cursor()
     
     # System statistics
-    total_users = User.get_all(role='user')
-    total_officers = User.get_all(role='officer')
+    total_users = User.count(role='user')
+    total_officers = User.count(role='officer')
     
     cursor.execute('SELECT COUNT(*) as total FROM appeals WHERE status = "pending"')
     pending_appeals = cursor.fetchone()['total'] or 0
@@ -47,8 +61,8 @@ def dashboard():
     stats = {
         'total_violations': violation_stats['total'],
         'total_collected': violation_stats['collected'],
-        'total_users': len(total_users) if total_users else 0,
-        'total_officers': len(total_officers) if total_officers else 0,
+        'total_users': total_users,
+        'total_officers': total_officers,
         'pending_appeals': pending_appeals
     }
     
@@ -62,11 +76,14 @@ def dashboard():
 @admin_bp.route('/users')
 @role_required('admin')
 def manage_users():
-    users = User.get_all()
-    return render_template('admin/users.html', users=users)
+    users = User.get_page(**page_args())
+    if wants_json():
+        return jsonify(users.to_dict())
+    return render_template('admin/users.html', users=users, page=users)
 
 @admin_bp.route('/user/add', methods=['POST'])
 @role_required('admin')
+@audited('user.add', 'user')
 def add_user():
     username = request.form.get('username')
     email = request.form.get('email')
@@ -83,6 +100,7 @@ def add_user():
 
 @admin_bp.route('/user/<int:user_id>/edit', methods=['POST'])
 @role_required('admin')
+@audited('user.edit', 'user', target='user_id')
 def edit_user(user_id):
     username = request.form.get('username')
     email = request.form.get('email')
@@ -98,6 +116,7 @@ def edit_user(user_id):
 
 @admin_bp.route('/user/<int:user_id>/delete', methods=['POST'])
 @role_required('admin')
+@audited('user.delete', 'user', target='user_id')
 def delete_user(user_id):
     # Prevent admin from deleting themselves
     if session.get('user_id') == user_id:
@@ -143,6 +162,7 @@ def manage_officers():
 
 @admin_bp.route('/officer/add', methods=['POST'])
 @role_required('admin')
+@audited('officer.add', 'user')
 def add_officer():
     first_name = request.form.get('first_name')
     last_name = request.form.get('last_name')
@@ -171,6 +191,7 @@ def add_officer():
 
 @admin_bp.route('/officer/<int:user_id>/edit', methods=['POST'])
 @role_required('admin')
+@audited('officer.edit', 'user', target='user_id')
 def edit_officer(user_id):
     badge_number = request.form.get('badge_number')
     department = request.form.get('department')
@@ -186,6 +207,7 @@ def edit_officer(user_id):
         ''', (badge_number, department, assigned_area, user_id))
         conn.commit()
         conn.close()
+        invalidate_user(user_id)
         flash('Officer updated successfully', 'success')
     except Exception as e:
         flash(f'Error: {str(e)}', 'error')
@@ -194,6 +216,7 @@ def edit_officer(user_id):
 
 @admin_bp.route('/officer/<int:user_id>/delete', methods=['POST', 'GET'])
 @role_required('admin')
+@audited('officer.delete', 'user', target='user_id', methods=('POST', 'GET'))
 def delete_officer(user_id):
     try:
         User.delete(user_id)
@@ -212,26 +235,77 @@ def manage_laws():
     laws = cursor.fetchall()
     conn.close()
     
-    return render_template('admin/laws.html', laws=laws)
+    return render_template('admin/laws.html', laws=laws, rule_facts=NUMERIC_FACTS + ENUM_FACTS,
+                           rule_values=FLAG_CODES, vehicles=VEHICLE_CODES)
+
+LAW_RULE_FIELDS = ('rule_fact', 'rule_value', 'rule_min', 'rule_max', 'rule_vehicle', 'rule_order',
+                   'violation_text', 'advice')
+
+
+def _law_rule(data):
+    """Validated rule columns (LAW_RULE_FIELDS) from a law form; raises ValueError when inconsistent"""
+    def text(name):
+        value = data.get(name)
+        return (str(value).strip() or None) if value is not None else None
+
+    def number(name):
+        value = text(name)
+        try:
+            return None if value is None else int(value)
+        except ValueError:
+            raise ValueError(f'{name} must be a whole number') from None
+
+    rule = {name: text(name) for name in ('rule_fact', 'rule_value', 'rule_vehicle', 'violation_text', 'advice')}
+    rule.update({name: number(name) for name in ('rule_min', 'rule_max', 'rule_order')})
+    fact = rule['rule_fact']
+    bounded = rule['rule_min'] is not None or rule['rule_max'] is not None
+    if fact is None:
+        if bounded or rule['rule_value'] is not None or rule['rule_vehicle'] is not None:
+            raise ValueError('Pick the fact the rule checks before giving its condition')
+    elif fact in NUMERIC_FACTS:
+        if rule['rule_value'] is not None:
+            raise ValueError(f'{fact} rules take a range (rule_min/rule_max), not a value')
+        if not bounded:
+            raise ValueError(f'{fact} rules need rule_min, rule_max or both')
+        if None not in (rule['rule_min'], rule['rule_max']) and rule['rule_min'] >= rule['rule_max']:
+            raise ValueError('rule_min must be below rule_max')
+    elif fact in ENUM_FACTS:
+        if rule['rule_value'] not in FLAG_CODES:
+            raise ValueError(f"{fact} rules need rule_value, one of {', '.join(FLAG_CODES)}")
+        if bounded:
+            raise ValueError(f'{fact} rules take a value, not a range')
+    else:
+        raise ValueError(f'Unknown rule fact: {fact}')
+    if rule['rule_vehicle'] is not None and rule['rule_vehicle'] not in VEHICLE_CODES:
+        raise ValueError(f"rule_vehicle must be one of {', '.join(VEHICLE_CODES)}")
+    if rule['rule_order'] is None:
+        rule['rule_order'] = 100
+    return rule
+
 
 @admin_bp.route('/laws/add', methods=['POST'])
 @role_required('admin')
+@audited('law.add', 'law')
 def add_law():
-    law_code = request.form.get('law_code')
-    description = request.form.get('description')
-    fine_amount = request.form.get('fine_amount')
-    category = request.form.get('category')
-    severity = request.form.get('severity')
+    data = request.get_json(silent=True) or request.form
+    try:
+        rule = _law_rule(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
     conn = get_db()
     cursor = conn.cursor()
     
     try:
-        cursor.execute('''
-            INSERT INTO traffic_laws (law_code, description, fine_amount, category, severity)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (law_code, description, fine_amount, category, severity))
+        cursor.execute(f'''
+            INSERT INTO traffic_laws (law_code, description, fine_amount, category, severity,
+                                      {', '.join(LAW_RULE_FIELDS)})
+            VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(LAW_RULE_FIELDS))})
+        ''', (data.get('law_code'), data.get('description'), data.get('fine_amount'), data.get('category'),
+              data.get('severity'), *(rule[name] for name in LAW_RULE_FIELDS)))
+        bump_rules_version(cursor)
         conn.commit()
+        invalidate_rules()
         return jsonify({'success': True, 'message': 'Law added successfully'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -240,147 +314,292 @@ def add_law():
 
 @admin_bp.route('/laws/edit/<int:law_id>', methods=['GET', 'POST'])
 @role_required('admin')
+@audited('law.edit', 'law', target='law_id')
 def edit_law(law_id):
-    conn = get_db()
-    
     if request.method == 'POST':
         data = request.json
-        conn.execute('''
+        columns = {name: data[name] for name in ('description', 'fine_amount', 'category', 'severity')}
+        # Clients that only send the basic fields leave the rule alone
+        if any(name in data for name in LAW_RULE_FIELDS):
+            try:
+                columns.update(_law_rule(data))
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+        conn = get_db()
+        conn.execute(f'''
             UPDATE traffic_laws
-            SET description = ?, fine_amount = ?, category = ?, severity = ?
+            SET {', '.join(f'{name} = ?' for name in columns)}
             WHERE id = ?
-        ''', (data['description'], data['fine_amount'], data['category'], data['severity'], law_id))
+        ''', (*columns.values(), law_id))
+        bump_rules_version(conn)
         conn.commit()
         conn.close()
+        invalidate_rules()
         return jsonify({'success': True})
     
+    conn = get_db()
     law = conn.execute('SELECT * FROM traffic_laws WHERE id = ?', (law_id,)).fetchone()
     conn.close()
     
     if law:
         return jsonify({
-            'id': law[0],
-            'law_code': law[1],
-            'description': law[2],
-            'fine_amount': law[3],
-            'category': law[4],
-            'severity': law[5],
-            'active': law[6]
+            'id': law['id'],
+            'law_code': law['law_code'],
+            'description': law['description'],
+            'fine_amount': law['fine_amount'],
+            'category': law['category'],
+            'severity': law['severity'],
+            'active': law['active'],
+            **{name: law[name] for name in LAW_RULE_FIELDS}
         })
     return jsonify({'error': 'Law not found'}), 404
 
 @admin_bp.route('/laws/delete/<int:law_id>', methods=['DELETE'])
 @role_required('admin')
+@audited('law.delete', 'law', target='law_id')
 def delete_law(law_id):
     conn = get_db()
     conn.execute('DELETE FROM traffic_laws WHERE id = ?', (law_id,))
+    bump_rules_version(conn)
     conn.commit()
     conn.close()
+    invalidate_rules()
     return jsonify({'success': True})
 
 @admin_bp.route('/appeals')
 @role_required('admin')
 def manage_appeals():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT a.*, u.username, vr.violations, vr.total_fine
-        FROM appeals a
-        LEFT JOIN users u ON a.user_id = u.id
-        LEFT JOIN violation_records vr ON a.violation_id = vr.id
-        ORDER BY a.created_at DESC
-    ''')
-    appeals = cursor.fetchall()
-    conn.close()
-    
-    return render_template('admin/appeals.html', appeals=appeals)
+    """The pending-appeal triage queue (largest fine, then oldest, first); ?view=all lists every appeal"""
+    view = 'all' if request.args.get('view') == 'all' else 'queue'
+    if view == 'all':
+        conn = get_db()
+        cursor = conn.cursor()
+        appeals = paginate(cursor, '''
+            SELECT a.*, u.username, vr.violations, vr.total_fine
+            FROM appeals a
+            LEFT JOIN users u ON a.user_id = u.id
+            LEFT JOIN violation_records vr ON a.violation_id = vr.id
+        ''', created='a.created_at', row_id='a.id', **page_args())
+        conn.close()
+    else:
+        try:
+            after = request.args.get('after')
+            after = decode_key(after, int, str, int) if after else None
+        except InvalidCursor as e:
+            abort(400, str(e))
+        limit = max(1, min(request.args.get('limit', Config.PAGE_SIZE, type=int), Config.MAX_PAGE_SIZE))
+        appeals = Appeal.queue(after=after, limit=limit)
+    
+    if wants_json():
+        return jsonify(appeals.to_dict())
+    stats = Appeal.sla_stats(sla_hours=Config.APPEAL_SLA_HOURS)
+    return render_template('admin/appeals.html', appeals=appeals, page=appeals, view=view, stats=stats)
 
-@admin_bp.route('/appeals/<int:appeal_id>/approve', methods=['POST'])
+@admin_bp.route('/appeals/stats')
 @role_required('admin')
-def approve_appeal(appeal_id):
-    response = request.form.get('response')
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    
+def appeal_stats():
+    """Pending backlog and time-to-decision over the last ?days= (default 30)"""
+    days = max(1, request.args.get('days', 30, type=int))
+    return jsonify(Appeal.sla_stats(days=days, sla_hours=Config.APPEAL_SLA_HOURS))
+
+def _review_appeals(decisions):
+    """Apply decisions in one transaction and notify the appellants; ValueError on bad input"""
+    outcome = Appeal.review(decisions, session['user_id'])
+    responses = {decision['id']: decision.get('response') for decision in decisions}
+    for appeal in outcome['decided']:
+        notify_appeal(appeal['user_id'], appeal['id'], appeal['status'], responses.get(appeal['id']))
+    return outcome
+
+@admin_bp.route('/appeals/review', methods=['POST'])
+@role_required('admin')
+@audited('appeal.review', 'appeal')
+def review_appeals():
+    """Decide many appeals at once.
+
+    JSON body: {"decisions": [{"id", "decision": "approve"|"reject", "response", "fine"}, ...]}
+    and/or {"ids": [...], "decision": ..., "response": ...} applying one decision
+    to every id. Appeals no longer pending are reported under "skipped".
+    """
+    body = request.get_json(silent=True) or {}
+    decisions = list(body.get('decisions') or [])
+    if body.get('ids'):
+        if not isinstance(body['ids'], list):
+            return jsonify({'success': False, 'message': '"ids" must be a list'}), 400
+        decisions += [{'id': appeal_id, 'decision': body.get('decision'), 'response': body.get('response')}
+                      for appeal_id in body['ids']]
+    if not decisions or not all(isinstance(decision, dict) for decision in decisions):
+        return jsonify({'success': False, 'message': 'Nothing to review'}), 400
+    if len(decisions) > Config.APPEAL_REVIEW_MAX_BATCH:
+        return jsonify({'success': False,
+                        'message': f'At most {Config.APPEAL_REVIEW_MAX_BATCH} appeals per request'}), 400
     try:
-        cursor.execute('''
-            UPDATE appeals 
-            SET status = 'approved', officer_response = ?, reviewed_by = ?, reviewed_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (response, session['user_id'], appeal_id))
-        conn.commit()
-        return jsonify({'success': True, 'message': 'Appeal approved'})
+        outcome = _review_appeals(decisions)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'approved': sum(1 for appeal in outcome['decided'] if appeal['status'] == 'approved'),
+        'rejected': sum(1 for appeal in outcome['decided'] if appeal['status'] == 'rejected'),
+        'skipped': outcome['skipped']
+    })
+
+def _review_one(appeal_id, decision, message):
+    """Approve or reject one appeal from the review modal (an optional "fine" reduces instead of dismissing)"""
+    try:
+        outcome = _review_appeals([{'id': appeal_id, 'decision': decision,
+                                    'response': request.form.get('response'),
+                                    'fine': request.form.get('fine', type=int)}])
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
-    finally:
-        conn.close()
+    if outcome['skipped']:
+        return jsonify({'success': False, 'message': 'Appeal is no longer pending'})
+    return jsonify({'success': True, 'message': message})
+
+@admin_bp.route('/appeals/<int:appeal_id>/approve', methods=['POST'])
+@role_required('admin')
+@audited('appeal.approve', 'appeal', target='appeal_id')
+def approve_appeal(appeal_id):
+    return _review_one(appeal_id, 'approve', 'Appeal approved')
 
 @admin_bp.route('/appeals/<int:appeal_id>/reject', methods=['POST'])
 @role_required('admin')
+@audited('appeal.reject', 'appeal', target='appeal_id')
 def reject_appeal(appeal_id):
-    response = request.form.get('response')
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
-            UPDATE appeals 
-            SET status = 'rejected', officer_response = ?, reviewed_by = ?, reviewed_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (response, session['user_id'], appeal_id))
-        conn.commit()
-        return jsonify({'success': True, 'message': 'Appeal rejected'})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)})
-    finally:
-        conn.close()
+    return _review_one(appeal_id, 'reject', 'Appeal rejected')
 
 @admin_bp.route('/payments')
 @role_required('admin')
 def payments():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get all violations with payment information
-    cursor.execute('''
-        SELECT vr.*, 
-               vr.driver_name,
-               vr.license_number,
-               vr.plate_number,
-               u.username as reported_by,
-               uo.username as officer_name, 
-               uo.first_name as officer_first_name, 
-               uo.last_name as officer_last_name
-        FROM violation_records vr
-        LEFT JOIN users u ON vr.user_id = u.id
-        LEFT JOIN officers o ON vr.officer_id = o.id
-        LEFT JOIN users uo ON o.user_id = uo.id
-        ORDER BY vr.created_at DESC
-    ''')
-    violations = cursor.fetchall()
+    # One page of violations with payment information (?law= narrows to one law code)
+    violations = Violation.get_page(law_code=request.args.get('law'), **page_args())
     
     # Payment statistics
-    cursor.execute('''
-        SELECT 
-            COUNT(*) as total_violations,
-            SUM(total_fine) as total_fines,
-            SUM(CASE WHEN payment_status = 'paid' THEN total_fine ELSE 0 END) as collected,
-            SUM(CASE WHEN payment_status = 'unpaid' THEN total_fine ELSE 0 END) as outstanding,
-            COUNT(CASE WHEN payment_status = 'paid' THEN 1 END) as paid_violations,
-            COUNT(CASE WHEN payment_status = 'unpaid' THEN 1 END) as unpaid_violations,
-            COUNT(CASE WHEN payment_status = 'pending' THEN 1 END) as pending_violations
-        FROM violation_records
-    ''')
-    stats = cursor.fetchone()
-    
-    conn.close()
+    summary = ViolationStats.summary()
+    stats = {
+        'total_violations': summary['total'],
+        'total_fines': summary['total_fines'],
+        'collected': summary['collected'],
+        'outstanding': summary['outstanding'],
+        'owed': summary['owed'],
+        'paid_violations': summary['paid_count'],
+        'unpaid_violations': summary['unpaid_count'],
+        'overdue_violations': summary['overdue_count'],
+        'pending_violations': summary['pending_count']
+    }
     
-    return render_template('admin/payments.html', violations=violations, stats=stats)
+    if wants_json():
+        return jsonify(dict(violations.to_dict(), stats=stats))
+    return render_template('admin/payments.html', violations=violations, stats=stats, page=violations)
+
+@admin_bp.route('/payments/export')
+@role_required('admin')
+def export_payments():
+    """Stream payments as CSV or JSONL, filtered by ?start=&end=&status=&officer_id="""
+    fmt = request.args.get('format', 'csv')
+    try:
+        chunks = export(fmt,
+                        start=request.args.get('start') or None,
+                        end=request.args.get('end') or None,
+                        payment_status=request.args.get('status') or None,
+                        officer_id=request.args.get('officer_id') or None)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    filename = f"payments-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@admin_bp.route('/payments/reconcile', methods=['POST'])
+@role_required('admin')
+def reconcile_payments():
+    """Apply an uploaded bank or mobile-money statement CSV (?dry_run=1 to only report)"""
+    upload = request.files.get('statement')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'message': 'Upload the statement CSV as "statement"'}), 400
+    source = request.form.get('source') or upload.filename
+    dry_run = request.values.get('dry_run', type=int, default=0) == 1
+    try:
+        stats = reconcile.reconcile(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''),
+                                    source, dry_run=dry_run, user_id=session.get('user_id'))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'success': False, 'message': f'Could not read the statement: {e}'}), 400
+    
+    if request.args.get('format') == 'csv':
+        report = io.StringIO()
+        reconcile.write_exceptions(stats['exceptions'], report)
+        return Response(report.getvalue(), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={source}.exceptions.csv'})
+    return jsonify(dict(stats, success=True))
+
+@admin_bp.route('/payments/overdue', methods=['GET', 'POST'])
+@role_required('admin')
+def overdue_sweep():
+    """Overdue sweeper metrics; POST sweeps now (optional ?grace_days=)"""
+    sweeper = overdue.get_sweeper()
+    if request.method == 'POST':
+        run = overdue.sweep(grace_days=request.values.get('grace_days', type=float))
+        if run['swept']:
+            audit.record('payment.overdue_sweep', details=run, user_id=session.get('user_id'),
+                         role=session.get('role'), ip_address=request.remote_addr)
+        return jsonify({'success': True, 'run': run})
+    return jsonify(sweeper.metrics() if sweeper else {'interval': 0})
+
+@admin_bp.route('/reports')
+@role_required('admin')
+def view_reports():
+    """Violation and fine trends from the report rollups, for ?days= or ?start=&end="""
+    try:
+        data = reports.report(start=request.args.get('start') or None,
+                              end=request.args.get('end') or None,
+                              days=request.args.get('days', type=int))
+    except ValueError as e:
+        if wants_json():
+            return jsonify({'success': False, 'message': str(e)}), 400
+        flash(f'Invalid report range: {e}', 'error')
+        data = reports.report()
+    data['pending_days'] = reports.pending_days()
+    
+    if wants_json():
+        return jsonify(data)
+    return render_template('admin/reports.html', report=data)
+
+@admin_bp.route('/audit')
+@role_required('admin')
+def audit_log():
+    """Audit entries, newest first, for ?start=&end= and optional ?user_id=&action=&target_type=&target_id=
+
+    dropped counts the entries this process lost to a full buffer or a failed write.
+    """
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        if not value:
+            continue
+        for fmt in ('%Y-%m-%d', audit.TIMESTAMP, '%Y-%m-%dT%H:%M:%S'):
+            try:
+                parsed = datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            bounds[name] = parsed.strftime('%Y-%m-%d' if fmt == '%Y-%m-%d' else audit.TIMESTAMP)
+            break
+        else:
+            return jsonify({'success': False,
+                            'message': f'"{name}" must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS'}), 400
+
+    writer = audit.get_audit_writer()
+    writer.flush(timeout=2)
+    entries = audit.query(start=bounds.get('start'),
+                          end=bounds.get('end'),
+                          user_id=request.args.get('user_id', type=int),
+                          action=request.args.get('action') or None,
+                          target_type=request.args.get('target_type') or None,
+                          target_id=request.args.get('target_id', type=int),
+                          limit=min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify({'entries': entries, 'dropped': writer.dropped})
 
 @admin_bp.route('/update-payment/<int:violation_id>/<status>', methods=['POST'])
 @role_required('admin')
+@audited('payment.update', 'violation', target='violation_id')
 def update_payment(violation_id, status):
     if status not in ['paid', 'unpaid', 'pending', 'overdue']:
         return jsonify({'success': False, 'message': 'Invalid status'})
@@ -394,8 +613,12 @@ def update_payment(violation_id, status):
             UPDATE violation_records 
             SET payment_status = ?, payment_date = ?
             WHERE id = ?
+            RETURNING user_id
         ''', (status, payment_date, violation_id))
+        violation = cursor.fetchone()
         conn.commit()
+        if violation:
+            notify_payment(violation['user_id'], violation_id, status)
         return jsonify({'success': True, 'message': f'Payment status updated to {status}'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -1,59 +1,218 @@
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, Response, current_app, jsonify, request, session, stream_with_context
+from models.notification import Notification
+from models.violation import Violation
+from models.violation_items import ViolationItems
+from models.violation_stats import ViolationStats
+from services.audit import audited
+from services.ingest import CLIENT_RECORD_FIELDS, RejectedRow, build_record, parse_row
+from services.lookup import lookup
+from services.notifications import format_event, get_hub
+from services.search import InvalidQuery, search
 from utils.db import get_db
 from utils.decorators import login_required, permission_required
+from utils.rbac import any_of, has_permission
+from utils.expert_system import check_violations, result_items
+from utils.identity import current_identity
+import json
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 @api_bp.route('/statistics', methods=['GET'])
 @login_required
 def get_statistics():
-    conn = get_db()
-    cursor = conn.cursor()
-    
     # Based on user role, return different data
+    by_law = None
     if session.get('role') == 'admin':
-        cursor.execute('SELECT COUNT(*) as total FROM violation_records')
-        total = cursor.fetchone()['total']
-        
-        cursor.execute('SELECT SUM(total_fine) as total FROM violation_records')
-        total_fines = cursor.fetchone()['total'] or 0
+        summary = ViolationStats.summary()
+        total = summary['total']
+        total_fines = summary['total_fines']
+        by_law = [dict(row) for row in ViolationItems.law_stats()]
     elif session.get('role') == 'officer':
-        cursor.execute('SELECT COUNT(*) as total FROM officers WHERE user_id = ?', (session['user_id'],))
-        officer = cursor.fetchone()
-        if officer:
-            cursor.execute('SELECT COUNT(*) as total FROM violation_records WHERE officer_id = ?', (officer['id'],))
-            total = cursor.fetchone()['total']
-        else:
-            total = 0
+        officer = current_identity()
+        total = ViolationStats.summary('officer', officer.officer_id)['total'] if officer and officer.officer_id else 0
         total_fines = 0
     else:
-        cursor.execute('SELECT COUNT(*) as total FROM violation_records WHERE user_id = ?', (session['user_id'],))
-        total = cursor.fetchone()['total']
+        total = ViolationStats.summary('user', session['user_id'])['total']
         total_fines = 0
     
-    conn.close()
-    
-    return jsonify({
+    stats = {
         'total': total,
         'total_fines': total_fines
-    })
+    }
+    if by_law is not None:
+        stats['by_law'] = by_law
+    return jsonify(stats)
 
 @api_bp.route('/notifications', methods=['GET'])
 @login_required
 def get_notifications():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT * FROM notifications
-        WHERE user_id = ?
-        ORDER BY created_at DESC
-        LIMIT 10
-    ''', (session['user_id'],))
-    
-    notifications = cursor.fetchall()
-    conn.close()
-    
     return jsonify({
-        'notifications': [dict(n) for n in notifications]
+        'notifications': [dict(n) for n in Notification.recent(session['user_id'])],
+        'unread': get_hub().unread(session['user_id'])
     })
+
+@api_bp.route('/notifications/read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    """Mark the JSON body's "ids" read, or every notification when there are none"""
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    if ids is not None and not (isinstance(ids, list) and all(isinstance(i, int) for i in ids)):
+        return jsonify({'success': False, 'message': 'ids must be a list of notification ids'}), 400
+    return jsonify({'success': True, 'unread': get_hub().mark_read(session['user_id'], ids)})
+
+@api_bp.route('/notifications/stream')
+@login_required
+def notification_stream():
+    """Server-sent events: the unread count, then each new notification as it is saved.
+
+    A reconnecting EventSource sends Last-Event-ID and first gets the
+    notifications it missed. Comment lines keep idle connections open. Past
+    the stream limits the answer is 429, and the page polls instead.
+    """
+    user_id = session['user_id']
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    hub = get_hub()
+    heartbeat = current_app.config['NOTIFY_HEARTBEAT_SECONDS']
+    subscription = hub.subscribe(user_id)
+    if subscription is None:
+        return jsonify({'success': False, 'message': 'Too many open notification streams',
+                        'poll': current_app.config['NOTIFY_POLL_SECONDS']}), 429
+
+    def generate():
+        yield 'retry: 3000\n' + format_event('unread', {'unread': hub.unread(user_id)})
+        seen = last_id or 0
+        if last_id is not None:
+            for row in Notification.since(user_id, last_id):
+                seen = max(seen, row['id'])
+                yield format_event('notification', dict(row), row['id'])
+        while not subscription.overflowed:
+            event = subscription.get(heartbeat)
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            name, event_id, data = event
+            if event_id is not None and event_id <= seen:
+                continue  # already replayed
+            yield format_event(name, data, event_id)
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs even when the stream is closed before its first event
+    response.call_on_close(lambda: hub.unsubscribe(subscription))
+    return response
+
+
+@api_bp.route('/violations/batch', methods=['POST'])
+@permission_required('create_violations')
+@audited('violation.batch', 'violation')
+def violations_batch():
+    """Evaluate an NDJSON stream of fact sets and persist the violations.
+
+    Each request line is one JSON object with the same fields as the ingest
+    files (vehicle, speed, helmet, ..., plate_number, driver_name, location).
+    Records are always filed under the calling officer with the server's
+    timestamp; officer_id, user_id and created_at in a line are ignored.
+    One NDJSON result line is streamed back per input line, in order, after
+    the group of records it belongs to has been committed.
+    """
+    officer = current_identity()
+    # Admins hold create_violations too, but a record needs an officer to file it under
+    if officer is None or officer.officer_id is None:
+        return jsonify({'success': False, 'message': 'An officer profile is required to record violations'}), 403
+    officer_id = officer.officer_id
+    group_size = current_app.config['BATCH_COMMIT_SIZE']
+    lines = iter(request.stream.readline, b'')
+
+    def flush(group):
+        """Persist one group in a single transaction and render its result lines"""
+        records = [(item, record) for item, record in group if record is not None]
+        if records:
+            conn = get_db()
+            try:
+                cursor = conn.cursor()
+                for item, record in records:
+                    item['id'] = Violation.insert(cursor, record)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                for item, record in records:
+                    item.pop('id', None)
+                    item.update(status='error', error=str(e))
+            finally:
+                conn.close()
+        return ''.join(json.dumps(item) + '\n' for item, _ in group)
+
+    def generate():
+        totals = {'records': 0, 'violations': 0, 'rejected': 0}
+        group = []
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            totals['records'] += 1
+            try:
+                facts, record = parse_row(json.loads(line), CLIENT_RECORD_FIELDS)
+            except (ValueError, RejectedRow) as e:
+                totals['rejected'] += 1
+                group.append(({'line': line_no, 'status': 'rejected', 'error': str(e)}, None))
+            else:
+                # Live recordings get the repeat-offender escalation (bulk ingest does not)
+                facts.update(plate_number=record['plate_number'], license_number=record['license_number'])
+                result = check_violations(facts)
+                item = {'line': line_no, 'status': result['status'], 'fine': result['fine'],
+                        'law_codes': list(result['law_codes']), 'severity': result['severity']}
+                if result.get('multiplier'):
+                    item.update(base_fine=result['base_fine'], prior_offenses=result['prior_offenses'],
+                                multiplier=result['multiplier'])
+                if result['status'] == 'violation':
+                    totals['violations'] += 1
+                    record = build_record(facts, record, result['fine'], json.dumps(list(result['violations'])),
+                                          'confirmed', officer_id, result_items(result))
+                else:
+                    record = None
+                group.append((item, record))
+            if len(group) >= group_size:
+                yield flush(group)
+                group = []
+        if group:
+            yield flush(group)
+        yield json.dumps({'summary': totals}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+_VIEW_VIOLATIONS = any_of('view_all', 'view_violations')
+
+def _can_view_violations():
+    return has_permission(_VIEW_VIOLATIONS)
+
+@api_bp.route('/violations/search', methods=['GET'])
+@login_required
+def search_violations():
+    """Ranked prefix search over driver, plate, license, location and description.
+
+    ?q=sok pp-12&limit=20&after=<next_cursor from the previous page>
+    """
+    if not _can_view_violations():
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    limit = max(1, min(request.args.get('limit', 20, type=int), current_app.config['MAX_PAGE_SIZE']))
+    try:
+        results = search(request.args.get('q', ''), limit, request.args.get('after') or None)
+    except InvalidQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify(results)
+
+@api_bp.route('/lookup', methods=['GET'])
+@login_required
+def lookup_vehicle():
+    """Roadside history for ?plate= or ?license=: counts, unpaid total, open appeals, latest violations.
+
+    Spacing, dashes and case are ignored; when nothing matches, similar known
+    plates or licenses come back as suggestions.
+    """
+    if not _can_view_violations():
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    kind = 'plate' if request.args.get('plate') else 'license' if request.args.get('license') else None
+    if kind is None:
+        return jsonify({'success': False, 'message': 'Give a plate or license number'}), 400
+    return jsonify(lookup(kind, request.args[kind]))
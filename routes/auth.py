@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, request, session, redirect, url_fo
 import hashlib
 from utils.db import get_db
 from utils.decorators import login_required
+from utils.identity import forget_session, remember_login
+from utils.rbac import forget_principal
 
 auth_bp = Blueprint('auth', __name__, url_prefix='')
 
@@ -24,6 +26,8 @@ def login():
             session['username'] = user['username']
             session['role'] = user['role']
             session.permanent = True
+            forget_principal()
+            remember_login(user['id'])
             flash('Login successful!', 'success')
             
             # Redirect based on role
@@ -69,6 +73,7 @@ def register():
 
 @auth_bp.route('/logout')
 def logout():
+    forget_session()
     session.clear()
     flash('Logged out successfully', 'success')
     return redirect(url_for('home'))
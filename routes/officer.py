@@ -1,83 +1,56 @@
-from flask import Blueprint, render_template, request, session, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from utils.decorators import login_required, role_required
 from utils.db import get_db
-from utils.expert_system import check_violations
+from utils.identity import current_identity
+from utils.pagination import page_args, page_key, wants_json
+from models.violation import Violation
+from models.violation_stats import ViolationStats
+from utils.expert_system import check_violations, result_items
+from services.audit import audited
+from services.notifications import notify_payment
+from services.writer import WriterBusy, get_writer
 import json
+import logging
 from datetime import datetime
 
 officer_bp = Blueprint('officer', __name__, url_prefix='/officer')
+logger = logging.getLogger(__name__)
 
 @officer_bp.route('/dashboard')
 @role_required('officer')
 def dashboard():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get officer info with user details
-    cursor.execute('''
-        SELECT o.*, u.first_name, u.last_name, u.username, u.email 
-        FROM officers o
-        JOIN users u ON o.user_id = u.id
-        WHERE u.id = ?
-    ''', (session['user_id'],))
-    officer = cursor.fetchone()
-    
-    if not officer:
+    # Officer and user details, cached for the session
+    officer = current_identity()
+    if not officer or officer.officer_id is None:
         flash('Officer profile not found', 'error')
         return redirect(url_for('user.dashboard'))
     
-    # Get violations recorded by this officer
-    cursor.execute('''
-        SELECT vr.*
-        FROM violation_records vr
-        WHERE vr.officer_id = ?
-        ORDER BY vr.created_at DESC
-    ''', (officer['id'],))
-    violations = cursor.fetchall()
-    
-    # Parse JSON violations for each violation
-    parsed_violations = []
-    for v in violations:
-        v_dict = dict(v)
-        # Parse the violations JSON string if it exists
-        if v_dict['violations'] and isinstance(v_dict['violations'], str):
-            try:
-                v_dict['parsed_violations'] = json.loads(v_dict['violations'])
-            except json.JSONDecodeError:
-                # If not valid JSON, treat as comma-separated string
-                v_dict['parsed_violations'] = [viol.strip() for viol in v_dict['violations'].split(',') if viol.strip()]
-        else:
-            v_dict['parsed_violations'] = []
-        parsed_violations.append(v_dict)
+    # Get violations recorded by this officer, one page at a time (?law= narrows to one law code)
+    args = page_args()
+    law_code = request.args.get('law') or None
+    violations = Violation.get_page(officer_id=officer.officer_id, law_code=law_code, **args)
+    if wants_json():
+        return jsonify(violations.to_dict())
     
     # Get statistics
-    cursor.execute('''SELECT COUNT(*) as total FROM violation_records WHERE officer_id = ?''',
-                  (officer['id'],))
-    total_recorded = cursor.fetchone()['total']
-    
-    cursor.execute('''SELECT SUM(total_fine) as total FROM violation_records WHERE officer_id = ? AND payment_status = "paid"''',
-                  (officer['id'],))
-    collected_fines = cursor.fetchone()['total'] or 0
-    
-    conn.close()
+    summary = ViolationStats.summary('officer', officer.officer_id)
+    total_recorded = summary['total']
+    collected_fines = summary['collected']
     
     return render_template('officer/dashboard.html', 
                          officer=officer, 
-                         violations=parsed_violations,
+                         violations=violations,
+                         page=violations,
+                         page_key=page_key(law=law_code, **args),
                          total_recorded=total_recorded, 
                          collected_fines=collected_fines)
 
 @officer_bp.route('/record-violation', methods=['POST'])
 @role_required('officer')
+@audited('violation.record', 'violation')
 def record_violation():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get officer ID
-    cursor.execute('SELECT id FROM officers WHERE user_id = ?', (session['user_id'],))
-    officer = cursor.fetchone()
-    
-    if not officer:
+    officer = current_identity()
+    if not officer or officer.officer_id is None:
         flash('Officer profile not found', 'error')
         return redirect(url_for('officer.dashboard'))
     
@@ -99,53 +72,56 @@ def record_violation():
         'registration': request.form.get('registration', 'yes'),
         'red_light': request.form.get('red_light', 'no'),
         'phone': request.form.get('phone', 'no'),
-        'alcohol': request.form.get('alcohol', 'no')
+        'alcohol': request.form.get('alcohol', 'no'),
+        # Looked up in offense_counters for the repeat-offender escalation
+        'plate_number': plate_number,
+        'license_number': license_number
     }
     
     result = check_violations(facts)
     
     try:
-        cursor.execute('''
-            INSERT INTO violation_records 
-            (officer_id, driver_name, license_number, plate_number, vehicle_type, 
-             has_helmet, speed, has_license, violations, total_fine, status, 
-             description, location, payment_status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            officer['id'],
-            driver_name,
-            license_number,
-            plate_number,
-            vehicle_type,
-            facts.get('helmet'),
-            facts.get('speed'),
-            facts.get('license'),
-            json.dumps(result['violations']),
-            result['fine'],
-            'confirmed',
-            request.form.get('description', ''),
-            request.form.get('location', ''),
-            'unpaid'  # Default payment status
-        ))
-        conn.commit()
+        # Queued on the group-commit writer instead of committing per request;
+        # durable so the officer is only told it is recorded once it is committed
+        get_writer().insert({
+            'officer_id': officer.officer_id,
+            'driver_name': driver_name,
+            'license_number': license_number,
+            'plate_number': plate_number,
+            'vehicle_type': vehicle_type,
+            'has_helmet': facts.get('helmet'),
+            'speed': facts.get('speed'),
+            'has_license': facts.get('license'),
+            'violations': json.dumps(result['violations']),
+            'items': result_items(result),
+            'total_fine': result['fine'],
+            'status': 'confirmed',
+            'description': request.form.get('description', ''),
+            'location': request.form.get('location', ''),
+            'payment_status': 'unpaid'  # Default payment status
+        }, durable=True)
         
         # Flash success message
         if result['violations']:
             violation_count = len(result['violations'])
             flash(f'✓ Successfully recorded {violation_count} violation(s) for {driver_name} with total fine: {result["fine"]:,} KHR', 'success')
+            if result.get('multiplier'):
+                flash(f'Repeat offender: {result["prior_offenses"]} earlier offense(s), fine raised x{result["multiplier"]:g} '
+                      f'from {result["base_fine"]:,} KHR', 'info')
         else:
             flash(f'No violations detected for {driver_name}', 'info')
         
+    except WriterBusy as e:
+        flash(f'Error recording violation: {e}', 'error')
     except Exception as e:
+        logger.exception('Recording a violation for %s failed', plate_number)
         flash(f'Error recording violation: {str(e)}', 'error')
-        print(f"Database error: {str(e)}")  # For debugging
-    finally:
-        conn.close()
     
     return redirect(url_for('officer.dashboard'))
 
 @officer_bp.route('/mark-paid/<int:violation_id>', methods=['POST', 'GET'])
 @role_required('officer')
+@audited('payment.update', 'violation', target='violation_id', methods=('POST', 'GET'))
 def mark_paid(violation_id):
     conn = get_db()
     cursor = conn.cursor()
@@ -155,8 +131,12 @@ def mark_paid(violation_id):
             UPDATE violation_records 
             SET payment_status = 'paid', payment_date = CURRENT_TIMESTAMP
             WHERE id = ?
+            RETURNING user_id
         ''', (violation_id,))
+        violation = cursor.fetchone()
         conn.commit()
+        if violation:
+            notify_payment(violation['user_id'], violation_id, 'paid')
         flash('Violation marked as paid', 'success')
     except Exception as e:
         flash(f'Error: {str(e)}', 'error')
@@ -167,6 +147,7 @@ def mark_paid(violation_id):
 
 @officer_bp.route('/update-payment-status/<int:violation_id>/<status>', methods=['POST'])
 @role_required('officer')
+@audited('payment.update', 'violation', target='violation_id')
 def update_payment_status(violation_id, status):
     if status not in ['paid', 'unpaid', 'pending', 'overdue']:
         return jsonify({'success': False, 'message': 'Invalid payment status'})
@@ -180,8 +161,12 @@ def update_payment_status(violation_id, status):
             UPDATE violation_records 
             SET payment_status = ?, payment_date = ?
             WHERE id = ?
+            RETURNING user_id
         ''', (status, payment_date, violation_id))
+        violation = cursor.fetchone()
         conn.commit()
+        if violation:
+            notify_payment(violation['user_id'], violation_id, status)
         return jsonify({'success': True, 'message': f'Violation marked as {status}'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -191,41 +176,19 @@ def update_payment_status(violation_id, status):
 @officer_bp.route('/payments')
 @role_required('officer')
 def payments():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get officer ID
-    cursor.execute('SELECT id FROM officers WHERE user_id = ?', (session['user_id'],))
-    officer = cursor.fetchone()
-    
-    if not officer:
+    officer = current_identity()
+    if not officer or officer.officer_id is None:
         flash('Officer profile not found', 'error')
         return redirect(url_for('user.dashboard'))
     
-    # Get all violations with payment status
-    cursor.execute('''
-        SELECT vr.*, u.username, u.first_name, u.last_name
-        FROM violation_records vr
-        LEFT JOIN users u ON vr.user_id = u.id
-        WHERE vr.officer_id = ?
-        ORDER BY vr.created_at DESC
-    ''', (officer['id'],))
-    violations = cursor.fetchall()
+    # One page of violations with payment status
+    args = page_args()
+    violations = Violation.get_page(officer_id=officer.officer_id, **args)
     
     # Payment statistics
-    cursor.execute('''
-        SELECT 
-            COUNT(*) as total,
-            SUM(CASE WHEN payment_status = 'paid' THEN 1 ELSE 0 END) as paid_count,
-            SUM(CASE WHEN payment_status = 'unpaid' THEN 1 ELSE 0 END) as unpaid_count,
-            SUM(CASE WHEN payment_status = 'pending' THEN 1 ELSE 0 END) as pending_count,
-            SUM(CASE WHEN payment_status = 'paid' THEN total_fine ELSE 0 END) as collected,
-            SUM(CASE WHEN payment_status = 'unpaid' THEN total_fine ELSE 0 END) as outstanding
-        FROM violation_records 
-        WHERE officer_id = ?
-    ''', (officer['id'],))
-    stats = cursor.fetchone()
-    
-    conn.close()
-    
-    return render_template('officer/payments.html', violations=violations, stats=stats, officer=officer)
\ No newline at end of file
+    stats = ViolationStats.summary('officer', officer.officer_id)
+    
+    if wants_json():
+        return jsonify(dict(violations.to_dict(), stats=stats))
+    return render_template('officer/payments.html', violations=violations, stats=stats, officer=officer,
+                           page=violations, page_key=page_key(**args))
\ No newline at end of file
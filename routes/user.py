@@ -1,7 +1,13 @@
 from flask import Blueprint, render_template, request, session, jsonify, flash, redirect, url_for
 from utils.decorators import login_required, role_required
 from utils.db import get_db
-from utils.expert_system import check_violations
+from utils.identity import invalidate_user
+from utils.pagination import page_args, page_key, wants_json
+from config import Config
+from models.violation import Violation
+from models.violation_stats import ViolationStats
+from utils.expert_system import check_violations, result_items
+from services.writer import get_writer, WriterBusy
 import json
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
@@ -9,40 +15,38 @@ user_bp = Blueprint('user', __name__, url_prefix='/user')
 @user_bp.route('/dashboard')
 @login_required
 def dashboard():
+    # Get user violations, one page at a time
+    args = page_args()
+    violations = Violation.get_page(user_id=session['user_id'], **args)
+    if wants_json():
+        return jsonify(violations.to_dict())
+    
     conn = get_db()
     cursor = conn.cursor()
     
-    # Get user violations
-    cursor.execute('''
-        SELECT * FROM violation_records 
-        WHERE user_id = ? 
-        ORDER BY created_at DESC
-    ''', (session['user_id'],))
-    violations = cursor.fetchall()
-    
-    # Get statistics
-    cursor.execute('SELECT COUNT(*) as total FROM violation_records WHERE user_id = ?',
-                  (session['user_id'],))
-    total_violations = cursor.fetchone()['total']
-    
-    cursor.execute('SELECT SUM(total_fine) as total FROM violation_records WHERE user_id = ? AND payment_status = "unpaid"',
-                  (session['user_id'],))
-    unpaid_fines = cursor.fetchone()['total'] or 0
-    
-    # Get appeals
+    # Get the most recent appeals
     cursor.execute('''
         SELECT a.*, vr.total_fine FROM appeals a
         JOIN violation_records vr ON a.violation_id = vr.id
         WHERE a.user_id = ?
         ORDER BY a.created_at DESC
-    ''', (session['user_id'],))
+        LIMIT ?
+    ''', (session['user_id'], Config.PAGE_SIZE))
     appeals = cursor.fetchall()
     
+    cursor.execute('SELECT COUNT(*) as total FROM appeals WHERE user_id = ?', (session['user_id'],))
+    total_appeals = cursor.fetchone()['total']
+    
     conn.close()
     
-    return render_template('user/dashboard.html', violations=violations, 
-                         appeals=appeals, total_violations=total_violations, 
-                         unpaid_fines=unpaid_fines)
+    # Get statistics
+    summary = ViolationStats.summary('user', session['user_id'])
+    total_violations = summary['total']
+    owed_fines = summary['owed']
+    
+    return render_template('user/dashboard.html', violations=violations, page=violations,
+                         appeals=appeals, total_appeals=total_appeals, total_violations=total_violations, 
+                         owed_fines=owed_fines, page_key=page_key(**args))
 
 @user_bp.route('/check-violation', methods=['POST'])
 @login_required
@@ -64,25 +68,21 @@ def check_violation():
     
     # Save violation if detected
     if result['status'] == 'violation':
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO violation_records 
-            (user_id, vehicle_type, has_helmet, speed, has_license, violations, total_fine, status, description)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            session['user_id'],
-            facts.get('vehicle'),
-            facts.get('helmet'),
-            facts.get('speed'),
-            facts.get('license'),
-            json.dumps(result['violations']),
-            result['fine'],
-            'pending',
-            'Self-reported violation'
-        ))
-        conn.commit()
-        conn.close()
+        try:
+            get_writer().insert({
+                'user_id': session['user_id'],
+                'vehicle_type': facts.get('vehicle'),
+                'has_helmet': facts.get('helmet'),
+                'speed': facts.get('speed'),
+                'has_license': facts.get('license'),
+                'violations': json.dumps(result['violations']),
+                'items': result_items(result),
+                'total_fine': result['fine'],
+                'status': 'pending',
+                'description': 'Self-reported violation'
+            })
+        except WriterBusy as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
     
     return jsonify(result)
 
@@ -144,6 +144,7 @@ def update_profile():
             WHERE id = ?
         ''', (first_name, last_name, email, phone, session['user_id']))
         conn.commit()
+        invalidate_user(session['user_id'])
         return jsonify({'success': True, 'message': 'Profile updated successfully'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
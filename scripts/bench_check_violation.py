@@ -0,0 +1,106 @@
+"""Throughput of the rule walk vs the precomputed decision table.
+
+Measures check_violations() calls per second and requests per second on
+POST /user/check-violation and POST /officer/record-violation, once with
+DECISION_TABLE=0 (walk the compiled rules) and once with the decision table.
+
+Usage: python scripts/bench_check_violation.py [--calls 200000] [--requests 1000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def random_forms(n, seed=11):
+    rng = random.Random(seed)
+    yes_no = ['yes', 'no']
+    return [{
+        'vehicle': rng.choice(['motorcycle', 'car', 'truck']),
+        'helmet': rng.choice(yes_no + ['na']),
+        'speed': str(rng.randint(20, 110)),
+        'license': rng.choice(yes_no),
+        'registration': rng.choice(yes_no),
+        'red_light': rng.choice(yes_no),
+        'phone': rng.choice(yes_no),
+        'alcohol': rng.choice(yes_no),
+    } for _ in range(n)]
+
+
+def run_mode(calls, requests):
+    sys.path.insert(0, ROOT)
+    from app import app
+    from models.user import User
+    from utils.db import get_db
+    from utils.expert_system import check_violations
+
+    forms = random_forms(max(calls, requests))
+    facts = [dict(f, speed=int(f['speed'])) for f in forms]
+    check_violations(facts[0])  # build caches
+    start = time.perf_counter()
+    for f in facts[:calls]:
+        check_violations(f)
+    results = {'check_violations()': calls / (time.perf_counter() - start)}
+
+    user_id = User.create('bench_user', 'user@bench.local', 'secret')
+    officer_user = User.create('bench_officer', 'officer@bench.local', 'secret', 'officer')
+    conn = get_db()
+    conn.execute('INSERT INTO officers (user_id, badge_number) VALUES (?, ?)', (officer_user, 'B-1'))
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'], sess['role'] = user_id, 'user'
+    start = time.perf_counter()
+    for form in forms[:requests]:
+        assert client.post('/user/check-violation', json=form).status_code == 200
+    results['/user/check-violation'] = requests / (time.perf_counter() - start)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'], sess['role'] = officer_user, 'officer'
+    start = time.perf_counter()
+    for i, form in enumerate(forms[:requests]):
+        form = dict(form, driver_name=f'Driver {i}', plate_number=f'PP-{i}')
+        assert client.post('/officer/record-violation', data=form).status_code == 302
+    results['/officer/record-violation'] = requests / (time.perf_counter() - start)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args.calls, args.requests)
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, flag in (('rule walk', '0'), ('decision table', '1')):
+            env = dict(os.environ, DATABASE=os.path.join(tmp, f'{flag}.db'), DECISION_TABLE=flag)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child',
+                 '--calls', str(args.calls), '--requests', str(args.requests)],
+                env=env, cwd=ROOT, check=True, capture_output=True, text=True,
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'benchmark':<28}{'rule walk/s':>14}{'table/s':>14}{'speedup':>10}")
+    for name in results['rule walk']:
+        before, after = results['rule walk'][name], results['decision table'][name]
+        print(f'{name:<28}{before:>14,.0f}{after:>14,.0f}{after / before:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
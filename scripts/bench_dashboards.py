@@ -0,0 +1,107 @@
+"""Requests-per-second benchmark for /admin/dashboard and /officer/dashboard.
+
+Runs the same workload twice against a throwaway database:
+
+  before  - one plain connection per get_db() call, stock SQLite pragmas
+  after   - pooled connections with WAL and the tuned pragmas from Config
+
+Usage: python scripts/bench_dashboards.py [--rows 5000] [--requests 500]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'before': {
+        'DB_POOL_SIZE': '0',
+        'DB_JOURNAL_MODE': 'DELETE',
+        'DB_SYNCHRONOUS': 'FULL',
+        'DB_CACHE_SIZE': '-2000',
+        'DB_MMAP_SIZE': '0',
+    },
+    'after': {},
+}
+
+
+def seed(rows):
+    """Create an admin, an officer and `rows` violation records"""
+    from app import app
+    from utils.db import get_db
+    from models.user import User
+
+    conn = get_db()
+    officer_user = User.create('bench_officer', 'bench@traffic.local', 'secret', 'officer')
+    conn.execute('INSERT INTO officers (user_id, badge_number) VALUES (?, ?)', (officer_user, 'B-1'))
+    officer_id = conn.execute('SELECT id FROM officers WHERE user_id = ?', (officer_user,)).fetchone()['id']
+    conn.executemany('''
+        INSERT INTO violation_records (officer_id, driver_name, plate_number, vehicle_type,
+                                       violations, total_fine, payment_status)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(officer_id, f'Driver {i}', f'PP-{i:05d}', ('car', 'motorcycle', 'truck')[i % 3],
+           '["Running red light"]', 100000, ('paid', 'unpaid', 'pending')[i % 3])
+          for i in range(rows)])
+    conn.commit()
+    conn.close()
+    admin_id = User.get_by_username('admin')['id']
+    return app, admin_id, officer_user
+
+
+def measure(client, path, requests):
+    client.get(path)  # warm up
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+    return requests / (time.perf_counter() - start)
+
+
+def run_mode(rows, requests):
+    app, admin_id, officer_user = seed(rows)
+    results = {}
+    for path, user_id, role in (('/admin/dashboard', admin_id, 'admin'),
+                                ('/officer/dashboard', officer_user, 'officer')):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['role'] = role
+        results[path] = measure(client, path, requests)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        run_mode(args.rows, args.requests)
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, overrides in MODES.items():
+            env = dict(os.environ, DATABASE=os.path.join(tmp, f'{mode}.db'), **overrides)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child',
+                 '--rows', str(args.rows), '--requests', str(args.requests)],
+                env=env, cwd=ROOT, check=True, capture_output=True, text=True,
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'endpoint':<22}{'before req/s':>14}{'after req/s':>14}{'speedup':>10}")
+    for path in results['before']:
+        before, after = results['before'][path], results['after'][path]
+        print(f'{path:<22}{before:>14.1f}{after:>14.1f}{after / before:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Rows-per-second microbenchmark: check_violations vs check_violations_batch.
+
+Generates random fact sets, checks that the batch results match the scalar
+engine row for row, then times both.
+
+Usage: python scripts/bench_expert_batch.py [--rows 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def random_facts(n, seed=7):
+    rng = random.Random(seed)
+    flags = ['yes', 'no', 'na', None]
+    facts = []
+    for _ in range(n):
+        f = {
+            'vehicle': rng.choice(['motorcycle', 'car', 'truck', 'bus']),
+            'helmet': rng.choice(flags),
+            'speed': rng.randint(0, 130),
+            'license': rng.choice(flags),
+        }
+        for key in ('registration', 'red_light', 'phone', 'alcohol'):
+            value = rng.choice(flags)
+            if value is not None:
+                f[key] = value
+        facts.append(f)
+    return facts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE'] = os.path.join(tmp, 'bench.db')
+    sys.path.insert(0, ROOT)
+    from utils.db import init_db
+    from utils.expert_system import check_violations, get_rules
+    from utils.expert_batch import check_violations_batch, encode_facts
+
+    init_db()
+    rules = get_rules()
+    facts = random_facts(args.rows)
+    columns = encode_facts(facts)
+
+    batch = check_violations_batch(rule_table=rules, **columns)
+    for i in range(min(args.rows, 20000)):
+        assert batch.result(i) == check_violations(facts[i], rules), facts[i]
+
+    start = time.perf_counter()
+    scalar = [check_violations(f, rules) for f in facts]
+    scalar_rate = args.rows / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    batch = check_violations_batch(rule_table=rules, **columns)
+    batch_rate = args.rows / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    check_violations_batch(rule_table=rules, **encode_facts(facts))
+    encoded_rate = args.rows / (time.perf_counter() - start)
+
+    assert [r['fine'] for r in scalar] == batch.fines.tolist()
+    print(f"{'mode':<34}{'rows/s':>14}")
+    print(f"{'check_violations (scalar)':<34}{scalar_rate:>14,.0f}")
+    print(f"{'check_violations_batch':<34}{batch_rate:>14,.0f}")
+    print(f"{'encode_facts + batch':<34}{encoded_rate:>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
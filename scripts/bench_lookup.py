@@ -0,0 +1,159 @@
+"""Latency of the roadside plate/license lookup at ten million records.
+
+Loads --rows synthetic violations (through the app's triggers) for about
+rows/4 vehicles and drivers, with a skew towards repeat offenders, plates
+typed in mixed styles and a pending appeal on 1% of them. Then times, with
+the plate or license typed in a random style each time:
+  * summary() for a known plate and a known license,
+  * lookup() of a mistyped and of a partly read plate, which fall back to
+    suggestions,
+  * GET /api/lookup for a known plate.
+
+Usage: python scripts/bench_lookup.py [--rows 10000000] [--repeat 2000] [--database path]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROVINCES = ['PP', 'SR', 'BB', 'KP', 'KS', 'TK', 'PV', 'KC']
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def plate(vehicle):
+    """A distinct plate for every vehicle number, as (province, series, digits)"""
+    vehicle, digits = divmod(vehicle, 10000)
+    vehicle, letter = divmod(vehicle, len(LETTERS))
+    vehicle, series = divmod(vehicle, 9)
+    return PROVINCES[vehicle % len(PROVINCES)], f'{series + 1}{LETTERS[letter]}', f'{digits:04d}'
+
+
+def typed(rng, parts):
+    """The same plate the way different officers type it"""
+    style = rng.randrange(4)
+    if style == 0:
+        return '-'.join(parts)
+    if style == 1:
+        return ' '.join(parts)
+    if style == 2:
+        return ''.join(parts).lower()
+    return f'{parts[0]} {parts[1]}-{parts[2]}'
+
+
+def license_number(driver):
+    return f'K{driver:08d}'
+
+
+def skewed(rng, n):
+    # Low numbers come up far more often: a few repeat offenders, a long tail of one-offs
+    return int(n * rng.random() ** 2)
+
+
+def synthetic_rows(n, vehicles, seed=14):
+    rng = random.Random(seed)
+    for _ in range(n):
+        vehicle = skewed(rng, vehicles)
+        license = license_number(vehicle)
+        yield (typed(rng, plate(vehicle)), license if rng.random() < 0.5 else license.lower(),
+               rng.choice([10000, 25000, 50000, 100000]), rng.choice(['paid', 'unpaid', 'unpaid', 'overdue']))
+
+
+def load(conn, n, vehicles, batch=50000):
+    rows = synthetic_rows(n, vehicles)
+    cursor = conn.cursor()
+    while True:
+        chunk = [row for _, row in zip(range(batch), rows)]
+        if not chunk:
+            break
+        cursor.execute('BEGIN')
+        cursor.executemany('''
+            INSERT INTO violation_records (plate_number, license_number, total_fine, payment_status,
+                                           vehicle_type, violations, status)
+            VALUES (?, ?, ?, ?, 'car', '["Speeding - 12 km/h over the 40 km/h limit"]', 'confirmed')
+        ''', chunk)
+        conn.commit()
+    cursor.execute('BEGIN')
+    cursor.execute('''
+        INSERT INTO appeals (violation_id, reason, status)
+        SELECT id, 'bench', 'pending' FROM violation_records WHERE id % 100 = 0
+    ''')
+    conn.commit()
+
+
+def percentiles(timings):
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--database', help='reuse (or create) this file instead of a temp database')
+    args = parser.parse_args()
+
+    os.environ['DATABASE'] = args.database or os.path.join(tempfile.mkdtemp(), 'bench_lookup.db')
+    sys.path.insert(0, ROOT)
+    from app import app
+    from services.lookup import lookup, summary
+    from utils.db import get_db
+
+    vehicles = max(args.rows // 4, 1)
+    conn = get_db()
+    existing = conn.execute('SELECT COUNT(*) FROM violation_records').fetchone()[0]
+    if existing < args.rows:
+        print(f"Loading {args.rows - existing:,} violations for {vehicles:,} vehicles ...")
+        start = time.perf_counter()
+        load(conn, args.rows - existing, vehicles)
+        print(f"  {time.perf_counter() - start:.1f}s")
+    admin_id = conn.execute("SELECT id FROM users WHERE role = 'admin'").fetchone()[0]
+    conn.close()
+
+    rng = random.Random(2)
+
+    def known_plate():
+        return typed(rng, plate(skewed(rng, vehicles)))
+
+    def known_license():
+        return license_number(skewed(rng, vehicles)).lower()
+
+    def mistyped_plate():
+        # A dropped or doubled digit; a wrong one would mostly be another real plate
+        text = ''.join(plate(skewed(rng, vehicles)))
+        i = rng.randrange(len(text) - 4, len(text))
+        return text[:i] + text[i + 1:] if rng.random() < 0.5 else text[:i] + text[i] + text[i:]
+
+    def partial_plate():
+        return ''.join(plate(skewed(rng, vehicles))[1:])  # province not read
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'], sess['role'] = admin_id, 'admin'
+
+    cases = [
+        ('summary(plate)', lambda: summary('plate', known_plate()), lambda r: r['violations']),
+        ('summary(license)', lambda: summary('license', known_license()), lambda r: r['violations']),
+        ('lookup(mistyped plate)', lambda: lookup('plate', mistyped_plate()), lambda r: len(r['suggestions'])),
+        ('lookup(partial plate)', lambda: lookup('plate', partial_plate()), lambda r: len(r['suggestions'])),
+        ('GET /api/lookup?plate=', lambda: client.get('/api/lookup', query_string={'plate': known_plate()}),
+         lambda r: r.json['violations']),
+    ]
+    print(f"\n{'case':<26}{'p50 ms':>10}{'p99 ms':>10}{'avg rows':>10}")
+    for name, run, count in cases:
+        run()
+        timings, found = [], 0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = run()
+            timings.append((time.perf_counter() - start) * 1000)
+            found += count(result)
+        p50, p99 = percentiles(timings)
+        print(f"{name:<26}{p50:>10.2f}{p99:>10.2f}{found / args.repeat:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Per-request overhead of the access-control decorators.
+
+Wraps a no-op view with role_required / permission_required (a single
+permission and an any_of/all_of expression) and, for comparison, with the
+previous string-based checks (role string compare, list membership over
+Config.ROLE_PERMISSIONS). Each call runs in a request context with a signed-in
+session and starts from an empty flask.g, like a new request; "warm" calls
+reuse the principal already memoized on g, as a second check in the same
+request does. Also times full test-client requests with and without a
+decorator.
+
+Usage: python scripts/bench_rbac.py [--calls 200000] [--requests 5000]
+"""
+import argparse
+import os
+import sys
+import time
+from functools import wraps
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_decorators(Config, session):
+    """The string/list checks utils.decorators used before the bitmask policy"""
+
+    def role_required(role):
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if 'user_id' not in session:
+                    return 'login'
+                if session.get('role') != role:
+                    return 'denied'
+                return f(*args, **kwargs)
+            return decorated_function
+        return decorator
+
+    def permission_required(permission):
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if 'user_id' not in session:
+                    return 'login'
+                if permission not in Config.ROLE_PERMISSIONS.get(session.get('role'), []):
+                    return 'denied'
+                return f(*args, **kwargs)
+            return decorated_function
+        return decorator
+
+    def any_permission_required(*permissions):
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if 'user_id' not in session:
+                    return 'login'
+                granted = Config.ROLE_PERMISSIONS.get(session.get('role'), [])
+                if not any(permission in granted for permission in permissions):
+                    return 'denied'
+                return f(*args, **kwargs)
+            return decorated_function
+        return decorator
+
+    return role_required, permission_required, any_permission_required
+
+
+def per_call_ns(fn, calls, reset):
+    start = time.perf_counter()
+    for _ in range(calls):
+        reset()
+        fn()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from flask import Flask, g, session
+    from config import Config
+    from utils.decorators import permission_required, role_required
+    from utils.rbac import all_of, any_of
+
+    app = Flask(__name__)
+    app.secret_key = 'bench'
+
+    def view():
+        return 'ok'
+
+    old_role, old_permission, old_any = legacy_decorators(Config, session)
+    cases = [
+        ('undecorated', view, view),
+        ("role_required('officer')", old_role('officer')(view), role_required('officer')(view)),
+        ("permission_required('create_violations')",
+         old_permission('create_violations')(view), permission_required('create_violations')(view)),
+        ("any_of('view_all', 'view_violations')",
+         old_any('view_all', 'view_violations')(view), permission_required(any_of('view_all', 'view_violations'))(view)),
+        ("all_of('view_violations', any_of(...))", None,
+         permission_required(all_of('view_violations', any_of('create_violations', 'view_all')))(view)),
+    ]
+
+    def fresh_request():
+        request_globals.__dict__.pop('_rbac_principal', None)
+
+    def same_request():
+        pass
+
+    print(f"{'decorator':<44}{'strings ns':>12}{'bitmask ns':>12}{'warm g ns':>12}")
+    with app.test_request_context('/'):
+        session['user_id'], session['role'] = 1, 'officer'
+        request_globals = g._get_current_object()
+        for name, old, new in cases:
+            assert new() == 'ok' and (old is None or old() == 'ok'), name
+            before = per_call_ns(old, args.calls, fresh_request) if old else float('nan')
+            after = per_call_ns(new, args.calls, fresh_request)
+            warm = per_call_ns(new, args.calls, same_request)
+            print(f'{name:<44}{before:>12.0f}{after:>12.0f}{warm:>12.0f}')
+
+    app.add_url_rule('/plain', 'plain', view)
+    app.add_url_rule('/guarded', 'guarded', permission_required(any_of('view_all', 'view_violations'))(view))
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'], sess['role'] = 1, 'officer'
+    print(f"\n{'test client request':<44}{'us/request':>12}")
+    for url in ('/plain', '/guarded'):
+        assert client.get(url).data == b'ok'
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            client.get(url)
+        print(f'{url:<44}{(time.perf_counter() - start) / args.requests * 1e6:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
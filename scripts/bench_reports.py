@@ -0,0 +1,143 @@
+"""Report rollups over a large synthetic history.
+
+Loads --rows synthetic violations spread over --days days, then times:
+  * the full rollup build (python -m services.reports --rebuild),
+  * an incremental refresh after one more hour of traffic,
+  * report() for 30 and 365 day ranges from the rollups, next to the same
+    totals aggregated straight from violation_records,
+  * GET /admin/reports?days=30.
+
+Usage: python scripts/bench_reports.py [--rows 10000000] [--days 1095] [--database path]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def synthetic_rows(check_violations, n, start, days, seed=5):
+    """(created_at, vehicle, officer, area, violations, fine, payment_status, payment_date) tuples"""
+    rng = random.Random(seed)
+    outcomes = []
+    for _ in range(400):
+        facts = {'vehicle': rng.choice(['motorcycle', 'car', 'truck']), 'speed': rng.randint(20, 110)}
+        for fact in ('helmet', 'license', 'registration', 'red_light', 'phone', 'alcohol'):
+            facts[fact] = rng.choice(['yes', 'no'])
+        result = check_violations(facts)
+        if result['fine']:
+            outcomes.append((facts['vehicle'], json.dumps(list(result['violations'])), result['fine']))
+    areas = ['Phnom Penh', 'Siem Reap', 'Battambang', 'Kampot', 'Sihanoukville', None]
+    seconds = int(days * 86400)
+    now = datetime.now()
+    for _ in range(n):
+        created = start + timedelta(seconds=rng.randrange(seconds))
+        vehicle, violations, fine = rng.choice(outcomes)
+        paid = rng.random() < 0.45
+        paid_at = min(created + timedelta(days=rng.randint(0, 20)), now).isoformat() if paid else None
+        yield (created.strftime('%Y-%m-%d %H:%M:%S'), vehicle, rng.randint(1, 40), rng.choice(areas),
+               violations, fine, 'paid' if paid else 'unpaid', paid_at)
+
+
+def load(conn, rows, batch=100000):
+    cursor = conn.cursor()
+    pending = []
+    for row in rows:
+        pending.append(row)
+        if len(pending) >= batch:
+            _insert(cursor, pending)
+            conn.commit()
+            pending = []
+    if pending:
+        _insert(cursor, pending)
+        conn.commit()
+
+
+def _insert(cursor, rows):
+    cursor.execute('BEGIN')
+    cursor.executemany('''
+        INSERT INTO violation_records (created_at, vehicle_type, officer_id, location, violations,
+                                       total_fine, payment_status, payment_date, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'confirmed')
+    ''', rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--days', type=int, default=1095)
+    parser.add_argument('--database', help='reuse (or create) this file instead of a temp database')
+    args = parser.parse_args()
+
+    os.environ['DATABASE'] = args.database or os.path.join(tempfile.mkdtemp(), 'bench_reports.db')
+    sys.path.insert(0, ROOT)
+    from app import app
+    from services import reports
+    from utils.db import get_db
+    from utils.expert_system import check_violations
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    conn = get_db()
+    existing = conn.execute('SELECT COUNT(*) FROM violation_records').fetchone()[0]
+    if existing < args.rows:
+        print(f"Loading {args.rows - existing:,} synthetic violations over {args.days} days ...")
+        elapsed, _ = timed(lambda: load(conn, synthetic_rows(
+            check_violations, args.rows - existing, today - timedelta(days=args.days), args.days)))
+        print(f"  loaded in {elapsed:.1f}s")
+    conn.close()
+
+    elapsed, days = timed(reports.rebuild)
+    print(f"Full rollup build: {days:,} days in {elapsed:.1f}s")
+
+    conn = get_db()
+    now = datetime.now()
+    load(conn, synthetic_rows(check_violations, 1000, now.replace(minute=0, second=0, microsecond=0), 1 / 24, seed=9))
+    conn.close()
+    elapsed, days = timed(reports.refresh)
+    print(f"Incremental refresh after 1,000 new rows: {days} day(s) in {elapsed * 1000:.1f} ms")
+
+    def direct(days):
+        start, end = reports.resolve_range(days=days)
+        conn = get_db()
+        row = conn.execute('''
+            SELECT COUNT(*), SUM(total_fine) FROM violation_records WHERE created_at >= ? AND created_at < date(?, '+1 day')
+        ''', (start, end)).fetchone()
+        by_vehicle = conn.execute('''
+            SELECT vehicle_type, COUNT(*) FROM violation_records WHERE created_at >= ? AND created_at < date(?, '+1 day')
+            GROUP BY vehicle_type
+        ''', (start, end)).fetchall()
+        conn.close()
+        return row, by_vehicle
+
+    print(f"\n{'query':<34}{'rollups ms':>12}{'direct ms':>12}")
+    for days in (30, 365):
+        rollup, data = timed(lambda: reports.report(days=days), repeat=10)
+        scan, (row, _) = timed(lambda: direct(days), repeat=3)
+        assert data['totals']['violations'] == row[0], (data['totals'], row)
+        print(f"{f'report(days={days})':<34}{rollup * 1000:>12.1f}{scan * 1000:>12.1f}")
+
+    client = app.test_client()
+    conn = get_db()
+    admin_id = conn.execute("SELECT id FROM users WHERE role = 'admin'").fetchone()[0]
+    conn.close()
+    with client.session_transaction() as sess:
+        sess['user_id'], sess['role'] = admin_id, 'admin'
+    page, response = timed(lambda: client.get('/admin/reports?days=30'), repeat=10)
+    assert response.status_code == 200
+    print(f"{'GET /admin/reports?days=30':<34}{page * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
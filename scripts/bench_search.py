@@ -0,0 +1,110 @@
+"""Latency of the FTS5 violation search at a few million rows.
+
+Loads --rows synthetic violations (through the sync triggers, like the app
+does), then runs each query shape --repeat times through services.search and
+reports p50/p95 in milliseconds for one 20-row page.
+
+Usage: python scripts/bench_search.py [--rows 5000000] [--repeat 200] [--database path]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST = ['Dara', 'Sokha', 'Sopheap', 'Vann', 'Kim', 'Rith', 'Bopha', 'Chenda', 'Vuthy', 'Sreyneang',
+         'Pisey', 'Makara', 'Rotha', 'Channary', 'Visal', 'Kosal', 'Leakhena', 'Sothea', 'Nimol', 'Phalla']
+LAST = ['Sok', 'Chan', 'Lim', 'Heng', 'Ouk', 'Seng', 'Keo', 'Mao', 'Pich', 'Nhem', 'Chea', 'Ly', 'Tep',
+        'Yim', 'Hun', 'Prak', 'Meas', 'Sam', 'Touch', 'Vong']
+PROVINCES = ['PP', 'SR', 'BB', 'KP', 'KS', 'TK', 'PV', 'KC']
+STREETS = ['Norodom Blvd', 'Monivong Blvd', 'Sihanouk Blvd', 'Russian Blvd', 'Street 63', 'Street 271',
+           'Charles de Gaulle', 'Kampuchea Krom', 'Mao Tse Toung', 'Preah Ang Duong', 'National Road 1',
+           'National Road 4', 'National Road 5', 'National Road 6', 'Riverside']
+NOTES = [None, 'Stopped at checkpoint', 'Camera capture', 'Driver cooperative', 'Refused to sign',
+         'Night patrol', 'Near school zone', 'Heavy traffic']
+
+
+def synthetic_rows(n, seed=13):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield (f'{rng.choice(LAST)} {rng.choice(FIRST)}',
+               f'{rng.choice(PROVINCES)}-{rng.randint(1, 3)}{rng.choice("ABCDEFGH")}-{rng.randint(0, 9999):04d}',
+               f'L{i:09d}',
+               f'{rng.choice(STREETS)}, {rng.choice(PROVINCES)}',
+               rng.choice(NOTES))
+
+
+def load(conn, n, batch=50000):
+    rows = synthetic_rows(n)
+    cursor = conn.cursor()
+    while True:
+        chunk = [row for _, row in zip(range(batch), rows)]
+        if not chunk:
+            break
+        cursor.execute('BEGIN')
+        cursor.executemany('''
+            INSERT INTO violation_records (driver_name, plate_number, license_number, location, description,
+                                           vehicle_type, total_fine, status, payment_status)
+            VALUES (?, ?, ?, ?, ?, 'car', 50000, 'confirmed', 'unpaid')
+        ''', chunk)
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--database', help='reuse (or create) this file instead of a temp database')
+    args = parser.parse_args()
+
+    os.environ['DATABASE'] = args.database or os.path.join(tempfile.mkdtemp(), 'bench_search.db')
+    sys.path.insert(0, ROOT)
+    from services.search import search
+    from utils.db import get_db, init_db
+
+    init_db()
+    conn = get_db()
+    existing = conn.execute('SELECT COUNT(*) FROM violation_records').fetchone()[0]
+    if existing < args.rows:
+        print(f"Loading {args.rows - existing:,} rows through the search triggers ...")
+        start = time.perf_counter()
+        load(conn, args.rows - existing)
+        elapsed = time.perf_counter() - start
+        print(f"  {elapsed:.1f}s ({(args.rows - existing) / elapsed:,.0f} rows/s)")
+        conn.execute("INSERT INTO violation_search (violation_search) VALUES ('optimize')")
+        conn.commit()
+    sample = conn.execute('''
+        SELECT driver_name, plate_number, license_number, location FROM violation_records
+        WHERE id IN (SELECT abs(random()) % (SELECT MAX(id) FROM violation_records) + 1 FROM violation_records LIMIT 500)
+    ''').fetchall()
+    conn.close()
+
+    rng = random.Random(1)
+    shapes = {
+        'license number': lambda r: r['license_number'],
+        'full plate': lambda r: r['plate_number'],
+        'plate prefix (PP-2A-12)': lambda r: r['plate_number'][:-2],
+        'driver full name': lambda r: r['driver_name'],
+        'name + street': lambda r: f"{r['driver_name']} {r['location'].split(',')[0]}",
+        'name + plate prefix': lambda r: f"{r['driver_name'].split()[0]} {r['plate_number'][:5]}",
+    }
+    print(f"\n{'query shape':<30}{'p50 ms':>10}{'p95 ms':>10}{'hits/page':>11}")
+    for name, make in shapes.items():
+        timings, hits = [], 0
+        for _ in range(args.repeat):
+            query = make(rng.choice(sample))
+            start = time.perf_counter()
+            result = search(query, limit=20)
+            timings.append((time.perf_counter() - start) * 1000)
+            hits += len(result['items'])
+        timings.sort()
+        print(f"{name:<30}{statistics.median(timings):>10.2f}{timings[int(len(timings) * 0.95) - 1]:>10.2f}"
+              f"{hits / args.repeat:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""Buffered audit trail of admin and officer actions, one SQLite file per month.
+
+Views opt in with the @audited decorator, which records who did what to which
+target once the view returns. Entries are queued in memory and a background
+thread writes whatever arrived within Config.AUDIT_FLUSH_MS (or
+Config.AUDIT_MAX_BATCH entries) in one transaction per month, so an audited
+request never waits on a write or holds a lock on the live database.
+
+Each month lives in its own file, Config.AUDIT_DIR/audit-YYYY-MM.db, which
+keeps the live database small and makes retention a matter of deleting old
+files (--drop-before). query() only opens the months that overlap the
+requested time range.
+
+    python -m services.audit --start 2025-01-01 --end 2025-02-01 [--user-id 1] [--action law.edit]
+    python -m services.audit --drop-before 2024-01
+"""
+import argparse
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, request, session
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+FILE_PATTERN = re.compile(r'audit-(\d{4}-\d{2})\.db$')
+TIMESTAMP = '%Y-%m-%d %H:%M:%S'
+COLUMNS = ('user_id', 'role', 'action', 'target_type', 'target_id', 'details', 'ip_address', 'created_at')
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS audit_logs (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        role TEXT,
+        action TEXT NOT NULL,
+        target_type TEXT,
+        target_id INTEGER,
+        details TEXT,
+        ip_address TEXT,
+        created_at TEXT NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_logs (created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_user_created ON audit_logs (user_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_audit_action_created ON audit_logs (action, created_at)',
+]
+
+
+def partition_path(month, directory=None):
+    return os.path.join(directory or Config.AUDIT_DIR, f'audit-{month}.db')
+
+
+def partitions(directory=None):
+    """{month: path} of the partition files on disk"""
+    found = {}
+    for path in glob.glob(os.path.join(directory or Config.AUDIT_DIR, 'audit-*.db')):
+        match = FILE_PATTERN.search(path)
+        if match:
+            found[match.group(1)] = path
+    return found
+
+
+class AuditWriter:
+    def __init__(self, directory=None, max_batch=None, flush_ms=None, queue_size=None):
+        self.directory = directory or Config.AUDIT_DIR
+        self.max_batch = max_batch or Config.AUDIT_MAX_BATCH
+        self.max_delay = (Config.AUDIT_FLUSH_MS if flush_ms is None else flush_ms) / 1000
+        self.pid = os.getpid()
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size or Config.AUDIT_QUEUE_SIZE)
+        self._connections = {}  # month -> open partition connection
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self):
+        """False once the thread has exited, whether stopped or crashed"""
+        return self._thread.is_alive()
+
+    def record(self, entry):
+        """Queue an entry dict (COLUMNS keys); dropped and counted when the buffer is full"""
+        if self._stopping.is_set():
+            return False
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything queued before this call is written; False on timeout"""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout=5):
+        """Write everything queued so far and stop the thread"""
+        self._stopping.set()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass  # still draining a full queue; the join below bounds the wait either way
+        self._thread.join(timeout)
+
+    def _collect(self):
+        """Block for the first entry, then gather more until the batch is full, the delay
+        expires or someone is waiting on flush()"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch and not isinstance(batch[-1], threading.Event):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # see it again on the next round
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._collect()
+                if batch is None:
+                    break
+                self._write(batch)
+        finally:
+            for conn in self._connections.values():
+                conn.close()
+
+    def _connect(self, month):
+        conn = self._connections.get(month)
+        if conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(partition_path(month, self.directory), timeout=Config.DB_BUSY_TIMEOUT / 1000)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            # Only the current and previous month still get entries
+            for old in sorted(self._connections)[:-1]:
+                self._connections.pop(old).close()
+            self._connections[month] = conn
+        return conn
+
+    def _write(self, batch):
+        by_month = {}
+        waiting = []
+        for entry in batch:
+            if isinstance(entry, threading.Event):
+                waiting.append(entry)
+            else:
+                by_month.setdefault(entry['created_at'][:7], []).append(entry)
+        for month, entries in sorted(by_month.items()):
+            try:
+                conn = self._connect(month)
+                with conn:
+                    conn.executemany(f'''
+                        INSERT INTO audit_logs ({', '.join(COLUMNS)})
+                        VALUES ({', '.join(':' + column for column in COLUMNS)})
+                    ''', entries)
+            except (sqlite3.Error, OSError) as e:
+                # OSError: the audit directory could not be created
+                self.dropped += len(entries)
+                logger.error('Audit write failed for %s, %d entries dropped: %s', month, len(entries), e)
+        for done in waiting:
+            done.set()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    """Return this process's audit writer, starting it on first use (and again after a fork or if it died)"""
+    global _writer
+    writer = _writer
+    if writer is None or writer.pid != os.getpid() or not writer.alive:
+        with _writer_lock:
+            writer = _writer
+            if writer is None or writer.pid != os.getpid() or not writer.alive:
+                writer = _writer = AuditWriter()
+    return writer
+
+
+@atexit.register
+def _shutdown():
+    if _writer is not None and _writer.pid == os.getpid():
+        _writer.stop()
+
+
+def record(action, target_type=None, target_id=None, details=None, user_id=None, role=None, ip_address=None):
+    """Queue one audit entry stamped with the current time"""
+    return get_audit_writer().record({
+        'user_id': user_id,
+        'role': role,
+        'action': action,
+        'target_type': target_type,
+        'target_id': target_id,
+        'details': json.dumps(details, default=str) if details else None,
+        'ip_address': ip_address,
+        'created_at': datetime.now().strftime(TIMESTAMP),
+    })
+
+
+def _request_details():
+    """Submitted fields (minus anything password-like), clipped to keep entries small"""
+    fields = dict(request.form.items())
+    body = request.get_json(silent=True) if request.is_json else None
+    if isinstance(body, dict):
+        fields.update(body)
+    return {key: value if not isinstance(value, str) else value[:200]
+            for key, value in fields.items() if 'password' not in key.lower()}
+
+
+def audited(action, target_type=None, target=None, methods=('POST', 'PUT', 'PATCH', 'DELETE')):
+    """Record an audit entry each time the view handles one of methods.
+
+    target names the URL argument holding the target's id. The entry keeps the
+    submitted fields, the response status and, for JSON responses, the
+    "success" flag the view reported. Apply below @role_required so refused
+    requests are not recorded.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            response = current_app.make_response(f(*args, **kwargs))
+            if request.method in methods:
+                details = _request_details()
+                details['status'] = response.status_code
+                if response.is_json and not response.is_streamed:
+                    outcome = response.get_json(silent=True)
+                    if isinstance(outcome, dict) and 'success' in outcome:
+                        details['success'] = outcome['success']
+                record(action, target_type, kwargs.get(target) if target else None, details,
+                       user_id=session.get('user_id'), role=session.get('role'), ip_address=request.remote_addr)
+            return response
+        return decorated_function
+    return decorator
+
+
+def _months(start, end):
+    """Months (YYYY-MM) from start's through end's, inclusive"""
+    year, month = int(start[:4]), int(start[5:7])
+    last = (int(end[:4]), int(end[5:7]))
+    while (year, month) <= last:
+        yield f'{year:04d}-{month:02d}'
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def query(start=None, end=None, user_id=None, action=None, target_type=None, target_id=None, limit=100,
+          directory=None):
+    """Entries with start <= created_at < end matching the filters, newest first.
+
+    Only partitions whose month overlaps [start, end) are opened, newest
+    first, and reading stops once limit entries are found.
+    """
+    files = partitions(directory)
+    if not files:
+        return []
+    months = sorted(files)
+    if start or end:
+        wanted = set(_months(start or months[0], end or months[-1]))
+        if end and end[7:] in ('', '-01', '-01 00:00:00', '-01T00:00:00'):
+            wanted.discard(end[:7])  # end is exclusive, so its month is not needed
+        months = [month for month in months if month in wanted]
+
+    conditions, params = [], []
+    for column, op, value in (('created_at', '>=', start), ('created_at', '<', end), ('user_id', '=', user_id),
+                              ('action', '=', action), ('target_type', '=', target_type),
+                              ('target_id', '=', target_id)):
+        if value is not None:
+            conditions.append(f'{column} {op} ?')
+            params.append(value)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    entries = []
+    for month in reversed(months):
+        if len(entries) >= limit:
+            break
+        conn = sqlite3.connect(f'file:{files[month]}?mode=ro', uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(f'''
+                SELECT id, {', '.join(COLUMNS)} FROM audit_logs {where}
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            ''', (*params, limit - len(entries))).fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            entry = dict(row)
+            entry['details'] = json.loads(entry['details']) if entry['details'] else None
+            entries.append(entry)
+    return entries
+
+
+def drop_before(month, directory=None):
+    """Delete the partitions of months before month (YYYY-MM); returns the months removed"""
+    removed = []
+    for name, path in sorted(partitions(directory).items()):
+        if name < month:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            removed.append(name)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query or prune the monthly audit partitions')
+    parser.add_argument('--start', help='first timestamp, e.g. 2025-01-01')
+    parser.add_argument('--end', help='timestamp to stop before')
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--action')
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--drop-before', metavar='YYYY-MM', help='delete partitions older than this month')
+    args = parser.parse_args(argv)
+
+    if args.drop_before:
+        removed = drop_before(args.drop_before)
+        print(f"Dropped {len(removed)} partition(s){': ' + ', '.join(removed) if removed else ''}")
+        return 0
+    for entry in query(args.start, args.end, user_id=args.user_id, action=args.action, limit=args.limit):
+        print(json.dumps(entry))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
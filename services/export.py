@@ -0,0 +1,133 @@
+"""Streaming exports of violation_records with payment details.
+
+    python -m services.export --format csv --start 2026-01-01 --end 2026-01-31 > january.csv
+    python -m services.export --format jsonl --status unpaid --officer-id 3 -o unpaid.jsonl
+
+Rows are stepped out of SQLite with fetchmany() and written in small chunks,
+so memory stays flat however many rows match. The same generators back
+/admin/payments/export.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from utils.db import get_db
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+PAYMENT_STATUSES = ('paid', 'unpaid', 'pending', 'overdue')
+EXPORT_COLUMNS = ('id', 'created_at', 'driver_name', 'license_number', 'plate_number', 'vehicle_type',
+                  'speed', 'violations', 'total_fine', 'status', 'payment_status', 'payment_date',
+                  'location', 'officer_badge', 'officer_name', 'reported_by')
+FETCH_SIZE = 1000
+
+
+def parse_date(value):
+    """YYYY-MM-DD -> same string, or raise ValueError"""
+    return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+
+
+def export_query(start=None, end=None, payment_status=None, officer_id=None):
+    """SQL and params for the filtered export, oldest first (end date inclusive)"""
+    conditions, params = [], []
+    if start:
+        conditions.append('vr.created_at >= ?')
+        params.append(parse_date(start))
+    if end:
+        conditions.append("vr.created_at < date(?, '+1 day')")
+        params.append(parse_date(end))
+    if payment_status:
+        if payment_status not in PAYMENT_STATUSES:
+            raise ValueError(f'Unknown payment status {payment_status!r}')
+        conditions.append('vr.payment_status = ?')
+        params.append(payment_status)
+    if officer_id is not None:
+        conditions.append('vr.officer_id = ?')
+        params.append(int(officer_id))
+    sql = '''
+        SELECT vr.id, vr.created_at, vr.driver_name, vr.license_number, vr.plate_number, vr.vehicle_type,
+               vr.speed, vr.violations, vr.total_fine, vr.status, vr.payment_status, vr.payment_date,
+               vr.location, o.badge_number as officer_badge, uo.username as officer_name,
+               u.username as reported_by
+        FROM violation_records vr
+        LEFT JOIN users u ON vr.user_id = u.id
+        LEFT JOIN officers o ON vr.officer_id = o.id
+        LEFT JOIN users uo ON o.user_id = uo.id
+    '''
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    return sql + ' ORDER BY vr.created_at, vr.id', params
+
+
+def iter_rows(**filters):
+    """Yield export rows as tuples, FETCH_SIZE at a time, from one connection"""
+    sql, params = export_query(**filters)
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.arraysize = FETCH_SIZE
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def iter_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_jsonl(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + '\n' for row in rows)
+
+
+def export(fmt='csv', **filters):
+    """Chunks of CSV or JSONL text for the filtered rows"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format {fmt!r}')
+    export_query(**filters)  # validate filters before the first chunk is sent
+    batches = iter_rows(**filters)
+    return iter_csv(batches) if fmt == 'csv' else iter_jsonl(batches)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export violations and payment details as CSV or JSONL')
+    parser.add_argument('--format', choices=tuple(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--start', help='first day, YYYY-MM-DD')
+    parser.add_argument('--end', help='last day (inclusive), YYYY-MM-DD')
+    parser.add_argument('--status', choices=PAYMENT_STATUSES, help='payment status')
+    parser.add_argument('--officer-id', type=int)
+    parser.add_argument('-o', '--output', help='file to write (default: stdout)')
+    args = parser.parse_args(argv)
+
+    try:
+        chunks = export(args.format, start=args.start, end=args.end,
+                        payment_status=args.status, officer_id=args.officer_id)
+    except ValueError as e:
+        parser.error(str(e))
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
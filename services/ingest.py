@@ -0,0 +1,237 @@
+"""Bulk violation ingest for camera and radar exports.
+
+    python -m services.ingest export.csv
+    python -m services.ingest events.ndjson --chunk-size 20000 --officer-id 3
+
+Rows are streamed from a CSV or NDJSON file, evaluated by the expert system
+one chunk at a time and written to violation_records with executemany, one
+transaction per chunk. Each transaction also records how far into the file
+it got, so an interrupted run picks up where the last committed chunk ended.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from models.violation import Violation
+from utils.db import get_db, init_db
+from utils.expert_system import check_violations, get_rules, result_items
+from utils.expert_batch import check_violations_batch, encode_facts, np
+
+# Input column -> fact name; the first alias present wins
+FACT_ALIASES = {
+    'vehicle': ('vehicle', 'vehicle_type'),
+    'helmet': ('helmet', 'has_helmet'),
+    'speed': ('speed',),
+    'license': ('license', 'has_license'),
+    'registration': ('registration',),
+    'red_light': ('red_light',),
+    'phone': ('phone',),
+    'alcohol': ('alcohol',),
+}
+# Record fields a row may carry; API callers only get CLIENT_RECORD_FIELDS, the
+# officer, owner and timestamp of their records come from the server
+CLIENT_RECORD_FIELDS = ('driver_name', 'license_number', 'plate_number', 'location', 'description')
+RECORD_FIELDS = CLIENT_RECORD_FIELDS + ('officer_id', 'user_id', 'created_at')
+
+
+class RejectedRow(ValueError):
+    pass
+
+
+def read_rows(path, fmt=None):
+    """Yield (offset, row) for every data row; rows are dicts, or None when unparseable"""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, newline='' if fmt == 'csv' else None, encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.reader(f)
+            header = next(reader, [])
+            # zip() into a dict is much cheaper than csv.DictReader per row
+            for offset, values in enumerate(reader):
+                yield offset, dict(zip(header, values)) if len(values) == len(header) else None
+        else:
+            for offset, line in enumerate(f):
+                try:
+                    yield offset, json.loads(line)
+                except json.JSONDecodeError:
+                    yield offset, None
+
+
+_YES_NO_FACTS = ('helmet', 'license', 'registration', 'red_light', 'phone', 'alcohol')
+_CANONICAL_FLAGS = frozenset(('yes', 'no', 'na'))
+_FACT_DEFAULTS = {'registration': 'yes', 'red_light': 'no', 'phone': 'no', 'alcohol': 'no'}  # as on the officer form
+
+
+def parse_row(row, fields=RECORD_FIELDS):
+    """Split a raw row into (facts, record) or raise RejectedRow; record only takes the given fields"""
+    if not isinstance(row, dict):
+        raise RejectedRow('malformed row')
+    get = row.get
+    facts = {}
+    for fact, aliases in FACT_ALIASES.items():
+        value = None
+        for name in aliases:
+            value = get(name)
+            if value not in (None, ''):
+                break
+        if isinstance(value, (dict, list)):
+            raise RejectedRow(f'invalid {fact}')
+        facts[fact] = value
+    vehicle = facts['vehicle']
+    if not vehicle:
+        raise RejectedRow('missing vehicle')
+    facts['vehicle'] = str(vehicle).strip().lower()
+    try:
+        facts['speed'] = int(facts['speed'] or 0)
+    except (TypeError, ValueError):
+        try:
+            facts['speed'] = int(float(facts['speed']))
+        except (TypeError, ValueError):
+            raise RejectedRow('invalid speed')
+    for fact in _YES_NO_FACTS:
+        value = facts[fact]
+        if value in (None, ''):
+            facts[fact] = _FACT_DEFAULTS.get(fact)
+        elif value not in _CANONICAL_FLAGS:
+            facts[fact] = str(value).strip().lower()
+    if not get('plate_number'):
+        raise RejectedRow('missing plate_number')
+    record = {field: get(field) or None for field in fields}
+    for field, value in record.items():
+        if isinstance(value, (dict, list)):
+            raise RejectedRow(f'invalid {field}')
+    return facts, record
+
+
+def build_record(facts, record, fine, violations_json, status, officer_id=None, items=()):
+    """Fill a parsed record with the evaluated facts, ready for Violation.insert_many"""
+    record.update(
+        officer_id=record.get('officer_id') or officer_id,
+        vehicle_type=facts['vehicle'],
+        has_helmet=facts['helmet'],
+        speed=facts['speed'],
+        has_license=facts['license'],
+        violations=violations_json,
+        items=items,
+        total_fine=fine,
+        status=status,
+    )
+    return record
+
+
+def evaluate(facts_list):
+    """Run the expert system over one chunk; returns [(fine, violations_json, is_violation, items)]"""
+    rules = get_rules()
+    if np is not None:
+        batch = check_violations_batch(rule_table=rules, **encode_facts(facts_list))
+        rendered = {}
+        out = []
+        for i, mask in enumerate(batch.law_mask.tolist()):
+            if not mask:
+                out.append((0, '[]', False, ()))
+                continue
+            key = (mask, facts_list[i]['speed'])
+            cached = rendered.get(key)
+            if cached is None:
+                cached = rendered[key] = (json.dumps(batch.violations(i)), batch.items(i))
+            text, items = cached
+            out.append((int(batch.fines[i]), text, True, items))
+        return out
+    out = []
+    for facts in facts_list:
+        result = check_violations(facts, rules)
+        out.append((result['fine'], json.dumps(list(result['violations'])), result['status'] == 'violation',
+                    result_items(result, rules)))
+    return out
+
+
+def get_checkpoint(cursor, source):
+    row = cursor.execute('SELECT row_offset FROM ingest_checkpoints WHERE source = ?', (source,)).fetchone()
+    return row[0] if row else 0
+
+
+def ingest(path, fmt=None, chunk_size=10000, officer_id=None, status='confirmed',
+           keep_legal=False, restart=False, out=sys.stdout):
+    """Stream a file into violation_records; returns a stats dict"""
+    source = os.path.abspath(path)
+    stats = Counter()
+    rejects = Counter()
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        start_offset = 0 if restart else get_checkpoint(cursor, source)
+        if start_offset:
+            print(f"Resuming {path} from row {start_offset:,}", file=out)
+        rows = read_rows(path, fmt)
+        if start_offset:
+            rows = islice(rows, start_offset, None)
+
+        started = time.perf_counter()
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            parsed = []
+            for offset, row in chunk:
+                try:
+                    parsed.append(parse_row(row))
+                except RejectedRow as e:
+                    rejects[str(e)] += 1
+            records = []
+            for (facts, record), (fine, violations, is_violation, items) in zip(parsed, evaluate([p[0] for p in parsed])):
+                if not is_violation and not keep_legal:
+                    stats['legal'] += 1
+                    continue
+                records.append(build_record(facts, record, fine, violations, status, officer_id, items))
+
+            cursor.execute('BEGIN IMMEDIATE')
+            Violation.insert_many(cursor, records)
+            cursor.execute('''
+                INSERT INTO ingest_checkpoints (source, row_offset, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(source) DO UPDATE SET row_offset = excluded.row_offset, updated_at = excluded.updated_at
+            ''', (source, chunk[-1][0] + 1, datetime.now()))
+            conn.commit()
+
+            stats['read'] += len(chunk)
+            stats['inserted'] += len(records)
+        elapsed = time.perf_counter() - started
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    stats['rejected'] = sum(rejects.values())
+    stats['seconds'] = elapsed
+    stats['rows_per_second'] = stats['read'] / elapsed if elapsed else 0
+    stats['rejects'] = dict(rejects)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-load violation events from CSV or NDJSON')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'ndjson'), help='default: from the file extension')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='rows per transaction (default: %(default)s)')
+    parser.add_argument('--officer-id', type=int, help='officer_id for rows that do not carry one')
+    parser.add_argument('--status', default='confirmed', help='status for inserted records (default: %(default)s)')
+    parser.add_argument('--keep-legal', action='store_true', help='also store rows with no violation')
+    parser.add_argument('--restart', action='store_true', help='ignore the saved checkpoint and start at row 0')
+    args = parser.parse_args(argv)
+
+    init_db()
+    stats = ingest(args.path, args.format, args.chunk_size, args.officer_id, args.status,
+                   args.keep_legal, args.restart)
+    print(f"Read {stats['read']:,} rows in {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s)")
+    print(f"Inserted {stats['inserted']:,}, legal/skipped {stats['legal']:,}, rejected {stats['rejected']:,}")
+    for reason, count in sorted(stats['rejects'].items()):
+        print(f"  {reason}: {count:,}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
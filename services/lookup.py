@@ -0,0 +1,266 @@
+"""Roadside lookup of a vehicle's or driver's history by plate or license number.
+
+Plates and licenses are typed inconsistently ("pp 2a-1234", "PP2A1234"), so
+violation_records carries normalized keys, plate_key and license_key:
+generated columns that drop the KEY_SEPARATORS and upper-case the rest. Each
+has an index that also covers created_at, payment_status and total_fine, so
+summary() answers from one indexed statement.
+
+Every key ever seen is kept in lookup_keys with an FTS5 trigram index over
+it. When a lookup finds nothing, suggest() offers known keys one typo away
+(probed through the (kind, key) index) and keys containing what was typed (a
+trigram substring query, for a partly read plate), the ones sharing most
+trigrams with the input first.
+
+    python -m services.lookup --rebuild          # refill lookup_keys and its trigram index
+    python -m services.lookup --plate "pp 2a-1234"
+"""
+import argparse
+import json
+import string
+import sys
+import time
+from models.offense_counters import COUNTED
+from utils.db import get_db
+
+KINDS = {'plate': 'plate_number', 'license': 'license_number'}
+KEY_SEPARATORS = ' -./_'
+RECENT_LIMIT = 5
+# suggest(): newest keys containing the input that are considered, and the
+# longest input whose one-typo neighbours are probed (~70 per character)
+SUBSTRING_CANDIDATES = 50
+MAX_EDIT_KEY_LENGTH = 16
+# Still owed: not paid, and an offense by the same test as the repeat-offender counters
+OWED = f"v.payment_status != 'paid' AND {COUNTED.format(row='v')}"
+
+_KEY_ALPHABET = string.ascii_uppercase + string.digits
+_NORMALIZE = str.maketrans({**{ch: None for ch in KEY_SEPARATORS},
+                            **{chr(c): chr(c - 32) for c in range(ord('a'), ord('z') + 1)}})
+
+
+def normalize_key(value):
+    """Python twin of key_expression(): drop separators, upper-case ASCII letters"""
+    return (value or '').translate(_NORMALIZE) or None
+
+
+def key_expression(column):
+    """SQL expression for the normalized key of column (NULL when blank)"""
+    expression = column
+    for separator in KEY_SEPARATORS:
+        expression = f"replace({expression}, '{separator}', '')"
+    # upper() only folds ASCII, exactly like _NORMALIZE
+    return f"NULLIF(upper({expression}), '')"
+
+
+def _kind_column(kind):
+    if kind not in KINDS:
+        raise ValueError(f'unknown lookup kind: {kind}')
+    return f'{kind}_key'
+
+
+def _record_keys(row):
+    return ''.join(f'''
+            INSERT OR IGNORE INTO lookup_keys (kind, key)
+            SELECT '{kind}', {row}.{kind}_key WHERE {row}.{kind}_key IS NOT NULL;''' for kind in KINDS)
+
+
+def schema_statements(existing_columns=()):
+    """DDL for the key columns, their indexes, lookup_keys and its triggers (current schema; migration 9 runs a frozen copy)"""
+    statements = [
+        f'ALTER TABLE violation_records ADD COLUMN {kind}_key TEXT GENERATED ALWAYS AS ({key_expression(column)}) VIRTUAL'
+        for kind, column in KINDS.items() if f'{kind}_key' not in existing_columns
+    ]
+    statements += [
+        f'''
+        CREATE INDEX IF NOT EXISTS idx_violations_{kind}_key
+        ON violation_records ({kind}_key, created_at, payment_status, total_fine)
+        ''' for kind in KINDS
+    ]
+    return statements + [
+        '''
+        CREATE TABLE IF NOT EXISTS lookup_keys (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            UNIQUE (kind, key)
+        )
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS lookup_key_trigrams USING fts5(
+            key, kind UNINDEXED, content='lookup_keys', content_rowid='id', tokenize='trigram'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS lookup_keys_index AFTER INSERT ON lookup_keys
+        BEGIN
+            INSERT INTO lookup_key_trigrams (rowid, key, kind) VALUES (NEW.id, NEW.key, NEW.kind);
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS lookup_keys_insert AFTER INSERT ON violation_records
+        BEGIN {_record_keys('NEW')}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS lookup_keys_update
+        AFTER UPDATE OF {', '.join(KINDS.values())} ON violation_records
+        BEGIN {_record_keys('NEW')}
+        END
+        ''',
+    ]
+
+
+def rebuild_keys(cursor):
+    """Refill lookup_keys (and, through its trigger, the trigram index); the caller commits.
+
+    Keys whose violations were deleted or re-typed are only dropped here.
+    """
+    cursor.execute("INSERT INTO lookup_key_trigrams (lookup_key_trigrams) VALUES ('delete-all')")
+    cursor.execute('DELETE FROM lookup_keys')
+    for kind in KINDS:
+        # The key index hands the keys over already sorted and distinct
+        cursor.execute(f'''
+            INSERT INTO lookup_keys (kind, key)
+            SELECT DISTINCT '{kind}', {kind}_key FROM violation_records WHERE {kind}_key IS NOT NULL
+        ''')
+    cursor.execute("INSERT INTO lookup_key_trigrams (lookup_key_trigrams) VALUES ('optimize')")
+
+
+def summary(kind, value, recent=RECENT_LIMIT):
+    """History for one plate or license: counts, unpaid totals, open appeals and the latest violations"""
+    column = _kind_column(kind)
+    key = normalize_key(value)
+    result = {'kind': kind, 'query': value, 'key': key, 'violations': 0, 'unpaid_count': 0,
+              'unpaid_total': 0, 'open_appeals': 0, 'first_seen': None, 'last_seen': None, 'recent': []}
+    if key is None:
+        return result
+    conn = get_db()
+    row = conn.execute(f'''
+        SELECT COUNT(*) as violations,
+               COALESCE(SUM({OWED}), 0) as unpaid_count,
+               COALESCE(SUM(CASE WHEN {OWED} THEN v.total_fine END), 0) as unpaid_total,
+               MIN(v.created_at) as first_seen,
+               MAX(v.created_at) as last_seen,
+               -- CROSS JOIN keeps SQLite from walking every pending appeal instead
+               (SELECT COUNT(*) FROM violation_records av CROSS JOIN appeals a ON a.violation_id = av.id
+                WHERE av.{column} = ?1 AND a.status = 'pending') as open_appeals,
+               (SELECT json_group_array(json_object(
+                           'id', r.id, 'created_at', r.created_at, 'driver_name', r.driver_name,
+                           'plate_number', r.plate_number, 'license_number', r.license_number,
+                           'vehicle_type', r.vehicle_type, 'violations', r.violations,
+                           'total_fine', r.total_fine, 'status', r.status, 'payment_status', r.payment_status))
+                FROM (SELECT * FROM violation_records WHERE {column} = ?1
+                      ORDER BY created_at DESC LIMIT ?2) r) as recent
+        FROM violation_records v
+        WHERE v.{column} = ?1
+    ''', (key, recent)).fetchone()
+    conn.close()
+    result.update({k: row[k] for k in row.keys() if k != 'recent'})
+    for item in json.loads(row['recent']):
+        try:
+            item['violations'] = json.loads(item['violations'] or '[]')
+        except ValueError:
+            pass  # legacy free-text value, return it as stored
+        result['recent'].append(item)
+    return result
+
+
+def _trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def _one_typo(key):
+    """Every key one dropped, extra, wrong or swapped character away from key"""
+    splits = [(key[:i], key[i:]) for i in range(len(key) + 1)]
+    edits = {head + tail[1:] for head, tail in splits if tail}
+    edits |= {head + tail[1] + tail[0] + tail[2:] for head, tail in splits if len(tail) > 1}
+    edits |= {head + ch + tail[1:] for head, tail in splits if tail for ch in _KEY_ALPHABET}
+    edits |= {head + ch + tail for head, tail in splits for ch in _KEY_ALPHABET}
+    edits.discard(key)
+    return edits
+
+
+def _similarity(grams, key):
+    other = _trigrams(key)
+    return len(grams & other) / (len(grams | other) or 1)
+
+
+def suggest(kind, value, limit=5):
+    """Known keys close to value, most similar by trigram overlap first, with their violation counts"""
+    column = _kind_column(kind)
+    key = normalize_key(value)
+    if key is None:
+        return []
+    conn = get_db()
+    cursor = conn.cursor()
+    candidates = set()
+    if len(key) <= MAX_EDIT_KEY_LENGTH:
+        cursor.execute('''
+            SELECT key FROM lookup_keys WHERE kind = ? AND key IN (SELECT value FROM json_each(?))
+        ''', (kind, json.dumps(sorted(_one_typo(key)))))
+        candidates.update(row[0] for row in cursor.fetchall())
+    if len(key) >= 3:
+        # A trigram index answers substring queries: "1234" finds PP2A1234
+        cursor.execute('''
+            SELECT lk.key FROM lookup_key_trigrams
+            JOIN lookup_keys lk ON lk.id = lookup_key_trigrams.rowid
+            WHERE lookup_key_trigrams MATCH ? AND lk.kind = ?
+            ORDER BY lookup_key_trigrams.rowid DESC
+            LIMIT ?
+        ''', ('"' + key.replace('"', '""') + '"', kind, SUBSTRING_CANDIDATES))
+        candidates.update(row[0] for row in cursor.fetchall())
+    candidates.discard(key)
+    grams = _trigrams(key)
+    best = dict(sorted(((candidate, _similarity(grams, candidate)) for candidate in candidates),
+                       key=lambda item: (-item[1], item[0]))[:limit])
+    if not best:
+        conn.close()
+        return []
+
+    # Latest spelling and violation count per key; keys with no violations left are dropped
+    cursor.execute(f'''
+        SELECT {column} as key, {KINDS[kind]} as display, COUNT(*) as violations, MAX(created_at) as last_seen
+        FROM violation_records
+        WHERE {column} IN ({', '.join('?' * len(best))})
+        GROUP BY {column}
+    ''', list(best))
+    rows = {row['key']: dict(row) for row in cursor.fetchall()}
+    conn.close()
+    return [dict(rows[candidate], similarity=round(similarity, 2))
+            for candidate, similarity in best.items() if candidate in rows]
+
+
+def lookup(kind, value, recent=RECENT_LIMIT):
+    """summary(), plus fuzzy suggestions when nothing is on record for the exact key"""
+    result = summary(kind, value, recent)
+    result['suggestions'] = suggest(kind, value) if not result['violations'] else []
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Look up a plate or license, or rebuild the lookup keys')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--plate')
+    group.add_argument('--license')
+    parser.add_argument('--rebuild', action='store_true', help='refill lookup_keys from violation_records')
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        started = time.perf_counter()
+        conn = get_db()
+        try:
+            rebuild_keys(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"Rebuilt lookup_keys in {time.perf_counter() - started:.2f}s")
+    if args.plate or args.license:
+        kind = 'plate' if args.plate else 'license'
+        print(json.dumps(lookup(kind, args.plate or args.license), indent=2, default=str))
+    elif not args.rebuild:
+        parser.error('give --plate, --license or --rebuild')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
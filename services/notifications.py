@@ -0,0 +1,265 @@
+"""In-process notification pipeline: publish, persist in batches, push over SSE.
+
+notify() queues a notification and returns at once; it never fails the action
+that triggered it. One background thread per process drains the queue,
+inserts whatever arrived within Config.NOTIFY_MAX_DELAY_MS (or
+Config.NOTIFY_MAX_BATCH rows) in one transaction, and then hands each saved
+notification, id included, to the open event streams of its user
+(subscribe(), served by /api/notifications/stream).
+
+Unread counts come from the trigger-maintained notification_unread table.
+While a user has a stream open the count is held in memory and adjusted as
+this process saves notifications or marks them read. Streams only hear about
+notifications published by their own process, so a stream re-reads the count
+and replays what it missed (Last-Event-ID) whenever it reconnects.
+
+Each open stream holds a worker thread, so subscribe() refuses streams past
+Config.NOTIFY_MAX_STREAMS per process or Config.NOTIFY_MAX_STREAMS_PER_USER
+per user; those pages poll /api/notifications instead.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from config import Config
+from models.notification import Notification
+from utils.db import get_db, get_pool
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One open event stream: a bounded queue of (event, id, data) tuples"""
+
+    def __init__(self, user_id, size):
+        self.user_id = user_id
+        self.events = queue.Queue(maxsize=size)
+        self.overflowed = False
+
+    def push(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # A stalled client; its stream ends and the browser reconnects and replays
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class NotificationHub:
+    def __init__(self, max_batch=None, max_delay_ms=None, queue_size=None, subscriber_queue=None,
+                 max_streams=None, max_streams_per_user=None):
+        self.max_batch = max_batch or Config.NOTIFY_MAX_BATCH
+        self.max_delay = (Config.NOTIFY_MAX_DELAY_MS if max_delay_ms is None else max_delay_ms) / 1000
+        self.subscriber_queue = subscriber_queue or Config.NOTIFY_SUBSCRIBER_QUEUE
+        self.max_streams = Config.NOTIFY_MAX_STREAMS if max_streams is None else max_streams
+        self.max_streams_per_user = (Config.NOTIFY_MAX_STREAMS_PER_USER if max_streams_per_user is None
+                                     else max_streams_per_user)
+        self.streams = 0
+        self.pid = os.getpid()
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size or Config.NOTIFY_QUEUE_SIZE)
+        self._subscribers = {}  # user id -> set of Subscription
+        self._unread = {}       # user id -> unread count, for users with an open stream
+        # Held across each commit to notifications and the matching counter
+        # change, so a count read from the table is never double-counted
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='notification-writer', daemon=True)
+        self._thread.start()
+
+    def publish(self, notification):
+        """Queue a notification dict for saving and delivery; False if it had to be dropped"""
+        if self._stopping.is_set():
+            return False
+        try:
+            self._queue.put_nowait(notification)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def subscribe(self, user_id):
+        """Open a stream for user_id; None when this process or this user is at the stream limit"""
+        subscription = Subscription(user_id, self.subscriber_queue)
+        with self._lock:
+            if (self.streams >= self.max_streams
+                    or len(self._subscribers.get(user_id, ())) >= self.max_streams_per_user):
+                return None
+            conn = get_db()
+            self._unread[user_id] = Notification.unread(conn, user_id)
+            conn.close()
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self.streams += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self.streams -= 1
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+                    self._unread.pop(subscription.user_id, None)
+
+    def unread(self, user_id):
+        """Unread count: from memory while the user has a stream open, else one primary-key read"""
+        count = self._unread.get(user_id)
+        if count is None:
+            conn = get_db()
+            count = Notification.unread(conn, user_id)
+            conn.close()
+        return count
+
+    def mark_read(self, user_id, ids=None):
+        """Mark notifications read (all, or just ids) and return the new unread count"""
+        with self._lock:
+            conn = get_db()
+            try:
+                Notification.mark_read(conn, user_id, ids)
+                conn.commit()
+                count = Notification.unread(conn, user_id)
+            finally:
+                conn.close()
+            if user_id in self._unread:
+                self._unread[user_id] = count
+                self._push(user_id, ('unread', None, {'unread': count}))
+        return count
+
+    def stop(self, timeout=5):
+        """Save everything queued so far and stop the thread"""
+        self._stopping.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _push(self, user_id, event):
+        for subscription in self._subscribers.get(user_id, ()):
+            subscription.push(event)
+
+    def _collect(self):
+        """Block for the first notification, then gather more until the batch is full or the delay expires"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # see it again on the next round
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        conn = get_pool().connect()
+        try:
+            while True:
+                batch = self._collect()
+                if batch is None:
+                    break
+                self._write(conn, batch)
+        finally:
+            conn.discard()
+
+    def _write(self, conn, batch):
+        cursor = conn.cursor()
+        with self._lock:
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                ids = Notification.insert_many(cursor, batch)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                self.dropped += len(batch)
+                logger.error('Notification write failed, %d dropped: %s', len(batch), e)
+                return
+            for notification, notification_id in zip(batch, ids):
+                notification['id'] = notification_id
+                user_id = notification['user_id']
+                if user_id in self._unread:
+                    self._unread[user_id] += 1
+                    self._push(user_id, ('notification', notification_id,
+                                         dict(notification, unread=self._unread[user_id])))
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """Return this process's hub, starting it on first use (and again after a fork)"""
+    global _hub
+    hub = _hub
+    if hub is None or hub.pid != os.getpid():
+        with _hub_lock:
+            hub = _hub
+            if hub is None or hub.pid != os.getpid():
+                hub = _hub = NotificationHub()
+    return hub
+
+
+@atexit.register
+def _shutdown():
+    if _hub is not None and _hub.pid == os.getpid():
+        _hub.stop()
+
+
+def notify(user_id, notification_type, title, message, related_id=None):
+    """Queue a notification for user_id (nothing happens for None, e.g. officer-recorded stops)"""
+    if user_id is None:
+        return False
+    return get_hub().publish({
+        'user_id': user_id,
+        'title': title,
+        'message': message,
+        'notification_type': notification_type,
+        'related_id': related_id,
+        'is_read': 0,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    })
+
+
+def notify_violation(violation_id, record):
+    """A violation was recorded against record['user_id']"""
+    return notify(record.get('user_id'), 'violation', 'Violation recorded',
+                  f"A violation with a fine of {record.get('total_fine') or 0:,} KHR was recorded against you.",
+                  violation_id)
+
+
+def notify_appeal(user_id, appeal_id, status, response=None):
+    """An appeal was approved or rejected"""
+    message = f'Your appeal #{appeal_id} was {status}.'
+    if response:
+        message += f' Response: {response}'
+    return notify(user_id, 'appeal', f'Appeal {status}', message, appeal_id)
+
+
+def notify_payment(user_id, violation_id, payment_status):
+    """The payment status of one of the user's violations changed"""
+    return notify(user_id, 'payment', 'Payment status updated',
+                  f'Violation #{violation_id} is now marked {payment_status}.', violation_id)
+
+
+def format_event(event, data, event_id=None):
+    """One text/event-stream message"""
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append('data: ' + json.dumps(data, default=str))
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,212 @@
+"""Mark unpaid violations past their grace period as overdue.
+
+    python -m services.overdue                  # sweep once with Config.OVERDUE_GRACE_DAYS
+    python -m services.overdue --grace-days 14 --dry-run
+
+sweep() works in chunks of Config.OVERDUE_SWEEP_CHUNK rows, each its own short
+transaction, pausing between chunks so request writes are never queued behind
+one long lock. Dismissed and zero-fine violations owe nothing and are never
+swept. Every chunk takes the oldest sweepable rows straight off a partial index
+holding only those (migration 17); swept rows leave 'unpaid', so the next chunk
+simply takes the next oldest. violation_stats and the report
+rollups follow through their triggers, so the dashboards need no rebuild.
+
+Each app process runs an OverdueSweeper thread every
+Config.OVERDUE_SWEEP_INTERVAL seconds (0 turns it off). The run is claimed
+through app_state, so with several processes only one sweeps per interval.
+Each run logs its metrics (rows swept, chunks, elapsed time), keeps them as
+last_run, and records an audit entry when it swept anything.
+"""
+import argparse
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from config import Config
+from services import audit
+from services.notifications import notify, notify_payment
+from utils.db import get_db, init_db
+
+logger = logging.getLogger(__name__)
+
+CLAIM_KEY = 'overdue_swept_at'
+# Violations that can go overdue; migration 17's partial index uses the same terms
+SWEEPABLE = "payment_status = 'unpaid' AND status != 'dismissed' AND total_fine > 0"
+
+
+def schema_statements():
+    """Current DDL of the sweep's partial index and app_state claim row (migrations 15 and 17 keep their own)"""
+    return [
+        f'CREATE INDEX IF NOT EXISTS idx_violations_sweepable ON violation_records (payment_status, created_at) '
+        f'WHERE {SWEEPABLE}',
+        f"INSERT OR IGNORE INTO app_state (key, value) VALUES ('{CLAIM_KEY}', 0)",
+    ]
+
+
+def sweep(grace_days=None, chunk=None, pause_ms=None, dry_run=False, notify_users=True):
+    """Mark unpaid fines created more than grace_days ago overdue; returns the run's metrics"""
+    grace_days = Config.OVERDUE_GRACE_DAYS if grace_days is None else grace_days
+    chunk = chunk or Config.OVERDUE_SWEEP_CHUNK
+    pause = (Config.OVERDUE_SWEEP_PAUSE_MS if pause_ms is None else pause_ms) / 1000
+    started = time.perf_counter()
+    swept = chunks = 0
+    by_user = {}
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT datetime('now', ?)", (f'-{grace_days} days',))
+        cutoff = cursor.fetchone()[0]
+        if dry_run:
+            cursor.execute(f'''
+                SELECT COUNT(*) FROM violation_records WHERE {SWEEPABLE} AND created_at < ?
+            ''', (cutoff,))
+            swept = cursor.fetchone()[0]
+        else:
+            while True:
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute(f'''
+                    UPDATE violation_records SET payment_status = 'overdue'
+                    WHERE id IN (
+                        SELECT id FROM violation_records
+                        WHERE {SWEEPABLE} AND created_at < ?
+                        ORDER BY created_at LIMIT ?
+                    )
+                    RETURNING id, user_id
+                ''', (cutoff, chunk))
+                rows = cursor.fetchall()
+                conn.commit()
+                if not rows:
+                    break
+                swept += len(rows)
+                chunks += 1
+                for row in rows:
+                    if row['user_id'] is not None:
+                        by_user.setdefault(row['user_id'], []).append(row['id'])
+                if len(rows) < chunk:
+                    break
+                time.sleep(pause)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    if notify_users:
+        # One notification per user per run, however many of their fines went overdue
+        for user_id, ids in by_user.items():
+            if len(ids) == 1:
+                notify_payment(user_id, ids[0], 'overdue')
+            else:
+                notify(user_id, 'payment', 'Fines overdue', f'{len(ids)} of your violations are now overdue.')
+    return {
+        'cutoff': cutoff,
+        'grace_days': grace_days,
+        'swept': swept,
+        'chunks': chunks,
+        'dry_run': dry_run,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def claim(interval):
+    """Take this interval's sweep; False when another process swept within the last interval seconds"""
+    now = int(time.time())
+    conn = get_db()
+    try:
+        cursor = conn.execute('UPDATE app_state SET value = ? WHERE key = ? AND value <= ?',
+                              (now, CLAIM_KEY, now - interval))
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+class OverdueSweeper:
+    def __init__(self, interval=None):
+        self.interval = Config.OVERDUE_SWEEP_INTERVAL if interval is None else interval
+        self.pid = os.getpid()
+        self.runs = 0
+        self.total_swept = 0
+        self.last_run = None
+        self.last_error = None
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='overdue-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def run_once(self):
+        """Sweep now and record the metrics"""
+        metrics = sweep()
+        self.runs += 1
+        self.total_swept += metrics['swept']
+        self.last_run = dict(metrics, finished_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        logger.info('Overdue sweep: %d row(s) in %d chunk(s), %.3fs (created before %s)',
+                    metrics['swept'], metrics['chunks'], metrics['seconds'], metrics['cutoff'])
+        if metrics['swept']:
+            audit.record('payment.overdue_sweep', details=metrics)
+        return metrics
+
+    def metrics(self):
+        return {'interval': self.interval, 'runs': self.runs, 'total_swept': self.total_swept,
+                'last_run': self.last_run, 'last_error': self.last_error}
+
+    def _run(self):
+        # A short first wait lets the app finish starting before the first sweep
+        delay = min(self.interval, 5)
+        while not self._stopping.wait(delay):
+            delay = self.interval
+            try:
+                if claim(self.interval):
+                    self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error('Overdue sweep failed: %s', e)
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def get_sweeper():
+    """Return this process's sweeper, starting it on first use (and again after a fork); None when disabled"""
+    global _sweeper
+    if Config.OVERDUE_SWEEP_INTERVAL <= 0:
+        return None
+    sweeper = _sweeper
+    if sweeper is None or sweeper.pid != os.getpid():
+        with _sweeper_lock:
+            sweeper = _sweeper
+            if sweeper is None or sweeper.pid != os.getpid():
+                sweeper = _sweeper = OverdueSweeper()
+    return sweeper
+
+
+@atexit.register
+def _shutdown():
+    if _sweeper is not None and _sweeper.pid == os.getpid():
+        _sweeper.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mark unpaid violations past the grace period overdue')
+    parser.add_argument('--grace-days', type=float, help=f'default: {Config.OVERDUE_GRACE_DAYS}')
+    parser.add_argument('--chunk', type=int, help=f'rows per transaction (default: {Config.OVERDUE_SWEEP_CHUNK})')
+    parser.add_argument('--dry-run', action='store_true', help='only count the rows that would be swept')
+    args = parser.parse_args(argv)
+
+    init_db()
+    metrics = sweep(args.grace_days, args.chunk, dry_run=args.dry_run)
+    verb = 'Would mark' if args.dry_run else 'Marked'
+    print(f"{verb} {metrics['swept']:,} violation(s) created before {metrics['cutoff']} overdue "
+          f"in {metrics['chunks']} chunk(s), {metrics['seconds']:.2f}s")
+    if metrics['swept'] and not args.dry_run:
+        audit.record('payment.overdue_sweep', details=metrics)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""Bulk payment reconciliation from bank and mobile-money statement files.
+
+    python -m services.reconcile statement.csv
+    python -m services.reconcile wallet.csv --source wing --dry-run --exceptions wallet-exceptions.csv
+
+Admins can also upload a statement to POST /admin/payments/reconcile.
+
+Each statement line is matched to a violation by, in order: a violation id
+column, a payment reference (payment_reference(), e.g. TV000012345) found in
+the reference/memo text, or the plate number. The statement is the build side
+of an in-memory hash join: its ids, plate keys and transaction ids are
+collected first, and only the violations and earlier transactions they name
+are fetched, in indexed IN (...) batches, however large violation_records is.
+
+All matches are applied in one transaction with executemany: the violations
+are marked paid and every transaction is recorded in payment_transactions, so
+running the same statement again changes nothing. Lines that cannot be
+applied (unmatched, underpaid, already paid, nothing owed, duplicates,
+unreadable) and overpayments (applied, but owed a refund) go to the exceptions
+report. Dismissed and zero-fine violations are never matched: a line naming
+one is reported as nothing_owed.
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from services import audit
+from services.lookup import normalize_key
+from services.notifications import notify_payment
+from utils.db import get_db, init_db
+
+# Statement column -> field; the first alias present in the header wins. Headers
+# are compared lowercased with spaces and hyphens as underscores ("Value Date").
+COLUMN_ALIASES = {
+    'txn_id': ('txn_id', 'transaction_id', 'txn', 'reference_no'),
+    'amount': ('amount', 'amount_khr', 'credit', 'paid'),
+    'violation_id': ('violation_id', 'violation'),
+    'plate': ('plate', 'plate_number'),
+    'reference': ('reference', 'ref', 'memo', 'description', 'narrative', 'details'),
+    'date': ('date', 'paid_at', 'value_date', 'transaction_date'),
+}
+EXCEPTION_FIELDS = ('line', 'txn_id', 'amount', 'violation_id', 'plate', 'reason', 'fine', 'difference')
+IN_BATCH = 500  # keys per IN (...) probe
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%b-%Y')
+TIMESTAMP = '%Y-%m-%d %H:%M:%S'
+
+_REFERENCE = re.compile(r'\bTV(\d{7,})(\d{2})\b', re.IGNORECASE)
+_AMOUNT_JUNK = re.compile(r'[^\d.\-]')
+
+
+def schema_statements():
+    """DDL for the applied-transaction ledger (current schema; migration 14 runs a frozen copy)"""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS payment_transactions (
+            txn_id TEXT PRIMARY KEY,
+            violation_id INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            paid_at TIMESTAMP,
+            source TEXT,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_payment_transactions_violation ON payment_transactions (violation_id)',
+    ]
+
+
+def payment_reference(violation_id):
+    """Reference a payer quotes for one violation: TV, the zero-padded id and a mod-97 check"""
+    return f'TV{int(violation_id):07d}{98 - (int(violation_id) * 100) % 97:02d}'
+
+
+def parse_reference(text):
+    """Violation id from the first valid payment reference in text, else None"""
+    for match in _REFERENCE.finditer(text or ''):
+        violation_id = int(match.group(1))
+        if payment_reference(violation_id)[-2:] == match.group(2):
+            return violation_id
+    return None
+
+
+def parse_amount(value):
+    """Whole KHR from '12,500', '12500.00 KHR' or '៛12500'; None when unreadable"""
+    try:
+        return int(round(float(_AMOUNT_JUNK.sub('', value or ''))))
+    except ValueError:
+        return None
+
+
+def parse_date(value):
+    """TIMESTAMP string for a statement date in one of DATE_FORMATS; '' for blank, None when unreadable"""
+    if not value:
+        return ''
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime(TIMESTAMP)
+        except ValueError:
+            continue
+    return None
+
+
+def read_statement(f, source):
+    """Yield one dict per line of the statement CSV open in f, with the COLUMN_ALIASES fields"""
+    reader = csv.reader(f)
+    header = [re.sub(r'[\s-]+', '_', name.strip().lower()) for name in next(reader, [])]
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in header:
+                columns[field] = header.index(alias)
+                break
+    if 'amount' not in columns:
+        raise ValueError(f'{source}: no amount column (expected one of {", ".join(COLUMN_ALIASES["amount"])})')
+    for line, values in enumerate(reader, 2):
+        if not any(values):
+            continue
+        row = {field: values[index].strip() if index < len(values) else '' for field, index in columns.items()}
+        violation_id = row.get('violation_id', '')
+        yield {
+            'line': line,
+            # Without a transaction id column, the source and line stand in for one
+            'txn_id': row.get('txn_id') or f'{source}:{line}',
+            'amount': parse_amount(row['amount']),
+            'violation_id': int(violation_id) if violation_id.isdigit() else parse_reference(row.get('reference')),
+            'plate': normalize_key(row.get('plate')),
+            'paid_at': parse_date(row.get('date')),
+        }
+
+
+def _fetch(cursor, sql, keys):
+    """Rows for sql (with one {keys} placeholder list) over keys, IN_BATCH at a time"""
+    keys = list(keys)
+    rows = []
+    for start in range(0, len(keys), IN_BATCH):
+        batch = keys[start:start + IN_BATCH]
+        cursor.execute(sql.format(keys=', '.join('?' * len(batch))), batch)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def _owes(violation):
+    """False for dismissed and zero-fine violations, which no payment can settle"""
+    return violation['status'] != 'dismissed' and (violation['total_fine'] or 0) > 0
+
+
+def match(lines, cursor):
+    """Hash-join statement lines to violations; returns (payments, exceptions).
+
+    payments are (line, violation row) pairs to apply; exceptions are dicts
+    with EXCEPTION_FIELDS.
+    """
+    seen_txns = {row[0] for row in _fetch(
+        cursor, 'SELECT txn_id FROM payment_transactions WHERE txn_id IN ({keys})', {l['txn_id'] for l in lines})}
+    by_id = {row['id']: row for row in _fetch(cursor, '''
+        SELECT id, user_id, plate_key, total_fine, payment_status, status FROM violation_records WHERE id IN ({keys})
+    ''', {l['violation_id'] for l in lines if l['violation_id'] is not None})}
+    # Unpaid violations per plate, oldest first, for lines that only name a plate;
+    # plates whose only unpaid rows owe nothing are kept apart to report them
+    by_plate, owe_nothing = {}, set()
+    for row in _fetch(cursor, '''
+        SELECT id, user_id, plate_key, total_fine, payment_status, status, created_at FROM violation_records
+        WHERE plate_key IN ({keys}) AND payment_status != 'paid'
+    ''', {l['plate'] for l in lines if l['violation_id'] is None and l['plate']}):
+        if _owes(row):
+            by_plate.setdefault(row['plate_key'], []).append(row)
+        else:
+            owe_nothing.add(row['plate_key'])
+    for rows in by_plate.values():
+        rows.sort(key=lambda row: (row['created_at'] or '', row['id']))
+
+    payments, exceptions = [], []
+    claimed = set()   # violations paid earlier in this statement
+    txns = set()
+
+    def exception(line, reason, violation=None):
+        fine = violation['total_fine'] if violation else None
+        exceptions.append({
+            'line': line['line'], 'txn_id': line['txn_id'], 'amount': line['amount'],
+            'violation_id': violation['id'] if violation else line['violation_id'], 'plate': line['plate'],
+            'reason': reason, 'fine': fine,
+            'difference': line['amount'] - (fine or 0) if fine is not None and line['amount'] is not None else None,
+        })
+
+    for line in lines:
+        if line['amount'] is None or line['amount'] <= 0:
+            exception(line, 'invalid_amount')
+            continue
+        if line['paid_at'] is None:
+            exception(line, 'invalid_date')
+            continue
+        if line['txn_id'] in seen_txns or line['txn_id'] in txns:
+            exception(line, 'duplicate_transaction')
+            continue
+        txns.add(line['txn_id'])
+
+        if line['violation_id'] is not None:
+            violation = by_id.get(line['violation_id'])
+            if violation is None:
+                exception(line, 'unknown_violation')
+                continue
+            if not _owes(violation):
+                exception(line, 'nothing_owed', violation)
+                continue
+        else:
+            candidates = [row for row in by_plate.get(line['plate'], ()) if row['id'] not in claimed]
+            if not candidates:
+                exception(line, 'nothing_owed' if line['plate'] in owe_nothing and line['plate'] not in by_plate
+                          else 'unmatched')
+                continue
+            exact = [row for row in candidates if row['total_fine'] == line['amount']]
+            if exact:
+                violation = exact[0]
+            elif len(candidates) == 1:
+                violation = candidates[0]
+            else:
+                exception(line, 'ambiguous_plate')
+                continue
+
+        if violation['payment_status'] == 'paid' or violation['id'] in claimed:
+            exception(line, 'already_paid', violation)
+            continue
+        fine = violation['total_fine'] or 0
+        if line['amount'] < fine:
+            exception(line, 'underpaid', violation)
+            continue
+        if line['amount'] > fine:
+            exception(line, 'overpaid', violation)
+        claimed.add(violation['id'])
+        payments.append((line, violation))
+    return payments, exceptions
+
+
+def reconcile(f, source, dry_run=False, user_id=None):
+    """Match the statement open in f and apply its payments in one transaction; returns a stats dict"""
+    started = time.perf_counter()
+    lines = list(read_statement(f, source))
+    now = datetime.now().strftime(TIMESTAMP)
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        payments, exceptions = match(lines, cursor)
+        cursor.executemany('''
+            UPDATE violation_records SET payment_status = 'paid', payment_date = ?
+            WHERE id = ? AND payment_status != 'paid'
+        ''', [(line['paid_at'] or now, violation['id']) for line, violation in payments])
+        cursor.executemany('''
+            INSERT INTO payment_transactions (txn_id, violation_id, amount, paid_at, source, imported_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(line['txn_id'], violation['id'], line['amount'], line['paid_at'] or now, source, now)
+              for line, violation in payments])
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if not dry_run:
+        for _, violation in payments:
+            notify_payment(violation['user_id'], violation['id'], 'paid')
+    reasons = Counter(e['reason'] for e in exceptions)
+    stats = {
+        'source': source,
+        'lines': len(lines),
+        'applied': len(payments),
+        'amount_applied': sum(line['amount'] for line, _ in payments),
+        'exceptions': exceptions,
+        'exception_counts': dict(reasons),
+        'dry_run': dry_run,
+        'seconds': time.perf_counter() - started,
+    }
+    if not dry_run:
+        audit.record('payment.reconcile', 'statement', user_id=user_id, role='admin' if user_id else None, details={
+            key: stats[key] for key in ('source', 'lines', 'applied', 'amount_applied', 'exception_counts')})
+    return stats
+
+
+def write_exceptions(exceptions, f):
+    writer = csv.DictWriter(f, fieldnames=EXCEPTION_FIELDS)
+    writer.writeheader()
+    writer.writerows(exceptions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mark violations paid from a bank or mobile-money statement')
+    parser.add_argument('path', help='statement CSV')
+    parser.add_argument('--source', help='name recorded with each transaction (default: the file name)')
+    parser.add_argument('--exceptions', help='exceptions report CSV (default: <statement>.exceptions.csv)')
+    parser.add_argument('--dry-run', action='store_true', help='match and report without changing anything')
+    args = parser.parse_args(argv)
+
+    init_db()
+    with open(args.path, newline='', encoding='utf-8-sig') as f:
+        stats = reconcile(f, args.source or os.path.basename(args.path), args.dry_run)
+    report = args.exceptions or os.path.splitext(args.path)[0] + '.exceptions.csv'
+    with open(report, 'w', newline='', encoding='utf-8') as f:
+        write_exceptions(stats['exceptions'], f)
+    verb = 'Would apply' if args.dry_run else 'Applied'
+    print(f"{verb} {stats['applied']:,} of {stats['lines']:,} lines ({stats['amount_applied']:,} KHR) "
+          f"in {stats['seconds']:.2f}s")
+    for reason, count in sorted(stats['exception_counts'].items()):
+        print(f"  {reason}: {count:,}")
+    print(f"Exceptions report: {report}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,374 @@
+"""Time-series violation reports served from incrementally maintained rollups.
+
+report_rollups holds, per hour and per day, the number of violations, fines
+issued (bucketed by created_at) and fines collected (bucketed by
+payment_date) for each dimension:
+
+    all      one row per bucket
+    law      per law code, from violation_items
+    vehicle  per vehicle type
+    officer  per officer id
+    area     per location
+
+Triggers on violation_records add every touched day to report_dirty_days.
+refresh() recomputes only those days, one transaction per day, so the cost
+of a refresh follows the rows written since the last one, not the size of
+the history. Report queries only read rollup rows for the selected range.
+Each app process runs a ReportRefresher thread every
+Config.REPORTS_REFRESH_INTERVAL seconds, so page views never refresh inline.
+
+    python -m services.reports              # refresh dirty days
+    python -m services.reports --rebuild    # mark every day dirty, then refresh
+"""
+import argparse
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from config import Config
+from utils.db import get_db
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ('all', 'law', 'vehicle', 'officer', 'area')
+DEFAULT_RANGE_DAYS = 30
+MAX_HOURLY_DAYS = 2     # ranges up to this many days are charted per hour
+MAX_DAILY_DAYS = 92     # ... up to this many per day, longer ones per month
+MAX_RANGE_DAYS = 3660   # ?days= beyond this is clamped
+
+# Columns of violation_records that feed a rollup; updating any of them dirties its days
+_SOURCE_COLUMNS = ('created_at', 'payment_date', 'payment_status', 'total_fine', 'violations',
+                   'vehicle_type', 'officer_id', 'location')
+
+
+def _mark_dirty(row):
+    return f'''
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date({row}.created_at) WHERE date({row}.created_at) IS NOT NULL;
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date({row}.payment_date) WHERE date({row}.payment_date) IS NOT NULL;'''
+
+
+def schema_statements():
+    """DDL for the rollup tables and dirty-day triggers (current schema; migration 7 runs a frozen copy)"""
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS report_rollups (
+            granularity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            key TEXT NOT NULL,
+            violations INTEGER NOT NULL DEFAULT 0,
+            fines_issued INTEGER NOT NULL DEFAULT 0,
+            payments INTEGER NOT NULL DEFAULT 0,
+            fines_collected INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, dimension, bucket, key)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE TABLE IF NOT EXISTS report_dirty_days (day TEXT PRIMARY KEY) WITHOUT ROWID',
+        # Collected fines are bucketed by payment_date
+        'CREATE INDEX IF NOT EXISTS idx_violations_paid_date ON violation_records (payment_status, payment_date)',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS report_dirty_insert AFTER INSERT ON violation_records
+        BEGIN {_mark_dirty('NEW')}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS report_dirty_delete AFTER DELETE ON violation_records
+        BEGIN {_mark_dirty('OLD')}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS report_dirty_update
+        AFTER UPDATE OF {', '.join(_SOURCE_COLUMNS)} ON violation_records
+        BEGIN {_mark_dirty('OLD')} {_mark_dirty('NEW')}
+        END
+        ''',
+    ]
+
+
+def mark_all_dirty(cursor):
+    """Queue every day that has violations or payments for recomputation"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO report_dirty_days (day)
+        SELECT DISTINCT date(created_at) FROM violation_records WHERE created_at IS NOT NULL
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO report_dirty_days (day)
+        SELECT DISTINCT date(payment_date) FROM violation_records WHERE payment_date IS NOT NULL
+    ''')
+
+
+def _next_day(day):
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def _hour(timestamp):
+    # 'YYYY-MM-DD HH:MM:SS' or ISO 'YYYY-MM-DDTHH:MM:SS.ffffff'
+    return f'{timestamp[:10]} {timestamp[11:13] or "00"}:00'
+
+
+def _aggregate_day(cursor, day):
+    """Hourly rollup values for one day: {(hour, dimension, key): [violations, issued, payments, collected]}"""
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    next_day = _next_day(day)
+
+    def add(timestamp, keys, fine, count_slot, fine_slot):
+        hour = _hour(str(timestamp))
+        fine = fine or 0
+        for dimension, key in keys:
+            row = totals[(hour, dimension, key)]
+            row[count_slot] += 1
+            row[fine_slot] += fine
+
+    cursor.execute('''
+        SELECT created_at, vehicle_type, officer_id, location, total_fine
+        FROM violation_records WHERE created_at >= ? AND created_at < ?
+    ''', (day, next_day))
+    for created_at, vehicle, officer, area, fine in cursor:
+        add(created_at, (('all', ''), ('vehicle', vehicle or ''),
+                         ('officer', '' if officer is None else str(officer)), ('area', area or '')), fine, 0, 1)
+    cursor.execute('''
+        SELECT payment_date, vehicle_type, officer_id, location, total_fine
+        FROM violation_records
+        WHERE payment_date >= ? AND payment_date < ? AND payment_status = 'paid'
+    ''', (day, next_day))
+    for payment_date, vehicle, officer, area, fine in cursor:
+        add(payment_date, (('all', ''), ('vehicle', vehicle or ''),
+                           ('officer', '' if officer is None else str(officer)), ('area', area or '')), fine, 2, 3)
+
+    # Per law: the recorded items of the same rows, with each law's own fine
+    cursor.execute('''
+        SELECT vr.created_at, vi.law_code, vi.fine
+        FROM violation_records vr JOIN violation_items vi ON vi.violation_id = vr.id
+        WHERE vr.created_at >= ? AND vr.created_at < ? AND vi.law_code IS NOT NULL
+    ''', (day, next_day))
+    for created_at, law_code, fine in cursor:
+        add(created_at, (('law', law_code),), fine, 0, 1)
+    cursor.execute('''
+        SELECT vr.payment_date, vi.law_code, vi.fine
+        FROM violation_records vr JOIN violation_items vi ON vi.violation_id = vr.id
+        WHERE vr.payment_date >= ? AND vr.payment_date < ? AND vr.payment_status = 'paid' AND vi.law_code IS NOT NULL
+    ''', (day, next_day))
+    for payment_date, law_code, fine in cursor:
+        add(payment_date, (('law', law_code),), fine, 2, 3)
+    return totals
+
+
+def _write_day(cursor, day, totals):
+    next_day = _next_day(day)
+    for granularity in ('hour', 'day'):
+        for dimension in DIMENSIONS:
+            cursor.execute('''
+                DELETE FROM report_rollups
+                WHERE granularity = ? AND dimension = ? AND bucket >= ? AND bucket < ?
+            ''', (granularity, dimension, day, next_day))
+
+    daily = defaultdict(lambda: [0, 0, 0, 0])
+    for (hour, dimension, key), values in totals.items():
+        day_row = daily[(dimension, key)]
+        for i, value in enumerate(values):
+            day_row[i] += value
+    cursor.executemany('''
+        INSERT INTO report_rollups (granularity, dimension, bucket, key, violations, fines_issued, payments, fines_collected)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [('hour', dimension, hour, key, *values) for (hour, dimension, key), values in totals.items()]
+        + [('day', dimension, day, key, *values) for (dimension, key), values in daily.items()])
+
+
+def refresh(max_days=None):
+    """Recompute the rollups of dirty days, newest first; returns the number of days refreshed"""
+    conn = get_db()
+    cursor = conn.cursor()
+    refreshed = 0
+    try:
+        while max_days is None or refreshed < max_days:
+            row = cursor.execute('SELECT day FROM report_dirty_days ORDER BY day DESC LIMIT 1').fetchone()
+            if row is None:
+                break
+            day = row[0]
+            cursor.execute('BEGIN IMMEDIATE')
+            # Delete first: a write landing after this point dirties the day again
+            cursor.execute('DELETE FROM report_dirty_days WHERE day = ?', (day,))
+            _write_day(cursor, day, _aggregate_day(cursor, day))
+            conn.commit()
+            refreshed += 1
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return refreshed
+
+
+def pending_days():
+    conn = get_db()
+    count = conn.execute('SELECT COUNT(*) FROM report_dirty_days').fetchone()[0]
+    conn.close()
+    return count
+
+
+def rebuild():
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('DELETE FROM report_rollups')
+        mark_all_dirty(cursor)
+        conn.commit()
+    finally:
+        conn.close()
+    return refresh()
+
+
+def resolve_range(start=None, end=None, days=None):
+    """(start_day, end_day) as ISO dates; end is inclusive and defaults to today"""
+    end_day = date.fromisoformat(end) if end else date.today()
+    if start:
+        start_day = date.fromisoformat(start)
+    else:
+        try:
+            start_day = end_day - timedelta(days=min(days or DEFAULT_RANGE_DAYS, MAX_RANGE_DAYS) - 1)
+        except OverflowError:
+            raise ValueError('range starts before the first representable date')
+    if start_day > end_day:
+        raise ValueError('start must not be after end')
+    return start_day.isoformat(), end_day.isoformat()
+
+
+def series(start, end, dimension='all', key=''):
+    """Violations and fines over [start, end], per hour, day or month depending on the span"""
+    span = (date.fromisoformat(end) - date.fromisoformat(start)).days + 1
+    granularity = 'hour' if span <= MAX_HOURLY_DAYS else 'day'
+    bucket = 'substr(bucket, 1, 7)' if span > MAX_DAILY_DAYS else 'bucket'
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {bucket} as bucket, SUM(violations) as violations, SUM(fines_issued) as fines_issued,
+               SUM(payments) as payments, SUM(fines_collected) as fines_collected
+        FROM report_rollups
+        WHERE granularity = ? AND dimension = ? AND key = ? AND bucket >= ? AND bucket < ?
+        GROUP BY 1 ORDER BY 1
+    ''', (granularity, dimension, key, start, _next_day(end)))
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+def breakdown(dimension, start, end, limit=None):
+    """Per-key totals over [start, end] for one dimension, busiest first"""
+    conn = get_db()
+    cursor = conn.cursor()
+    query = '''
+        SELECT key, SUM(violations) as violations, SUM(fines_issued) as fines_issued,
+               SUM(payments) as payments, SUM(fines_collected) as fines_collected
+        FROM report_rollups
+        WHERE granularity = 'day' AND dimension = ? AND bucket >= ? AND bucket <= ?
+        GROUP BY key
+        ORDER BY violations DESC, key
+    '''
+    params = [dimension, start, end]
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+    cursor.execute(query, params)
+    rows = [dict(row) for row in cursor.fetchall()]
+
+    labels = {}
+    if dimension == 'officer' and rows:
+        ids = [row['key'] for row in rows if row['key']]
+        if ids:
+            cursor.execute(f'''
+                SELECT o.id, o.badge_number, u.username FROM officers o
+                LEFT JOIN users u ON o.user_id = u.id
+                WHERE o.id IN ({', '.join('?' * len(ids))})
+            ''', ids)
+            labels = {str(r['id']): f"{r['badge_number'] or '-'} ({r['username'] or 'unknown'})" for r in cursor}
+    elif dimension == 'law' and rows:
+        cursor.execute('SELECT law_code, description FROM traffic_laws')
+        labels = {r['law_code']: f"{r['law_code']} - {r['description']}" for r in cursor}
+    conn.close()
+
+    for row in rows:
+        row['label'] = labels.get(row['key']) or row['key'] or 'Unspecified'
+    return rows
+
+
+def report(start=None, end=None, days=None):
+    """Everything the reports page shows for one range"""
+    start, end = resolve_range(start, end, days)
+    totals = series(start, end)
+    return {
+        'start': start,
+        'end': end,
+        'series': totals,
+        'totals': {name: sum(row[name] for row in totals)
+                   for name in ('violations', 'fines_issued', 'payments', 'fines_collected')},
+        'breakdowns': {dimension: breakdown(dimension, start, end, limit=25)
+                       for dimension in DIMENSIONS if dimension != 'all'},
+    }
+
+
+class ReportRefresher:
+    def __init__(self, interval=None):
+        self.interval = Config.REPORTS_REFRESH_INTERVAL if interval is None else interval
+        self.pid = os.getpid()
+        self.last_error = None
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='report-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                refresh()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error('Report refresh failed: %s', e)
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def get_refresher():
+    """Return this process's refresher, starting it on first use (and again after a fork); None when disabled"""
+    global _refresher
+    if Config.REPORTS_REFRESH_INTERVAL <= 0:
+        return None
+    refresher = _refresher
+    if refresher is None or refresher.pid != os.getpid():
+        with _refresher_lock:
+            refresher = _refresher
+            if refresher is None or refresher.pid != os.getpid():
+                refresher = _refresher = ReportRefresher()
+    return refresher
+
+
+@atexit.register
+def _shutdown():
+    if _refresher is not None and _refresher.pid == os.getpid():
+        _refresher.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh the violation report rollups')
+    parser.add_argument('--rebuild', action='store_true', help='recompute every day, not just dirty ones')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    days = rebuild() if args.rebuild else refresh()
+    print(f"Refreshed {days:,} day(s) of report rollups in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
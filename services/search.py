@@ -0,0 +1,216 @@
+"""Full-text search over violation_records with SQLite FTS5.
+
+violation_search is an external-content FTS5 index over the searchable
+columns of violation_records (no second copy of the text is stored); triggers
+keep it in step with every insert, update and delete.
+
+    python -m services.search --rebuild       # backfill / rebuild the index
+    python -m services.search "sok pp-12"     # ranked search from the shell
+
+Queries are split into words that must all match, the last one as a prefix
+(the word still being typed), so "dara pp-12" finds driver "Sok Dara" with
+plate "PP-1234". '-' is a token character, so plates and license numbers are
+indexed as single rare tokens. FTS5 keeps prefix indexes for every prefix
+length up to eight bytes, which covers partly typed names and streets; longer
+prefixes are merged from the doclists of the tokens they match, which is
+cheap because those are almost always plate or license fragments.
+
+Ranking every match of a common name would cost time proportional to the
+number of matches, so results come in windows of the RANK_WINDOW newest
+matches: newer windows first, and within a window the rows where every word
+hits the driver name, plate or license number come before rows that needed
+location or description. Each page therefore touches at most a window or two
+of the index however large the table grows. (bm25() is not used: it counts
+every document containing each word on every call, which is exactly the
+full-doclist scan the windows avoid.)
+"""
+import argparse
+import base64
+import json
+import re
+import sys
+import time
+from utils.db import get_db
+
+SEARCH_COLUMNS = ('driver_name', 'plate_number', 'license_number', 'location', 'description')
+# A row matching on these columns alone ranks first within its window
+IDENTITY_COLUMNS = ('driver_name', 'plate_number', 'license_number')
+PREFIX_LENGTHS = (2, 3, 4, 5, 6, 7, 8)
+MAX_TERMS = 8
+RANK_WINDOW = 200
+
+_WORD = re.compile(r'\w+(?:-\w+)*', re.UNICODE)
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def _row_values(row):
+    return ', '.join(f'{row}.{column}' for column in SEARCH_COLUMNS)
+
+
+def schema_statements():
+    """DDL for the FTS5 index and its sync triggers (current schema; migration 8 runs a frozen copy)"""
+    columns = ', '.join(SEARCH_COLUMNS)
+    return [
+        f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS violation_search USING fts5(
+            {columns},
+            content='violation_records', content_rowid='id',
+            tokenize="unicode61 remove_diacritics 2 tokenchars '-'", prefix='{' '.join(map(str, PREFIX_LENGTHS))}'
+        )
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS violation_search_insert AFTER INSERT ON violation_records
+        BEGIN
+            INSERT INTO violation_search (rowid, {columns}) VALUES (NEW.id, {_row_values('NEW')});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS violation_search_delete AFTER DELETE ON violation_records
+        BEGIN
+            INSERT INTO violation_search (violation_search, rowid, {columns})
+            VALUES ('delete', OLD.id, {_row_values('OLD')});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS violation_search_update AFTER UPDATE OF {columns} ON violation_records
+        BEGIN
+            INSERT INTO violation_search (violation_search, rowid, {columns})
+            VALUES ('delete', OLD.id, {_row_values('OLD')});
+            INSERT INTO violation_search (rowid, {columns}) VALUES (NEW.id, {_row_values('NEW')});
+        END
+        ''',
+    ]
+
+
+def rebuild_index(cursor):
+    """Re-read every row of violation_records into the index; the caller commits"""
+    cursor.execute("INSERT INTO violation_search (violation_search) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO violation_search (violation_search) VALUES ('optimize')")
+
+
+def build_match(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    words = _WORD.findall(text or '')[:MAX_TERMS]
+    if not words:
+        raise InvalidQuery('search query must contain letters or digits')
+    terms = [f'"{word}"' for word in words[:-1]]
+    last = words[-1]
+    # A one-byte prefix has no index and would match most of the table
+    terms.append(f'"{last}"*' if len(last.encode()) >= PREFIX_LENGTHS[0] else f'"{last}"')
+    return ' AND '.join(terms)
+
+
+def _encode_cursor(ceiling, tier, row_id):
+    raw = json.dumps([ceiling, tier, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(token):
+    try:
+        ceiling, tier, row_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return (None if ceiling is None else int(ceiling)), int(tier), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidQuery('invalid page cursor')
+
+
+def _window_floor(cursor, match, ceiling):
+    """Smallest rowid among the RANK_WINDOW newest matches below ceiling, None if fewer remain"""
+    sql = 'SELECT rowid FROM violation_search WHERE violation_search MATCH ?'
+    params = [match]
+    if ceiling is not None:
+        sql += ' AND rowid < ?'
+        params.append(ceiling)
+    row = cursor.execute(sql + ' ORDER BY rowid DESC LIMIT 1 OFFSET ?', params + [RANK_WINDOW - 1]).fetchone()
+    return row[0] if row else None
+
+
+def _window_bounds(floor, ceiling):
+    conditions, params = [], []
+    if floor is not None:
+        conditions.append('violation_search.rowid >= ?')
+        params.append(floor)
+    if ceiling is not None:
+        conditions.append('violation_search.rowid < ?')
+        params.append(ceiling)
+    return conditions, params
+
+
+def search(text, limit=20, after=None):
+    """One page of matches, best first: {'items': [...], 'next_cursor': ...}"""
+    match = build_match(text)
+    identity_match = f'{{{" ".join(IDENTITY_COLUMNS)}}} : ({match})'
+    ceiling, tier, row_id = _decode_cursor(after) if after else (None, None, None)
+    conn = get_db()
+    cursor = conn.cursor()
+    rows = []
+    while True:
+        floor = _window_floor(cursor, match, ceiling)
+        bounds, bound_params = _window_bounds(floor, ceiling)
+        conditions = ['violation_search MATCH ?'] + bounds
+        params = [identity_match] + bound_params + [match] + bound_params
+        if tier is not None:
+            conditions.append('(score > ? OR (score = ? AND violation_search.rowid < ?))')
+            params.extend((tier, tier, row_id))
+        cursor.execute(f'''
+            SELECT vr.id, vr.created_at, vr.driver_name, vr.plate_number, vr.license_number, vr.location,
+                   vr.description, vr.vehicle_type, vr.total_fine, vr.status, vr.payment_status,
+                   CASE WHEN violation_search.rowid IN (
+                       SELECT violation_search.rowid FROM violation_search
+                       WHERE {' AND '.join(['violation_search MATCH ?'] + bounds)}
+                   ) THEN 0 ELSE 1 END as score
+            FROM violation_search
+            JOIN violation_records vr ON vr.id = violation_search.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY score, violation_search.rowid DESC
+            LIMIT ?
+        ''', params + [limit + 1 - len(rows)])
+        rows.extend((ceiling, dict(row)) for row in cursor.fetchall())
+        if len(rows) > limit or floor is None:
+            break
+        # This window is used up; carry on with the next older one
+        ceiling, tier, row_id = floor, None, None
+    conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_ceiling, last = rows[-1]
+        next_cursor = _encode_cursor(last_ceiling, last['score'], last['id'])
+    return {'query': text, 'match': match, 'items': [row for _, row in rows], 'limit': limit,
+            'next_cursor': next_cursor}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search violations, or rebuild the search index')
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild violation_search from violation_records')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        started = time.perf_counter()
+        conn = get_db()
+        try:
+            rebuild_index(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"Rebuilt violation_search in {time.perf_counter() - started:.2f}s")
+    if args.query:
+        try:
+            results = search(args.query, args.limit)
+        except InvalidQuery as e:
+            parser.error(str(e))
+        for row in results['items']:
+            print(f"#{row['id']:<8} {row['score']}  {row['driver_name'] or '-':<24} "
+                  f"{row['plate_number'] or '-':<12} {row['location'] or ''}")
+    elif not args.rebuild:
+        parser.error('give a query or --rebuild')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from models.violation import Violation
-from utils.expert_system import check_violations
+from services.notifications import notify_payment, notify_violation
+from utils.expert_system import check_violations, result_items
 
 class ViolationService:
     @staticmethod
@@ -14,14 +15,17 @@ class ViolationService:
         result = check_violations(facts)
         
         if result['fine'] > 0:
-            return Violation.create(
+            violation_id = Violation.create(
                 user_id=user_id,
                 vehicle_type=vehicle_type,
                 violations=', '.join(result['violations']),
                 total_fine=result['fine'],
                 status='pending',
-                payment_status='unpaid'
+                payment_status='unpaid',
+                items=result_items(result)
             )
+            notify_violation(violation_id, {'user_id': user_id, 'total_fine': result['fine']})
+            return violation_id
         return None
     
     @staticmethod
@@ -37,4 +41,8 @@ class ViolationService:
     @staticmethod
     def mark_as_paid(violation_id):
         """Mark violation as paid"""
-        return Violation.update_status(violation_id, payment_status='paid')
+        updated = Violation.update_status(violation_id, payment_status='paid')
+        violation = Violation.get_by_id(violation_id)
+        if violation is not None:
+            notify_payment(violation['user_id'], violation_id, 'paid')
+        return updated
@@ -0,0 +1,198 @@
+"""Group-commit writer for violation_records inserts.
+
+Request handlers hand their records to one background thread per process
+instead of each opening a transaction and paying its own commit. The thread
+drains a bounded queue and commits whatever arrived within
+Config.WRITER_MAX_DELAY_MS (or Config.WRITER_MAX_BATCH rows) as one
+transaction, then resolves each caller's future with the new row id.
+Callers wait at most Config.WRITER_COMMIT_TIMEOUT seconds for it; a record
+still queued by then is withdrawn and the caller gets WriterBusy. If the
+thread ever exits, every caller still waiting gets WriterBusy too.
+
+Durability modes (Config.WRITER_DURABILITY):
+  full    synchronous=FULL, callers wait for the commit
+  normal  synchronous=NORMAL (WAL default), callers wait for the commit
+  async   synchronous=NORMAL, callers return as soon as the row is queued
+          (unless they pass durable=True)
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from config import Config
+from models.violation import Violation
+from services.notifications import notify_violation
+from utils.db import get_pool
+
+DURABILITY_SYNC = {'full': 'FULL', 'normal': 'NORMAL', 'async': 'NORMAL'}
+
+
+class WriterBusy(Exception):
+    """The write queue stayed full, or the commit did not come, within the timeout"""
+
+
+class GroupCommitWriter:
+    def __init__(self, max_batch=None, max_delay_ms=None, queue_size=None, durability=None, enqueue_timeout=None,
+                 commit_timeout=None):
+        self.max_batch = max_batch or Config.WRITER_MAX_BATCH
+        self.max_delay = (Config.WRITER_MAX_DELAY_MS if max_delay_ms is None else max_delay_ms) / 1000
+        self.enqueue_timeout = Config.WRITER_ENQUEUE_TIMEOUT if enqueue_timeout is None else enqueue_timeout
+        self.commit_timeout = Config.WRITER_COMMIT_TIMEOUT if commit_timeout is None else commit_timeout
+        self.durability = durability or Config.WRITER_DURABILITY
+        if self.durability not in DURABILITY_SYNC:
+            raise ValueError(f'Unknown writer durability {self.durability!r}')
+        self.pid = os.getpid()
+        self._queue = queue.Queue(maxsize=queue_size or Config.WRITER_QUEUE_SIZE)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='violation-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self):
+        """False once the thread has exited, whether stopped or crashed"""
+        return self._thread.is_alive()
+
+    def submit(self, record):
+        """Queue a record; returns a Future resolving to its id. Raises WriterBusy when full."""
+        if self._stopping.is_set():
+            raise WriterBusy('writer is shutting down')
+        future = Future()
+        try:
+            self._queue.put((record, future), timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise WriterBusy('violation writer queue is full, try again shortly')
+        return future
+
+    def insert(self, record, timeout=None, durable=False):
+        """Queue a record and, unless running in async mode, wait for its id; raises WriterBusy on timeout.
+
+        durable=True waits for the commit even in async mode.
+        """
+        future = self.submit(record)
+        if self.durability == 'async' and not durable:
+            return None
+        timeout = self.commit_timeout if timeout is None else timeout
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            pass
+        if future.cancel():
+            raise WriterBusy('violation writer is falling behind, try again shortly')
+        # Already in a transaction: give the commit one more timeout
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            raise WriterBusy('violation writer commit is taking too long; the record may still be saved')
+
+    def stop(self, timeout=5):
+        """Flush everything queued so far and stop the thread"""
+        self._stopping.set()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass  # still draining a full queue; the join below bounds the wait either way
+        self._thread.join(timeout)
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the delay expires"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # see it again on the next round
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        batch = None
+        try:
+            conn = get_pool().connect()
+            try:
+                conn.execute(f'PRAGMA synchronous = {DURABILITY_SYNC[self.durability]}')
+                while True:
+                    batch = self._collect()
+                    if batch is None:
+                        break
+                    self._write(conn, batch)
+                    batch = None
+            finally:
+                conn.discard()
+        finally:
+            self._stopping.set()
+            self._fail_pending(batch or [])
+
+    def _fail_pending(self, batch):
+        """Fail the futures of batch and of everything still queued, once the thread is exiting"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(WriterBusy('violation writer stopped'))
+
+    def _write(self, conn, batch):
+        # Drop records whose caller gave up waiting (see insert())
+        batch = [(record, future) for record, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            ids = [Violation.insert(cursor, record) for record, _ in batch]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Retry one by one so a single bad record only fails its own caller
+            for record, future in batch:
+                try:
+                    cursor.execute('BEGIN IMMEDIATE')
+                    row_id = Violation.insert(cursor, record)
+                    conn.commit()
+                    future.set_result(row_id)
+                    notify_violation(row_id, record)
+                except Exception as e:
+                    conn.rollback()
+                    future.set_exception(e)
+            return
+        for (record, future), row_id in zip(batch, ids):
+            future.set_result(row_id)
+            notify_violation(row_id, record)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return this process's writer, starting it on first use (and again after a fork or a crash)"""
+    global _writer
+    writer = _writer
+    if writer is None or writer.pid != os.getpid() or not writer.alive:
+        with _writer_lock:
+            writer = _writer
+            if writer is None or writer.pid != os.getpid() or not writer.alive:
+                writer = _writer = GroupCommitWriter()
+    return writer
+
+
+@atexit.register
+def _shutdown():
+    if _writer is not None and _writer.pid == os.getpid():
+        _writer.stop()
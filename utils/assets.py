@@ -0,0 +1,152 @@
+"""Fingerprinted, precompressed static assets.
+
+    python -m utils.assets            # build Config.ASSETS into static/dist
+    python -m utils.assets --clean    # ...and delete outputs of earlier builds
+
+The build copies each asset to static/dist with a content hash in its name
+(app.js -> dist/app.3f9c2d41e0.js), writes .gz and, when the brotli package is
+installed, .br variants next to it, and records the mapping in
+static/dist/manifest.json. Run it at deploy time, before starting the app.
+
+Templates link assets with asset_url('app.js'), which also accepts url_for's
+form, asset_url('static', filename='app.js'). Built assets are served from
+/assets/ with Cache-Control: immutable and a year's max-age, picking the .br or
+.gz file the client's Accept-Encoding allows, so a page view neither refetches
+nor revalidates them until their content (and so their URL) changes. Without a
+build, asset_url() falls back to the plain /static/ URL.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+from flask import abort, current_app, request, send_from_directory, url_for
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # brotli is only needed to write .br variants
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # in order of preference
+
+_manifest = {}
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11) if brotli else None
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def build(static_folder, assets=None, clean=False):
+    """Fingerprint and compress assets (paths relative to static_folder); returns the manifest"""
+    dist = os.path.join(static_folder, DIST)
+    manifest, written = {}, set()
+    for name in assets or Config.ASSETS:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+        path = os.path.join(dist, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        sizes = {'raw': len(data)}
+        with open(path, 'wb') as f:
+            f.write(data)
+        written.add(hashed)
+        for encoding, suffix in ENCODINGS:
+            compressed = _compress(data, encoding)
+            # Only worth keeping when it is actually smaller
+            if compressed is not None and len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+                written.add(hashed + suffix)
+                sizes[encoding] = len(compressed)
+        manifest[name] = {'path': hashed, 'sizes': sizes}
+
+    tmp = os.path.join(dist, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(dist, MANIFEST))
+
+    if clean:
+        for root, _, files in os.walk(dist):
+            for file in files:
+                relative = os.path.relpath(os.path.join(root, file), dist).replace(os.sep, '/')
+                if relative != MANIFEST and relative not in written:
+                    os.remove(os.path.join(root, file))
+    return manifest
+
+
+def load_manifest(static_folder):
+    """{asset name: hashed path} from the last build, {} when there is none"""
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return {name: entry['path'] for name, entry in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(endpoint, filename=None, **values):
+    """URL of a built asset: asset_url('app.js') or asset_url('static', filename='app.js')"""
+    if filename is None:
+        endpoint, filename = 'static', endpoint
+    if endpoint == 'static':
+        manifest = load_manifest(current_app.static_folder) if current_app.debug else _manifest
+        hashed = manifest.get(filename)
+        if hashed:
+            return url_for('serve_asset', filename=hashed, **values)
+    return url_for(endpoint, filename=filename, **values)
+
+
+def serve_asset(filename):
+    """A built asset, precompressed when the client accepts it, cacheable forever"""
+    dist = os.path.join(current_app.static_folder, DIST)
+    if filename == MANIFEST or filename.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    chosen, encoding = filename, None
+    for candidate, suffix in ENCODINGS:
+        if request.accept_encodings[candidate] and os.path.isfile(os.path.join(dist, filename + suffix)):
+            chosen, encoding = filename + suffix, candidate
+            break
+    response = send_from_directory(dist, chosen, mimetype=mimetype, max_age=Config.ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    """Serve built assets from /assets/ and add asset_url() to templates"""
+    global _manifest
+    _manifest = load_manifest(app.static_folder)
+    app.add_url_rule('/assets/<path:filename>', 'serve_asset', serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fingerprint and precompress the static assets')
+    parser.add_argument('--static-folder', default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'static'))
+    parser.add_argument('--clean', action='store_true', help='delete outputs of earlier builds')
+    args = parser.parse_args(argv)
+
+    manifest = build(args.static_folder, clean=args.clean)
+    for name, entry in manifest.items():
+        sizes = entry['sizes']
+        print(f"{name} -> {DIST}/{entry['path']}  {sizes['raw']:,} B"
+              + ''.join(f", {encoding} {sizes[encoding]:,} B" for encoding, _ in ENCODINGS if encoding in sizes))
+    if brotli is None:
+        print('brotli is not installed; only gzip variants were written (pip install brotli)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
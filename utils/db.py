@@ -1,13 +1,173 @@
 import sqlite3
 import hashlib
 import os
+import queue
+import threading
+from flask import g, has_app_context
 from config import Config
+from utils.migrations import run_migrations
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to the pool"""
+
+    pool = None
+    lease = 0  # bumped on every checkout, so stale handles can tell
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def discard(self):
+        """Really close the underlying connection"""
+        self.pool = None
+        super().close()
+
+
+class ConnectionHandle:
+    """One checkout of a pooled connection.
+
+    Everything is passed through to the connection while the checkout lasts.
+    close() returns it to the pool once; after that the handle is dead, so a
+    second close() cannot hand back a connection someone else checked out.
+    """
+
+    __slots__ = ('_conn', '_lease')
+
+    def __init__(self, conn):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_lease', conn.lease)
+
+    @property
+    def released(self):
+        return self._conn.pool is None or self._conn.lease != self._lease
+
+    def _checked_out(self):
+        if self.released:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return self._conn
+
+    def close(self):
+        if not self.released:
+            self._conn.pool.release(self._conn)
+
+    def __getattr__(self, name):
+        return getattr(self._checked_out(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._checked_out(), name, value)
+
+    def __enter__(self):
+        self._checked_out().__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._checked_out().__exit__(*exc_info)
+
+
+class ConnectionPool:
+    """Bounded per-process pool of tuned SQLite connections"""
+
+    def __init__(self, database, size=None):
+        self.database = database
+        self.size = Config.DB_POOL_SIZE if size is None else size
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=max(self.size, 1))
+        self._lock = threading.Lock()
+        self._wal_checked = False
+
+    def connect(self):
+        """Open a new connection with the configured pragmas applied"""
+        conn = sqlite3.connect(
+            self.database,
+            timeout=Config.DB_BUSY_TIMEOUT / 1000,
+            factory=PooledConnection,
+            cached_statements=Config.DB_STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        # journal_mode is persistent in the database file, so only set it once
+        if not self._wal_checked:
+            with self._lock:
+                if not self._wal_checked:
+                    conn.execute(f'PRAGMA journal_mode = {Config.DB_JOURNAL_MODE}')
+                    self._wal_checked = True
+        conn.execute(f'PRAGMA synchronous = {Config.DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size = {int(Config.DB_CACHE_SIZE)}')
+        conn.execute(f'PRAGMA mmap_size = {int(Config.DB_MMAP_SIZE)}')
+        conn.execute(f'PRAGMA busy_timeout = {int(Config.DB_BUSY_TIMEOUT)}')
+        return conn
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        conn.pool = self
+        conn.lease += 1
+        return ConnectionHandle(conn)
+
+    def release(self, conn):
+        if conn.pool is not self:
+            return
+        conn.pool = None
+        if self.size <= 0 or os.getpid() != self.pid:
+            PooledConnection.discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            PooledConnection.discard(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                PooledConnection.discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, recreating it after a fork or DB change"""
+    global _pool
+    pool = _pool
+    if pool is None or pool.pid != os.getpid() or pool.database != Config.DATABASE:
+        with _pool_lock:
+            pool = _pool
+            if pool is None or pool.pid != os.getpid() or pool.database != Config.DATABASE:
+                if pool is not None and pool.pid == os.getpid():
+                    pool.close_all()
+                pool = _pool = ConnectionPool(Config.DATABASE)
+    return pool
+
 
 def get_db():
-    conn = sqlite3.connect(Config.DATABASE)
-    conn.row_factory = sqlite3.Row
+    conn = get_pool().acquire()
+    # Remember checkouts made during a request so teardown can return any
+    # connection a handler forgot to close
+    if has_app_context():
+        g.setdefault('_db_leases', []).append(conn)
     return conn
 
+
+def close_db(exception=None):
+    """teardown_appcontext hook returning leaked connections to the pool"""
+    for conn in g.pop('_db_leases', ()):
+        conn.close()
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+
 def init_db():
     conn = get_db()
     cursor = conn.cursor()
@@ -155,11 +315,14 @@ def init_db():
                           default_laws)
     
     conn.commit()
+    run_migrations(conn)
     conn.close()
 
 def drop_and_recreate_db():
     """Drop database and recreate it with new schema (for development)"""
-    if os.path.exists(Config.DATABASE):
-        os.remove(Config.DATABASE)
+    get_pool().close_all()
+    for path in (Config.DATABASE, Config.DATABASE + '-wal', Config.DATABASE + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
     init_db()
     print("Database recreated successfully!")
\ No newline at end of file
@@ -1,6 +1,6 @@
 from functools import wraps
 from flask import session, redirect, url_for, flash
-from utils.rbac import check_permission
+from utils.rbac import compile_expression, current_principal, role_mask
 
 def login_required(f):
     @wraps(f)
@@ -11,14 +11,17 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def role_required(role):
+def role_required(*roles):
+    """Only users whose role is one of roles (exactly; no hierarchy)"""
+    allowed = role_mask(roles)
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'user_id' not in session:
+            principal = current_principal()
+            if not principal.signed_in:
                 flash('Please login first', 'error')
                 return redirect(url_for('auth.login'))
-            if session.get('role') != role:
+            if not principal.role_bit & allowed:
                 flash('Access denied', 'error')
                 return redirect(url_for('home'))
             return f(*args, **kwargs)
@@ -26,13 +29,16 @@ def role_required(role):
     return decorator
 
 def permission_required(permission):
+    """permission is a name or an any_of()/all_of() expression from utils.rbac"""
+    expression = compile_expression(permission)
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'user_id' not in session:
+            principal = current_principal()
+            if not principal.signed_in:
                 flash('Please login first', 'error')
                 return redirect(url_for('auth.login'))
-            if not check_permission(session.get('role'), permission):
+            if not expression.allows(principal.permissions):
                 flash('You do not have permission for this action', 'error')
                 return redirect(url_for('home'))
             return f(*args, **kwargs)
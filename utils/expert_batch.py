@@ -0,0 +1,181 @@
+"""Columnar batch evaluation for the expert system.
+
+check_violations_batch() evaluates the same compiled RuleTable as
+utils.expert_system.check_violations, but over whole NumPy columns at once.
+Fines, severity codes and law-code bitmasks are computed with array
+operations; the text of violations and advice is only rendered on request.
+"""
+from utils.expert_system import get_rules, SEVERITY_NAMES, _format_message
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for batch evaluation
+    np = None
+
+VEHICLE_CODES = {'motorcycle': 1, 'car': 2, 'truck': 3}
+FLAG_CODES = {'no': 0, 'yes': 1, 'na': 2}
+UNKNOWN = -1  # missing or unrecognised value, never matches a rule
+
+ENUM_FACTS = ('helmet', 'license', 'registration', 'red_light', 'phone', 'alcohol')
+NUMERIC_FACTS = ('speed',)
+FACT_CODES = dict({'vehicle': VEHICLE_CODES}, **{fact: FLAG_CODES for fact in ENUM_FACTS})
+
+LEGAL_RESULT_ADVICE = ['Keep driving safely and responsibly']
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('check_violations_batch requires numpy (pip install numpy)')
+
+
+def encode_value(fact, value):
+    """Map a scalar fact value to its column code"""
+    return FACT_CODES[fact].get(value, UNKNOWN)
+
+
+def encode_facts(fact_dicts):
+    """Turn an iterable of check_violations-style dicts into columns"""
+    _require_numpy()
+    fact_dicts = list(fact_dicts)
+    columns = {
+        fact: np.fromiter((codes.get(f.get(fact), UNKNOWN) for f in fact_dicts), dtype=np.int8, count=len(fact_dicts))
+        for fact, codes in FACT_CODES.items()
+    }
+    columns['speed'] = np.fromiter((f.get('speed') or 0 for f in fact_dicts), dtype=np.int64, count=len(fact_dicts))
+    return columns
+
+
+def _as_codes(column, n):
+    if column is None:
+        return np.full(n, UNKNOWN, dtype=np.int8)
+    column = np.asarray(column)
+    if column.dtype == np.bool_:
+        # True/False flags mean 'yes'/'no'
+        return column.astype(np.int8)
+    return column
+
+
+class BatchResult:
+    """Outcome of check_violations_batch.
+
+    fines, severity and law_mask are arrays with one entry per input row.
+    Bit i of law_mask is set when rule_table.rules[i] fired; law_codes()
+    decodes it. result(i) renders exactly what check_violations would return.
+    """
+
+    def __init__(self, rule_table, columns, fines, severity, law_mask):
+        self.rule_table = rule_table
+        self.columns = columns
+        self.fines = fines
+        self.severity = severity
+        self.law_mask = law_mask
+
+    def __len__(self):
+        return len(self.fines)
+
+    def __iter__(self):
+        return (self.result(i) for i in range(len(self)))
+
+    @property
+    def is_violation(self):
+        return self.law_mask != 0
+
+    def _fired(self, i):
+        mask = int(self.law_mask[i])
+        return [rule for bit, rule in enumerate(self.rule_table.rules) if mask >> bit & 1]
+
+    def law_codes(self, i):
+        return [rule.law_code for rule in self._fired(i)]
+
+    def violations(self, i):
+        messages = []
+        for rule in self._fired(i):
+            if rule.dynamic:
+                messages.append(_format_message(rule.message, int(self.columns[rule.fact][i])))
+            else:
+                messages.append(rule.message)
+        return messages
+
+    def items(self, i):
+        """(law_code, message, fine, severity) per fired law, as result_items() gives"""
+        return [(rule.law_code, message, rule.fine, SEVERITY_NAMES[rule.severity])
+                for rule, message in zip(self._fired(i), self.violations(i))]
+
+    def advice(self, i):
+        return [rule.advice for rule in self._fired(i) if rule.advice]
+
+    def result(self, i):
+        """Render row i as a check_violations result dict"""
+        if not self.law_mask[i]:
+            return {
+                'status': 'legal',
+                'message': 'No violations detected. You are following traffic rules!',
+                'violations': [],
+                'fine': 0,
+                'advice': list(LEGAL_RESULT_ADVICE),
+                'law_codes': [],
+                'severity': 'none'
+            }
+        violations = self.violations(i)
+        return {
+            'status': 'violation',
+            'message': f'Found {len(violations)} violation(s)',
+            'violations': violations,
+            'fine': int(self.fines[i]),
+            'advice': self.advice(i),
+            'law_codes': self.law_codes(i),
+            'severity': SEVERITY_NAMES[int(self.severity[i])]
+        }
+
+
+def check_violations_batch(vehicle, speed, helmet=None, license=None, registration=None,
+                           red_light=None, phone=None, alcohol=None, rule_table=None):
+    """Evaluate a batch of fact sets given as columns.
+
+    vehicle and the yes/no facts are int8 code arrays (see VEHICLE_CODES,
+    FLAG_CODES; UNKNOWN for missing) or, for yes/no facts, boolean arrays.
+    speed is an integer array in km/h. Omitted columns count as missing.
+    """
+    _require_numpy()
+    rule_table = rule_table or get_rules()
+    if len(rule_table.rules) > 64:
+        raise ValueError('check_violations_batch supports at most 64 active rules')
+
+    speed = np.asarray(speed)
+    n = len(speed)
+    columns = {'vehicle': _as_codes(vehicle, n), 'speed': speed}
+    for fact, column in zip(ENUM_FACTS, (helmet, license, registration, red_light, phone, alcohol)):
+        columns[fact] = _as_codes(column, n)
+
+    fines = np.zeros(n, dtype=np.int64)
+    severity = np.zeros(n, dtype=np.int8)
+    law_mask = np.zeros(n, dtype=np.uint64)
+
+    for bit, rule in enumerate(rule_table.rules):
+        column = columns.get(rule.fact)
+        if column is None:
+            continue  # fact not available in columnar form
+        if rule.value is not None:
+            if rule.fact not in FACT_CODES:
+                continue
+            code = encode_value(rule.fact, rule.value)
+            if code == UNKNOWN:
+                continue  # value has no column code, so no row can match
+            mask = column == code
+        else:
+            mask = np.ones(n, dtype=np.bool_)
+            if rule.minimum is not None:
+                mask &= column > rule.minimum
+            if rule.maximum is not None:
+                mask &= column <= rule.maximum
+        if rule.vehicle is not None:
+            code = encode_value('vehicle', rule.vehicle)
+            if code == UNKNOWN:
+                continue
+            mask &= columns['vehicle'] == code
+
+        fines += mask * rule.fine
+        np.maximum(severity, np.where(mask, rule.severity, 0).astype(np.int8), out=severity)
+        law_mask |= mask.astype(np.uint64) << np.uint64(bit)
+
+    return BatchResult(rule_table, columns, fines, severity, law_mask)
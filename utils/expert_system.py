@@ -1,104 +1,270 @@
 import json
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from itertools import product
+from config import Config
+from models.offense_counters import OffenseCounters
+from services.lookup import normalize_key
+from utils.db import get_db
 
-def check_violations(facts):
-    """Expert system engine for traffic violations - UPDATED WITH KHR VALUES"""
+SPEED_LIMIT = 40  # general posted limit used in speeding messages (km/h)
+SEVERITY_RANKS = {'none': 0, 'minor': 1, 'moderate': 2, 'severe': 3}
+SEVERITY_NAMES = {0: 'none', 1: 'minor', 2: 'moderate', 3: 'severe'}
+
+# One compiled traffic law. A rule fires when facts[fact] == value, or for
+# numeric facts when minimum < facts[fact] <= maximum (None = unbounded), and
+# the vehicle matches when one is given.
+Rule = namedtuple('Rule', 'law_code fact value minimum maximum vehicle fine severity message advice dynamic')
+
+# Immutable compiled rule set and the laws_version it was built from
+RuleTable = namedtuple('RuleTable', 'version rules')
+
+_rule_table = None
+_next_check = 0.0
+_rule_lock = threading.Lock()
+
+
+def _format_message(message, value):
+    try:
+        return message.format(speed=value, over_limit=value - SPEED_LIMIT)
+    except (KeyError, IndexError, ValueError, TypeError):
+        return message
+
+
+def compile_rules(laws, version=0):
+    """Compile traffic_laws rows into an immutable RuleTable"""
+    rules = []
+    for law in laws:
+        if not law['rule_fact']:
+            continue  # descriptive-only law with no machine-checkable condition
+        message = law['violation_text'] or law['description']
+        rules.append(Rule(
+            law_code=law['law_code'],
+            fact=law['rule_fact'],
+            value=law['rule_value'],
+            minimum=law['rule_min'],
+            maximum=law['rule_max'],
+            vehicle=law['rule_vehicle'],
+            fine=int(law['fine_amount'] or 0),
+            severity=SEVERITY_RANKS.get((law['severity'] or '').lower(), 0),
+            message=message,
+            advice=law['advice'],
+            dynamic='{' in message and _format_message(message, 0) != message,
+        ))
+    return RuleTable(version, tuple(rules))
+
+
+def load_rules():
+    """Read the active laws and compile them"""
+    conn = get_db()
+    try:
+        version = _read_version(conn)
+        laws = conn.execute('''
+            SELECT * FROM traffic_laws
+            WHERE active = 1 AND rule_fact IS NOT NULL
+            ORDER BY rule_order, id
+        ''').fetchall()
+    finally:
+        conn.close()
+    return compile_rules(laws, version)
+
+
+def _read_version(conn):
+    row = conn.execute("SELECT value FROM app_state WHERE key = 'laws_version'").fetchone()
+    return row[0] if row else 0
+
+
+def get_rules():
+    """Return the cached RuleTable, rebuilding it when laws_version has moved.
+
+    The version stamp is read at most once every Config.RULES_REFRESH_SECONDS,
+    so other worker processes pick up law edits without a DB hit per call.
+    """
+    global _rule_table, _next_check
+    table = _rule_table
+    now = time.monotonic()
+    if table is not None and now < _next_check:
+        return table
+    with _rule_lock:
+        table = _rule_table
+        if table is None:
+            table = load_rules()
+        elif time.monotonic() >= _next_check:
+            conn = get_db()
+            try:
+                version = _read_version(conn)
+            finally:
+                conn.close()
+            if version != table.version:
+                table = load_rules()
+        _rule_table = table
+        _next_check = time.monotonic() + Config.RULES_REFRESH_SECONDS
+    return table
+
+
+def bump_rules_version(cursor):
+    """Record a law change; call inside the transaction that edits traffic_laws"""
+    cursor.execute("UPDATE app_state SET value = value + 1 WHERE key = 'laws_version'")
+
+
+def invalidate_rules():
+    """Make this process re-check laws_version on the next evaluation"""
+    global _next_check
+    _next_check = 0.0
+
+
+def _matches(rule, facts):
+    if rule.vehicle is not None and facts.get('vehicle') != rule.vehicle:
+        return False
+    value = facts.get(rule.fact)
+    if rule.value is not None:
+        return value == rule.value
+    if value is None:
+        return False
+    if rule.minimum is not None and not value > rule.minimum:
+        return False
+    if rule.maximum is not None and not value <= rule.maximum:
+        return False
+    return True
+
+
+def check_violations(facts, rule_table=None):
+    """Expert system engine for traffic violations, driven by the traffic_laws table.
+
+    Facts that name the plate_number / license_number (or carry a known
+    prior_offenses count) get the repeat-offender escalation on top. Every
+    call returns a fresh dict with list values, the same shape as
+    check_violations_batch results.
+    """
+    result = _evaluate(facts, rule_table or get_rules())
+    if result['fine'] and ('prior_offenses' in facts or facts.get('plate_number') or facts.get('license_number')):
+        result = escalate(result, _prior_offenses(facts))
+    return result
+
+
+def _evaluate(facts, rule_table):
+    if Config.DECISION_TABLE:
+        table = get_decision_table(rule_table)
+        if table is not None:
+            try:
+                return table.lookup(facts)
+            except TypeError:
+                pass  # unhashable or non-numeric input, let the rule walk decide
+    return evaluate_rules(facts, rule_table)
+
+
+def result_items(result, rule_table=None):
+    """(law_code, message, fine, severity) for each law a check_violations result fired.
+
+    For an escalated result each fine is scaled by its multiplier, rounded so
+    the items still add up to result['fine'].
+    """
+    rules = _rules_by_code(rule_table or get_rules())
+    items = []
+    for law_code, message in zip(result['law_codes'], result['violations']):
+        rule = rules.get(law_code)
+        items.append((law_code, message, rule.fine, SEVERITY_NAMES[rule.severity]) if rule
+                     else (law_code, message, 0, None))
+    if result.get('multiplier') and items:
+        fines = scale_fines([fine for _, _, fine, _ in items], result['fine'])
+        items = [(law_code, message, fine, severity)
+                 for (law_code, message, _, severity), fine in zip(items, fines)]
+    return items
+
+
+def scale_fines(fines, total):
+    """fines scaled in proportion so they add up to total; rounding leftovers go to the largest"""
+    if not fines:
+        return []
+    current = sum(fines)
+    scaled = [int(round(fine * total / current)) if current else 0 for fine in fines]
+    largest = max(range(len(fines)), key=fines.__getitem__)
+    scaled[largest] += total - sum(scaled)
+    return scaled
+
+
+_law_index = (None, {})
+
+
+def _rules_by_code(rule_table):
+    global _law_index
+    cached_rules, index = _law_index
+    if cached_rules is not rule_table:
+        index = {rule.law_code: rule for rule in rule_table.rules}
+        _law_index = (rule_table, index)
+    return index
+
+
+def escalation_steps(spec):
+    """Parse "1:1.5,3:2" into ((3, 2.0), (1, 1.5)), highest threshold first"""
+    steps = []
+    for step in filter(None, (part.strip() for part in (spec or '').split(','))):
+        try:
+            threshold, multiplier = step.split(':')
+            steps.append((int(threshold), float(multiplier)))
+        except ValueError:
+            raise ValueError(f'REPEAT_OFFENSE_MULTIPLIERS: {step!r} is not "offenses:multiplier"') from None
+    return tuple(sorted(steps, reverse=True))
+
+
+# Parsed once at import, so a malformed setting stops the app at startup
+ESCALATION_STEPS = escalation_steps(Config.REPEAT_OFFENSE_MULTIPLIERS)
+
+
+def _prior_offenses(facts):
+    prior = facts.get('prior_offenses')
+    if prior is None:
+        prior = OffenseCounters.prior_offenses(normalize_key(facts.get('plate_number')),
+                                               normalize_key(facts.get('license_number')),
+                                               Config.REPEAT_OFFENSE_WINDOW_MONTHS)
+    return prior
+
+
+def escalate(result, prior_offenses):
+    """result with its fine scaled for prior_offenses earlier offenses (a new dict, or result unchanged).
+
+    The escalated dict keeps base_fine, prior_offenses and multiplier, and
+    result_items() scales each law's fine to match.
+    """
+    multiplier = next((multiplier for threshold, multiplier in ESCALATION_STEPS
+                       if prior_offenses >= threshold), 1)
+    if multiplier == 1 or not result['fine']:
+        return result
+    escalated = dict(result)
+    escalated.update(
+        fine=int(round(result['fine'] * multiplier)),
+        base_fine=result['fine'],
+        prior_offenses=prior_offenses,
+        multiplier=multiplier,
+        message=f"{result['message']} (repeat offense: {prior_offenses} in the last "
+                f"{Config.REPEAT_OFFENSE_WINDOW_MONTHS} months, fine x{multiplier:g})",
+    )
+    return escalated
+
+
+def evaluate_rules(facts, rule_table):
+    """Walk the compiled rules for one fact set"""
     violations = []
     total_fine = 0
     advice = []
     law_codes = []
-    severity_level = 'none'
-    
-    vehicle = facts.get('vehicle')
-    has_helmet = facts.get('helmet')
-    speed = facts.get('speed')
-    has_license = facts.get('license')
-    has_registration = facts.get('registration', 'yes')
-    ran_red_light = facts.get('red_light', 'no')
-    using_phone = facts.get('phone', 'no')
-    alcohol = facts.get('alcohol', 'no')
-    
     max_severity = 0  # 0=none, 1=minor, 2=moderate, 3=severe
-    
-    # Rule 1: Helmet check for motorcycles
-    if vehicle == 'motorcycle' and has_helmet == 'no':
-        violations.append('Riding motorcycle without helmet')
-        total_fine += 15000  # 60,000,000 KHR
-        advice.append('Always wear a helmet when riding a motorcycle')
-        law_codes.append('TL001')
-        max_severity = max(max_severity, 1)
-    
-    # Rule 2: License check
-    if has_license == 'no':
-        violations.append('Driving without a valid license')
-        total_fine += 50000  # 200,000,000 KHR
-        advice.append('Get a proper driving license before operating any vehicle')
-        law_codes.append('TL002')
-        max_severity = max(max_severity, 3)
-    
-    # Rule 3: Vehicle registration
-    if has_registration == 'no':
-        violations.append('Vehicle not registered')
-        total_fine += 100000  # 400,000,000 KHR
-        advice.append('Register your vehicle with proper authorities')
-        law_codes.append('TL010')
-        max_severity = max(max_severity, 3)
-    
-    # Rule 4: Speed limit check
-    if speed > 40:
-        over_limit = speed - 40
-        violations.append(f'Speeding - {over_limit} km/h over the 40 km/h limit')
-        
-        if over_limit <= 10:
-            total_fine += 20000  # 80,000,000 KHR
-            law_codes.append('TL003')
-            max_severity = max(max_severity, 1)
-        elif over_limit <= 20:
-            total_fine += 40000  # 160,000,000 KHR
-            law_codes.append('TL004')
-            max_severity = max(max_severity, 2)
+
+    for rule in rule_table.rules:
+        if not _matches(rule, facts):
+            continue
+        if rule.dynamic:
+            violations.append(_format_message(rule.message, facts.get(rule.fact)))
         else:
-            total_fine += 80000  # 320,000,000 KHR
-            law_codes.append('TL005')
-            max_severity = max(max_severity, 3)
-        
-        advice.append('Follow speed limits to ensure safety')
-    
-    # Rule 5: Motorcycle on highway
-    if vehicle == 'motorcycle' and speed > 60:
-        violations.append('Motorcycle exceeding safe speed of 60 km/h')
-        total_fine += 30000  # 120,000,000 KHR
-        advice.append('Motorcycles should not exceed 60 km/h for safety')
-        law_codes.append('TL006')
-        max_severity = max(max_severity, 2)
-    
-    # Rule 6: Red light violation
-    if ran_red_light == 'yes':
-        violations.append('Running red light')
-        total_fine += 100000  # 400,000,000 KHR
-        advice.append('Always stop at red lights - it prevents accidents')
-        law_codes.append('TL007')
-        max_severity = max(max_severity, 3)
-    
-    # Rule 7: Phone usage
-    if using_phone == 'yes':
-        violations.append('Using mobile phone while driving')
-        total_fine += 25000  # 100,000,000 KHR
-        advice.append('Use hands-free devices or pull over to use your phone')
-        law_codes.append('TL008')
-        max_severity = max(max_severity, 1)
-    
-    # Rule 8: Driving under influence
-    if alcohol == 'yes':
-        violations.append('Driving under influence of alcohol')
-        total_fine += 500000  # 2,000,000,000 KHR
-        advice.append('NEVER drink and drive - take a taxi or use a designated driver')
-        law_codes.append('TL009')
-        max_severity = max(max_severity, 3)
-    
-    # Map severity level
-    severity_map = {0: 'none', 1: 'minor', 2: 'moderate', 3: 'severe'}
-    severity_level = severity_map[max_severity]
-    
+            violations.append(rule.message)
+        total_fine += rule.fine
+        if rule.advice:
+            advice.append(rule.advice)
+        law_codes.append(rule.law_code)
+        max_severity = max(max_severity, rule.severity)
+
     # Generate result
     if len(violations) == 0:
         result = {
@@ -118,7 +284,172 @@ def check_violations(facts):
             'fine': total_fine,
             'advice': advice,
             'law_codes': law_codes,
-            'severity': severity_level
+            'severity': SEVERITY_NAMES[max_severity]
         }
-    
-    return result
\ No newline at end of file
+
+    return result
+
+
+class FrozenResult(dict):
+    """check_violations result shared between calls by the decision table; read-only"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('check_violations results are shared and read-only')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+
+def _freeze(result):
+    return FrozenResult({key: tuple(value) if isinstance(value, list) else value
+                         for key, value in result.items()})
+
+
+def _thaw(result):
+    """A caller's own copy of a shared FrozenResult, with lists again"""
+    return dict(result, violations=list(result['violations']), advice=list(result['advice']),
+                law_codes=list(result['law_codes']))
+
+
+class _Entry:
+    """Outcome shared by every fact combination that fires the same rules"""
+
+    __slots__ = ('result', 'dynamic', 'dynamic_facts', 'rendered')
+
+    def __init__(self, result, dynamic):
+        self.result = result      # FrozenResult, rendered for the representative facts
+        self.dynamic = dynamic    # ((index, rule), ...) whose message embeds the fact value
+        self.dynamic_facts = tuple(rule.fact for _, rule in dynamic)
+        self.rendered = {}        # dynamic values -> FrozenResult
+
+
+class DecisionTable:
+    """Precomputed results for the finite fact space of a RuleTable.
+
+    Enum facts only matter through the values the rules compare against, and
+    numeric facts only through which side of each rule bound they fall, so the
+    whole input space collapses to (enum tuple, bucket tuple) keys. Every key
+    is evaluated once with evaluate_rules(); a lookup is then one tuple hash
+    on the normalized enum values, a bisect per numeric fact, a dict hit and a
+    copy of the shared result.
+    """
+
+    MAX_ENTRIES = 1 << 16
+    MAX_ALIASES = 4096
+    MAX_RENDERED = 512
+
+    def __init__(self, rule_table):
+        self.rule_table = rule_table
+        domains = {}
+        bounds = {}
+        for rule in rule_table.rules:
+            if rule.vehicle is not None:
+                domains.setdefault('vehicle', set()).add(rule.vehicle)
+            if rule.value is not None:
+                domains.setdefault(rule.fact, set()).add(rule.value)
+            else:
+                bounds.setdefault(rule.fact, set()).update(
+                    b for b in (rule.minimum, rule.maximum) if b is not None)
+        if set(domains) & set(bounds):
+            raise ValueError('a fact is used both as an enum and as a range')
+
+        self.enum_facts = tuple(sorted(domains))
+        self.domains = tuple(frozenset(domains[f]) for f in self.enum_facts)
+        self.range_facts = tuple(sorted(bounds))
+        self.boundaries = tuple(tuple(sorted(bounds[f])) for f in self.range_facts)
+        self.entries = {}
+        self._rows = {}      # normalized enum tuple -> row
+        self._aliases = {}   # raw enum tuple -> row, a bounded shortcut past normalizing
+        self._build()
+
+    def _build(self):
+        # None stands for "any value no rule mentions"; bucket -1 for a missing number
+        enum_choices = [tuple(domain) + (None,) for domain in self.domains]
+        bucket_choices = [tuple(range(-1, len(b) + 1)) for b in self.boundaries]
+        size = 1
+        for choices in enum_choices + bucket_choices:
+            size *= len(choices)
+        if size > self.MAX_ENTRIES:
+            raise ValueError('rule set too large for a decision table')
+
+        interned = {}
+        for combo in product(*enum_choices, *bucket_choices):
+            facts = dict(zip(self.enum_facts, combo))
+            for fact, bounds, bucket in zip(self.range_facts, self.boundaries, combo[len(self.enum_facts):]):
+                facts[fact] = self._representative(bounds, bucket)
+            result = evaluate_rules(facts, self.rule_table)
+            fired = tuple(result['law_codes'])
+            entry = interned.get(fired)
+            if entry is None:
+                dynamic = tuple((i, rule) for i, rule in enumerate(self._fired(facts)) if rule.dynamic)
+                entry = interned[fired] = _Entry(_freeze(result), dynamic)
+            self.entries[combo] = entry
+
+    @staticmethod
+    def _representative(bounds, bucket):
+        """A value that lands in the given bucket"""
+        if bucket < 0:
+            return None
+        if bucket < len(bounds):
+            return bounds[bucket]
+        return bounds[-1] + 1
+
+    def _fired(self, facts):
+        return [rule for rule in self.rule_table.rules if _matches(rule, facts)]
+
+    def _row(self, key):
+        """Entries for one normalized enum tuple, indexed by bucket tuple"""
+        width = len(key)
+        return {combo[width:]: entry for combo, entry in self.entries.items() if combo[:width] == key}
+
+    def lookup(self, facts):
+        get = facts.get
+        enums = tuple(map(get, self.enum_facts))
+        row = self._aliases.get(enums)
+        if row is None:
+            # Values no rule mentions all map to None, so _rows holds at most one
+            # row per enum combination however varied (or junk) the input is
+            key = tuple([value if value in domain else None for value, domain in zip(enums, self.domains)])
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = self._row(key)
+            if len(self._aliases) < self.MAX_ALIASES:
+                self._aliases[enums] = row
+        buckets = tuple([-1 if value is None else bisect_left(bounds, value)
+                         for bounds, value in zip(self.boundaries, map(get, self.range_facts))])
+        entry = row[buckets]
+        if not entry.dynamic:
+            return _thaw(entry.result)
+        return _thaw(self._render(entry, facts))
+
+    def _render(self, entry, facts):
+        dynamic_values = tuple(map(facts.get, entry.dynamic_facts))
+        result = entry.rendered.get(dynamic_values)
+        if result is None:
+            violations = list(entry.result['violations'])
+            for (index, rule), value in zip(entry.dynamic, dynamic_values):
+                violations[index] = _format_message(rule.message, value)
+            result = FrozenResult(entry.result)
+            dict.__setitem__(result, 'violations', tuple(violations))
+            if len(entry.rendered) < self.MAX_RENDERED:
+                entry.rendered[dynamic_values] = result
+        return result
+
+
+_decision_table = (None, None)
+
+
+def get_decision_table(rule_table):
+    """Return the DecisionTable for rule_table, rebuilding it when the rules change"""
+    global _decision_table
+    cached_rules, table = _decision_table
+    if cached_rules is rule_table:
+        return table
+    with _rule_lock:
+        cached_rules, table = _decision_table
+        if cached_rules is not rule_table:
+            try:
+                table = DecisionTable(rule_table)
+            except ValueError:
+                table = None  # fall back to walking the rules
+            _decision_table = (rule_table, table)
+    return table
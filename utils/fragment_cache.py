@@ -0,0 +1,173 @@
+"""Template fragment cache and Jinja bytecode cache.
+
+Expensive template blocks are wrapped in a cache tag naming the fragment and
+the data scopes it depends on:
+
+    {% cache 'stats', 'officer:' ~ officer.officer_id %} ... {% endcache %}
+    {% cache 'table:' ~ page_key, 'user:' ~ session.user_id %} ... {% endcache %}
+
+Scopes are 'all', 'user:<users.id>' and 'officer:<officers.id>'. Triggers
+(migration 16) bump a scope's row in cache_versions whenever a violation,
+payment or appeal touching it changes, from any process, so a fragment is
+keyed on its scopes' current versions and an edit makes the next render miss.
+Rendered fragments live in a per-process LRU (Config.FRAGMENT_CACHE_SIZE
+entries, 0 turns caching off) and also expire after Config.FRAGMENT_CACHE_TTL
+seconds, which bounds staleness for data the triggers do not watch (names,
+badge numbers). Versions are read once per request.
+
+Compiled templates are kept in Config.JINJA_CACHE_DIR so a new worker loads
+bytecode instead of compiling every template again.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_request_context
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from config import Config
+from utils.db import get_db
+
+# Table -> scope expressions bumped when one of its rows changes
+SCOPES = {
+    'violation_records': ("'all'", "'user:' || {row}.user_id", "'officer:' || {row}.officer_id"),
+    'appeals': ("'all'", "'user:' || {row}.user_id"),
+    'users': ("'all'",),
+}
+
+
+def _bump(scope, condition=None):
+    """Trigger statement adding one to scope's version (skipped when scope is NULL)"""
+    where = f'{scope} IS NOT NULL' + (f' AND {condition}' if condition else '')
+    return f'''
+            INSERT INTO cache_versions (scope, version) SELECT {scope}, 1 WHERE {where}
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1;'''
+
+
+def schema_statements():
+    """DDL for cache_versions and the triggers bumping it (current schema; migration 16 runs a frozen copy)"""
+    statements = [
+        '''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+    ]
+    for table, scopes in SCOPES.items():
+        inserted = ''.join(_bump(scope.format(row='NEW')) for scope in scopes)
+        deleted = ''.join(_bump(scope.format(row='OLD')) for scope in scopes)
+        # An update bumps the new scopes, and the old ones when the row moved (e.g. reassigned)
+        updated = inserted + ''.join(
+            _bump(scope.format(row='OLD'), f"{scope.format(row='OLD')} IS NOT {scope.format(row='NEW')}")
+            for scope in scopes if '{row}' in scope)
+        statements += [
+            f'''
+            CREATE TRIGGER IF NOT EXISTS cache_versions_{table}_insert AFTER INSERT ON {table}
+            BEGIN {inserted}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS cache_versions_{table}_update AFTER UPDATE ON {table}
+            BEGIN {updated}
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS cache_versions_{table}_delete AFTER DELETE ON {table}
+            BEGIN {deleted}
+            END
+            ''',
+        ]
+    return statements
+
+
+def data_versions(scopes):
+    """{scope: version} for scopes, read at most once per scope per request"""
+    known = g.setdefault('_cache_versions', {}) if has_request_context() else {}
+    missing = [scope for scope in scopes if scope not in known]
+    if missing:
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT scope, version FROM cache_versions WHERE scope IN ({', '.join('?' * len(missing))})
+        ''', missing)
+        found = dict(cursor.fetchall())
+        conn.close()
+        for scope in missing:
+            known[scope] = found.get(scope, 0)
+    return {scope: known[scope] for scope in scopes}
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments with a TTL"""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> (markup, expires)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache name, scope, ... %}body{% endcache %}: body rendered once per name and scope versions"""
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache(Config.FRAGMENT_CACHE_SIZE, Config.FRAGMENT_CACHE_TTL))
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render', [nodes.Const(parser.name), nodes.List(args)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, template, args, caller):
+        cache = self.environment.fragment_cache
+        if cache.size <= 0:
+            return caller()
+        name, scopes = str(args[0]), tuple(str(scope) for scope in args[1:])
+        versions = data_versions(scopes)
+        key = (template, name) + tuple((scope, versions[scope]) for scope in scopes)
+        markup = cache.get(key)
+        if markup is None:
+            markup = caller()
+            cache.put(key, markup)
+        return markup
+
+
+def init_app(app):
+    """Add the cache tag and the bytecode cache to app's Jinja environment"""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    if Config.JINJA_CACHE_DIR:
+        os.makedirs(Config.JINJA_CACHE_DIR, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(Config.JINJA_CACHE_DIR)
@@ -0,0 +1,133 @@
+"""Per-session identity context: who is signed in and, for officers, which officer.
+
+Officer routes used to look up the officer row for session['user_id'] on
+every request. The identity is now loaded once, at login (or on the first
+request of a session that predates this cache), and kept in a bounded
+in-process LRU keyed by a random session id stored in the session cookie.
+
+Entries are dropped when an admin edits or deletes the officer or user
+(invalidate_user()), at logout, when the LRU is full, and after
+Config.IDENTITY_CACHE_TTL seconds, which bounds how long another worker
+process can serve an identity changed through this one.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import session
+from config import Config
+from utils.db import get_db
+
+Identity = namedtuple('Identity', 'user_id role username first_name last_name email '
+                                  'officer_id badge_number department assigned_area')
+
+
+class IdentityCache:
+    """Thread-safe LRU of session id -> Identity with a per-user index for invalidation"""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()   # session id -> (identity, expires)
+        self._sessions = {}             # user id -> {session id, ...}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._drop(sid)
+                return None
+            self._entries.move_to_end(sid)
+            return entry[0]
+
+    def put(self, sid, identity):
+        with self._lock:
+            if sid in self._entries:
+                self._drop(sid)
+            self._entries[sid] = (identity, time.monotonic() + self.ttl)
+            self._sessions.setdefault(identity.user_id, set()).add(sid)
+            while len(self._entries) > self.size:
+                self._drop(next(iter(self._entries)))
+
+    def discard(self, sid):
+        with self._lock:
+            if sid in self._entries:
+                self._drop(sid)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for sid in self._sessions.pop(user_id, ()):
+                self._entries.pop(sid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sessions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, sid):
+        identity, _ = self._entries.pop(sid)
+        sessions = self._sessions.get(identity.user_id)
+        if sessions is not None:
+            sessions.discard(sid)
+            if not sessions:
+                del self._sessions[identity.user_id]
+
+
+_cache = IdentityCache(Config.IDENTITY_CACHE_SIZE, Config.IDENTITY_CACHE_TTL)
+
+
+def load_identity(user_id):
+    """Read the identity of one user (None if the account is gone)"""
+    conn = get_db()
+    row = conn.execute('''
+        SELECT u.id as user_id, u.role, u.username, u.first_name, u.last_name, u.email,
+               o.id as officer_id, o.badge_number, o.department, o.assigned_area
+        FROM users u
+        LEFT JOIN officers o ON o.user_id = u.id
+        WHERE u.id = ?
+    ''', (user_id,)).fetchone()
+    conn.close()
+    return Identity(*row) if row else None
+
+
+def remember_login(user_id):
+    """Start a new session id for user_id and cache its identity; call at login"""
+    sid = session['sid'] = secrets.token_urlsafe(16)
+    identity = load_identity(user_id)
+    if identity is not None:
+        _cache.put(sid, identity)
+    return identity
+
+
+def current_identity():
+    """Identity of the signed-in user, from the cache when possible (None when signed out)"""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return None
+    sid = session.get('sid')
+    identity = _cache.get(sid) if sid else None
+    if identity is None or identity.user_id != user_id:
+        identity = load_identity(user_id)
+        if identity is not None:
+            if not sid:
+                sid = session['sid'] = secrets.token_urlsafe(16)
+            _cache.put(sid, identity)
+    return identity
+
+
+def forget_session():
+    """Drop the current session's entry; call at logout"""
+    sid = session.get('sid')
+    if sid:
+        _cache.discard(sid)
+
+
+def invalidate_user(user_id):
+    """Drop every cached session of user_id after their user or officer row changed"""
+    _cache.invalidate_user(user_id)
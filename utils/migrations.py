@@ -0,0 +1,892 @@
+"""Versioned schema migrations tracked in the schema_version table.
+
+Each migration is a (version, description, steps) tuple where steps is either
+a list of SQL statements or a callable taking a cursor. Migrations run in
+version order, each inside its own transaction, and are never edited once
+released - add a new one instead.
+
+Every migration's DDL is frozen here, in the constants next to its steps, so
+editing a module's schema_statements() (which describes the current schema)
+never changes what an old migration runs. Data backfills still call the
+owning model or service.
+"""
+import sqlite3
+from datetime import datetime
+
+
+def _add_legacy_columns(cursor):
+    """Bring violation_records from older databases up to the current columns"""
+    cursor.execute('PRAGMA table_info(violation_records)')
+    existing = {row[1] for row in cursor.fetchall()}
+    columns = [
+        ('driver_name', 'TEXT'),
+        ('license_number', 'TEXT'),
+        ('plate_number', 'TEXT'),
+        ('vehicle_type', 'TEXT'),
+        ('has_helmet', 'TEXT'),
+        ('speed', 'INTEGER'),
+        ('has_license', 'TEXT'),
+        ('violations', 'TEXT'),
+        ('total_fine', 'INTEGER'),
+        ('payment_status', "TEXT DEFAULT 'unpaid'"),
+        ('payment_date', 'TIMESTAMP'),
+        ('description', 'TEXT'),
+        ('location', 'TEXT'),
+    ]
+    for name, col_type in columns:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE violation_records ADD COLUMN {name} {col_type}')
+
+
+# Conditions for the default laws, matching the rules that used to be
+# hard-coded in utils.expert_system.check_violations
+_DEFAULT_LAW_RULES = [
+    # law_code, fact, value, min (exclusive), max (inclusive), vehicle, order, violation text, advice
+    ('TL001', 'helmet', 'no', None, None, 'motorcycle', 1, 'Riding motorcycle without helmet',
+     'Always wear a helmet when riding a motorcycle'),
+    ('TL002', 'license', 'no', None, None, None, 2, 'Driving without a valid license',
+     'Get a proper driving license before operating any vehicle'),
+    ('TL010', 'registration', 'no', None, None, None, 3, 'Vehicle not registered',
+     'Register your vehicle with proper authorities'),
+    ('TL003', 'speed', None, 40, 50, None, 4, 'Speeding - {over_limit} km/h over the 40 km/h limit',
+     'Follow speed limits to ensure safety'),
+    ('TL004', 'speed', None, 50, 60, None, 4, 'Speeding - {over_limit} km/h over the 40 km/h limit',
+     'Follow speed limits to ensure safety'),
+    ('TL005', 'speed', None, 60, None, None, 4, 'Speeding - {over_limit} km/h over the 40 km/h limit',
+     'Follow speed limits to ensure safety'),
+    ('TL006', 'speed', None, 60, None, 'motorcycle', 5, 'Motorcycle exceeding safe speed of 60 km/h',
+     'Motorcycles should not exceed 60 km/h for safety'),
+    ('TL007', 'red_light', 'yes', None, None, None, 6, 'Running red light',
+     'Always stop at red lights - it prevents accidents'),
+    ('TL008', 'phone', 'yes', None, None, None, 7, 'Using mobile phone while driving',
+     'Use hands-free devices or pull over to use your phone'),
+    ('TL009', 'alcohol', 'yes', None, None, None, 8, 'Driving under influence of alcohol',
+     'NEVER drink and drive - take a taxi or use a designated driver'),
+]
+
+
+def _add_law_rules(cursor):
+    cursor.execute('PRAGMA table_info(traffic_laws)')
+    existing = {row[1] for row in cursor.fetchall()}
+    columns = [
+        ('rule_fact', 'TEXT'),
+        ('rule_value', 'TEXT'),
+        ('rule_min', 'INTEGER'),
+        ('rule_max', 'INTEGER'),
+        ('rule_vehicle', 'TEXT'),
+        ('rule_order', 'INTEGER DEFAULT 100'),
+        ('violation_text', 'TEXT'),
+        ('advice', 'TEXT'),
+    ]
+    for name, col_type in columns:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE traffic_laws ADD COLUMN {name} {col_type}')
+    cursor.executemany('''
+        UPDATE traffic_laws
+        SET rule_fact = ?, rule_value = ?, rule_min = ?, rule_max = ?, rule_vehicle = ?,
+            rule_order = ?, violation_text = ?, advice = ?
+        WHERE law_code = ?
+    ''', [rule[1:] + rule[:1] for rule in _DEFAULT_LAW_RULES])
+
+    # Small key/value table for cross-process version stamps
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_state (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO app_state (key, value) VALUES ('laws_version', 1)")
+
+
+_VIOLATION_STATS_V5 = [
+    '''
+        CREATE TABLE IF NOT EXISTS violation_stats (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payment_status TEXT NOT NULL,
+            violations INTEGER NOT NULL DEFAULT 0,
+            fines INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, key, payment_status)
+        ) WITHOUT ROWID
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS violation_stats_insert AFTER INSERT ON violation_records
+        BEGIN
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('all', '', COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('officer', COALESCE(NEW.officer_id, ''), COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('user', COALESCE(NEW.user_id, ''), COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('vehicle', COALESCE(NEW.vehicle_type, ''), COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('day', COALESCE(date(NEW.created_at), ''), COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS violation_stats_delete AFTER DELETE ON violation_records
+        BEGIN
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('all', '', COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('officer', COALESCE(OLD.officer_id, ''), COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('user', COALESCE(OLD.user_id, ''), COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('vehicle', COALESCE(OLD.vehicle_type, ''), COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('day', COALESCE(date(OLD.created_at), ''), COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS violation_stats_update
+        AFTER UPDATE OF officer_id, user_id, vehicle_type, created_at, payment_status, total_fine
+        ON violation_records
+        BEGIN
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('all', '', COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('officer', COALESCE(OLD.officer_id, ''), COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('user', COALESCE(OLD.user_id, ''), COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('vehicle', COALESCE(OLD.vehicle_type, ''), COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('day', COALESCE(date(OLD.created_at), ''), COALESCE(OLD.payment_status, ''), -1, -1 * COALESCE(OLD.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('all', '', COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('officer', COALESCE(NEW.officer_id, ''), COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('user', COALESCE(NEW.user_id, ''), COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('vehicle', COALESCE(NEW.vehicle_type, ''), COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+            INSERT INTO violation_stats (dimension, key, payment_status, violations, fines)
+            VALUES ('day', COALESCE(date(NEW.created_at), ''), COALESCE(NEW.payment_status, ''), 1, 1 * COALESCE(NEW.total_fine, 0))
+            ON CONFLICT (dimension, key, payment_status) DO UPDATE
+            SET violations = violations + excluded.violations, fines = fines + excluded.fines;
+        END
+    ''',
+]
+
+
+def _add_violation_stats(cursor):
+    # Imported here: models import utils.db, which imports this module
+    from models.violation_stats import ViolationStats
+    for statement in _VIOLATION_STATS_V5:
+        cursor.execute(statement)
+    ViolationStats.rebuild(cursor)
+
+
+_REPORT_ROLLUPS_V7 = [
+    '''
+        CREATE TABLE IF NOT EXISTS report_rollups (
+            granularity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            key TEXT NOT NULL,
+            violations INTEGER NOT NULL DEFAULT 0,
+            fines_issued INTEGER NOT NULL DEFAULT 0,
+            payments INTEGER NOT NULL DEFAULT 0,
+            fines_collected INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, dimension, bucket, key)
+        ) WITHOUT ROWID
+    ''',
+    'CREATE TABLE IF NOT EXISTS report_dirty_days (day TEXT PRIMARY KEY) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS idx_violations_paid_date ON violation_records (payment_status, payment_date)',
+    '''
+        CREATE TRIGGER IF NOT EXISTS report_dirty_insert AFTER INSERT ON violation_records
+        BEGIN
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date(NEW.created_at) WHERE date(NEW.created_at) IS NOT NULL;
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date(NEW.payment_date) WHERE date(NEW.payment_date) IS NOT NULL;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS report_dirty_delete AFTER DELETE ON violation_records
+        BEGIN
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date(OLD.created_at) WHERE date(OLD.created_at) IS NOT NULL;
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date(OLD.payment_date) WHERE date(OLD.payment_date) IS NOT NULL;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS report_dirty_update
+        AFTER UPDATE OF created_at, payment_date, payment_status, total_fine, violations, vehicle_type, officer_id, location ON violation_records
+        BEGIN
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date(OLD.created_at) WHERE date(OLD.created_at) IS NOT NULL;
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date(OLD.payment_date) WHERE date(OLD.payment_date) IS NOT NULL;
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date(NEW.created_at) WHERE date(NEW.created_at) IS NOT NULL;
+            INSERT OR IGNORE INTO report_dirty_days (day)
+            SELECT date(NEW.payment_date) WHERE date(NEW.payment_date) IS NOT NULL;
+        END
+    ''',
+]
+
+
+def _add_report_rollups(cursor):
+    from services.reports import mark_all_dirty
+    for statement in _REPORT_ROLLUPS_V7:
+        cursor.execute(statement)
+    # Existing history is rolled up by the next services.reports refresh
+    mark_all_dirty(cursor)
+
+
+_VIOLATION_SEARCH_V8 = [
+    '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS violation_search USING fts5(
+            driver_name, plate_number, license_number, location, description,
+            content='violation_records', content_rowid='id',
+            tokenize="unicode61 remove_diacritics 2 tokenchars '-'", prefix='2 3 4 5 6 7 8'
+        )
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS violation_search_insert AFTER INSERT ON violation_records
+        BEGIN
+            INSERT INTO violation_search (rowid, driver_name, plate_number, license_number, location, description) VALUES (NEW.id, NEW.driver_name, NEW.plate_number, NEW.license_number, NEW.location, NEW.description);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS violation_search_delete AFTER DELETE ON violation_records
+        BEGIN
+            INSERT INTO violation_search (violation_search, rowid, driver_name, plate_number, license_number, location, description)
+            VALUES ('delete', OLD.id, OLD.driver_name, OLD.plate_number, OLD.license_number, OLD.location, OLD.description);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS violation_search_update AFTER UPDATE OF driver_name, plate_number, license_number, location, description ON violation_records
+        BEGIN
+            INSERT INTO violation_search (violation_search, rowid, driver_name, plate_number, license_number, location, description)
+            VALUES ('delete', OLD.id, OLD.driver_name, OLD.plate_number, OLD.license_number, OLD.location, OLD.description);
+            INSERT INTO violation_search (rowid, driver_name, plate_number, license_number, location, description) VALUES (NEW.id, NEW.driver_name, NEW.plate_number, NEW.license_number, NEW.location, NEW.description);
+        END
+    ''',
+]
+
+
+def _add_violation_search(cursor):
+    from services.search import rebuild_index
+    for statement in _VIOLATION_SEARCH_V8:
+        cursor.execute(statement)
+    rebuild_index(cursor)
+
+
+_LOOKUP_KEY_COLUMNS_V9 = {
+    'plate_key': 'ALTER TABLE violation_records ADD COLUMN plate_key TEXT '
+        '''GENERATED ALWAYS AS (NULLIF(upper(replace(replace(replace(replace(replace(plate_number, ' ', ''), '-', ''), '.', ''), '/', ''), '_', '')), '')) VIRTUAL''',
+    'license_key': 'ALTER TABLE violation_records ADD COLUMN license_key TEXT '
+        '''GENERATED ALWAYS AS (NULLIF(upper(replace(replace(replace(replace(replace(license_number, ' ', ''), '-', ''), '.', ''), '/', ''), '_', '')), '')) VIRTUAL''',
+}
+_LOOKUP_KEYS_V9 = [
+    '''
+        CREATE INDEX IF NOT EXISTS idx_violations_plate_key
+        ON violation_records (plate_key, created_at, payment_status, total_fine)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_violations_license_key
+        ON violation_records (license_key, created_at, payment_status, total_fine)
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS lookup_keys (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            UNIQUE (kind, key)
+        )
+    ''',
+    '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS lookup_key_trigrams USING fts5(
+            key, kind UNINDEXED, content='lookup_keys', content_rowid='id', tokenize='trigram'
+        )
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS lookup_keys_index AFTER INSERT ON lookup_keys
+        BEGIN
+            INSERT INTO lookup_key_trigrams (rowid, key, kind) VALUES (NEW.id, NEW.key, NEW.kind);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS lookup_keys_insert AFTER INSERT ON violation_records
+        BEGIN
+            INSERT OR IGNORE INTO lookup_keys (kind, key)
+            SELECT 'plate', NEW.plate_key WHERE NEW.plate_key IS NOT NULL;
+            INSERT OR IGNORE INTO lookup_keys (kind, key)
+            SELECT 'license', NEW.license_key WHERE NEW.license_key IS NOT NULL;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS lookup_keys_update
+        AFTER UPDATE OF plate_number, license_number ON violation_records
+        BEGIN
+            INSERT OR IGNORE INTO lookup_keys (kind, key)
+            SELECT 'plate', NEW.plate_key WHERE NEW.plate_key IS NOT NULL;
+            INSERT OR IGNORE INTO lookup_keys (kind, key)
+            SELECT 'license', NEW.license_key WHERE NEW.license_key IS NOT NULL;
+        END
+    ''',
+]
+
+
+def _add_lookup_keys(cursor):
+    from services.lookup import rebuild_keys
+    # Generated columns only show up in table_xinfo
+    cursor.execute('PRAGMA table_xinfo(violation_records)')
+    existing = {row[1] for row in cursor.fetchall()}
+    for column, statement in _LOOKUP_KEY_COLUMNS_V9.items():
+        if column not in existing:
+            cursor.execute(statement)
+    for statement in _LOOKUP_KEYS_V9:
+        cursor.execute(statement)
+    rebuild_keys(cursor)
+
+
+_OFFENSE_COUNTERS_V10 = [
+    '''
+        CREATE TABLE IF NOT EXISTS offense_counters (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            month TEXT NOT NULL,
+            offenses INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, key, month)
+        ) WITHOUT ROWID
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS offense_counters_insert AFTER INSERT ON violation_records
+        BEGIN
+            INSERT INTO offense_counters (kind, key, month, offenses)
+            SELECT 'plate', NEW.plate_key, strftime('%Y-%m', NEW.created_at), 1
+            WHERE NEW.plate_key IS NOT NULL AND NEW.created_at IS NOT NULL AND COALESCE(NEW.total_fine, 0) > 0 AND COALESCE(NEW.status, '') != 'dismissed'
+            ON CONFLICT (kind, key, month) DO UPDATE SET offenses = offenses + excluded.offenses;
+            INSERT INTO offense_counters (kind, key, month, offenses)
+            SELECT 'license', NEW.license_key, strftime('%Y-%m', NEW.created_at), 1
+            WHERE NEW.license_key IS NOT NULL AND NEW.created_at IS NOT NULL AND COALESCE(NEW.total_fine, 0) > 0 AND COALESCE(NEW.status, '') != 'dismissed'
+            ON CONFLICT (kind, key, month) DO UPDATE SET offenses = offenses + excluded.offenses;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS offense_counters_delete AFTER DELETE ON violation_records
+        BEGIN
+            INSERT INTO offense_counters (kind, key, month, offenses)
+            SELECT 'plate', OLD.plate_key, strftime('%Y-%m', OLD.created_at), -1
+            WHERE OLD.plate_key IS NOT NULL AND OLD.created_at IS NOT NULL AND COALESCE(OLD.total_fine, 0) > 0 AND COALESCE(OLD.status, '') != 'dismissed'
+            ON CONFLICT (kind, key, month) DO UPDATE SET offenses = offenses + excluded.offenses;
+            INSERT INTO offense_counters (kind, key, month, offenses)
+            SELECT 'license', OLD.license_key, strftime('%Y-%m', OLD.created_at), -1
+            WHERE OLD.license_key IS NOT NULL AND OLD.created_at IS NOT NULL AND COALESCE(OLD.total_fine, 0) > 0 AND COALESCE(OLD.status, '') != 'dismissed'
+            ON CONFLICT (kind, key, month) DO UPDATE SET offenses = offenses + excluded.offenses;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS offense_counters_update
+        AFTER UPDATE OF plate_number, license_number, created_at, total_fine, status ON violation_records
+        BEGIN
+            INSERT INTO offense_counters (kind, key, month, offenses)
+            SELECT 'plate', OLD.plate_key, strftime('%Y-%m', OLD.created_at), -1
+            WHERE OLD.plate_key IS NOT NULL AND OLD.created_at IS NOT NULL AND COALESCE(OLD.total_fine, 0) > 0 AND COALESCE(OLD.status, '') != 'dismissed'
+            ON CONFLICT (kind, key, month) DO UPDATE SET offenses = offenses + excluded.offenses;
+            INSERT INTO offense_counters (kind, key, month, offenses)
+            SELECT 'license', OLD.license_key, strftime('%Y-%m', OLD.created_at), -1
+            WHERE OLD.license_key IS NOT NULL AND OLD.created_at IS NOT NULL AND COALESCE(OLD.total_fine, 0) > 0 AND COALESCE(OLD.status, '') != 'dismissed'
+            ON CONFLICT (kind, key, month) DO UPDATE SET offenses = offenses + excluded.offenses;
+            INSERT INTO offense_counters (kind, key, month, offenses)
+            SELECT 'plate', NEW.plate_key, strftime('%Y-%m', NEW.created_at), 1
+            WHERE NEW.plate_key IS NOT NULL AND NEW.created_at IS NOT NULL AND COALESCE(NEW.total_fine, 0) > 0 AND COALESCE(NEW.status, '') != 'dismissed'
+            ON CONFLICT (kind, key, month) DO UPDATE SET offenses = offenses + excluded.offenses;
+            INSERT INTO offense_counters (kind, key, month, offenses)
+            SELECT 'license', NEW.license_key, strftime('%Y-%m', NEW.created_at), 1
+            WHERE NEW.license_key IS NOT NULL AND NEW.created_at IS NOT NULL AND COALESCE(NEW.total_fine, 0) > 0 AND COALESCE(NEW.status, '') != 'dismissed'
+            ON CONFLICT (kind, key, month) DO UPDATE SET offenses = offenses + excluded.offenses;
+        END
+    ''',
+]
+
+
+def _add_offense_counters(cursor):
+    from models.offense_counters import OffenseCounters
+    for statement in _OFFENSE_COUNTERS_V10:
+        cursor.execute(statement)
+    OffenseCounters.rebuild(cursor)
+
+
+_VIOLATION_ITEMS_V11 = [
+    '''
+        CREATE TABLE IF NOT EXISTS violation_items (
+            violation_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            law_code TEXT,
+            message TEXT NOT NULL,
+            fine INTEGER NOT NULL DEFAULT 0,
+            severity TEXT,
+            created_at TIMESTAMP,
+            PRIMARY KEY (violation_id, position)
+        ) WITHOUT ROWID
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_violation_items_law
+        ON violation_items (law_code, created_at, violation_id, fine)
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS violation_items_delete AFTER DELETE ON violation_records
+        BEGIN
+            DELETE FROM violation_items WHERE violation_id = OLD.id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS violation_items_created AFTER UPDATE OF created_at ON violation_records
+        BEGIN
+            UPDATE violation_items SET created_at = NEW.created_at WHERE violation_id = NEW.id;
+        END
+    ''',
+]
+
+
+def _add_violation_items(cursor):
+    from models.violation_items import ViolationItems
+    for statement in _VIOLATION_ITEMS_V11:
+        cursor.execute(statement)
+    ViolationItems.backfill(cursor)
+
+
+_NOTIFICATION_UNREAD_V12 = [
+    '''
+        CREATE TABLE IF NOT EXISTS notification_unread (
+            user_id INTEGER PRIMARY KEY,
+            unread INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS notification_unread_insert AFTER INSERT ON notifications
+        BEGIN
+        INSERT INTO notification_unread (user_id, unread) SELECT NEW.user_id, 1 WHERE NEW.user_id IS NOT NULL AND COALESCE(NEW.is_read, 0) = 0
+        ON CONFLICT (user_id) DO UPDATE SET unread = unread + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS notification_unread_delete AFTER DELETE ON notifications
+        BEGIN
+        UPDATE notification_unread SET unread = unread - 1
+        WHERE user_id = OLD.user_id AND OLD.user_id IS NOT NULL AND COALESCE(OLD.is_read, 0) = 0;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS notification_unread_update AFTER UPDATE OF user_id, is_read ON notifications
+        BEGIN
+        UPDATE notification_unread SET unread = unread - 1
+        WHERE user_id = OLD.user_id AND OLD.user_id IS NOT NULL AND COALESCE(OLD.is_read, 0) = 0;
+        INSERT INTO notification_unread (user_id, unread) SELECT NEW.user_id, 1 WHERE NEW.user_id IS NOT NULL AND COALESCE(NEW.is_read, 0) = 0
+        ON CONFLICT (user_id) DO UPDATE SET unread = unread + 1;
+        END
+    ''',
+]
+
+
+def _add_notification_unread(cursor):
+    from models.notification import Notification
+    for statement in _NOTIFICATION_UNREAD_V12:
+        cursor.execute(statement)
+    Notification.rebuild_unread(cursor)
+
+
+_APPEAL_QUEUE_V13 = [
+    '''
+        CREATE INDEX IF NOT EXISTS idx_appeals_pending_queue
+        ON appeals (fine DESC, created_at) WHERE status = 'pending'
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_appeals_reviewed
+        ON appeals (reviewed_at) WHERE reviewed_at IS NOT NULL
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS appeals_fine_insert AFTER INSERT ON appeals WHEN NEW.fine IS NULL
+        BEGIN
+            UPDATE appeals SET fine = COALESCE((SELECT total_fine FROM violation_records WHERE id = NEW.violation_id), 0)
+            WHERE id = NEW.id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS appeals_fine_sync AFTER UPDATE OF total_fine ON violation_records
+        BEGIN
+            UPDATE appeals SET fine = COALESCE(NEW.total_fine, 0) WHERE violation_id = NEW.id AND status = 'pending';
+        END
+    ''',
+]
+
+
+def _add_appeal_queue(cursor):
+    from models.appeal import Appeal
+    cursor.execute('PRAGMA table_info(appeals)')
+    if 'fine' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('ALTER TABLE appeals ADD COLUMN fine INTEGER')
+    Appeal.backfill_fines(cursor)
+    for statement in _APPEAL_QUEUE_V13:
+        cursor.execute(statement)
+
+
+_PAYMENT_TRANSACTIONS_V14 = [
+    '''
+        CREATE TABLE IF NOT EXISTS payment_transactions (
+            txn_id TEXT PRIMARY KEY,
+            violation_id INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            paid_at TIMESTAMP,
+            source TEXT,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_payment_transactions_violation ON payment_transactions (violation_id)',
+]
+
+
+def _add_payment_transactions(cursor):
+    for statement in _PAYMENT_TRANSACTIONS_V14:
+        cursor.execute(statement)
+
+
+_CACHE_VERSIONS_V16 = [
+    '''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS cache_versions_violation_records_insert AFTER INSERT ON violation_records
+        BEGIN
+        INSERT INTO cache_versions (scope, version) SELECT 'all', 1 WHERE 'all' IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'user:' || NEW.user_id, 1 WHERE 'user:' || NEW.user_id IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'officer:' || NEW.officer_id, 1 WHERE 'officer:' || NEW.officer_id IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS cache_versions_violation_records_update AFTER UPDATE ON violation_records
+        BEGIN
+        INSERT INTO cache_versions (scope, version) SELECT 'all', 1 WHERE 'all' IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'user:' || NEW.user_id, 1 WHERE 'user:' || NEW.user_id IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'officer:' || NEW.officer_id, 1 WHERE 'officer:' || NEW.officer_id IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'user:' || OLD.user_id, 1 WHERE 'user:' || OLD.user_id IS NOT NULL AND 'user:' || OLD.user_id IS NOT 'user:' || NEW.user_id
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'officer:' || OLD.officer_id, 1 WHERE 'officer:' || OLD.officer_id IS NOT NULL AND 'officer:' || OLD.officer_id IS NOT 'officer:' || NEW.officer_id
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS cache_versions_violation_records_delete AFTER DELETE ON violation_records
+        BEGIN
+        INSERT INTO cache_versions (scope, version) SELECT 'all', 1 WHERE 'all' IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'user:' || OLD.user_id, 1 WHERE 'user:' || OLD.user_id IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'officer:' || OLD.officer_id, 1 WHERE 'officer:' || OLD.officer_id IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS cache_versions_appeals_insert AFTER INSERT ON appeals
+        BEGIN
+        INSERT INTO cache_versions (scope, version) SELECT 'all', 1 WHERE 'all' IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'user:' || NEW.user_id, 1 WHERE 'user:' || NEW.user_id IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS cache_versions_appeals_update AFTER UPDATE ON appeals
+        BEGIN
+        INSERT INTO cache_versions (scope, version) SELECT 'all', 1 WHERE 'all' IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'user:' || NEW.user_id, 1 WHERE 'user:' || NEW.user_id IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'user:' || OLD.user_id, 1 WHERE 'user:' || OLD.user_id IS NOT NULL AND 'user:' || OLD.user_id IS NOT 'user:' || NEW.user_id
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS cache_versions_appeals_delete AFTER DELETE ON appeals
+        BEGIN
+        INSERT INTO cache_versions (scope, version) SELECT 'all', 1 WHERE 'all' IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        INSERT INTO cache_versions (scope, version) SELECT 'user:' || OLD.user_id, 1 WHERE 'user:' || OLD.user_id IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS cache_versions_users_insert AFTER INSERT ON users
+        BEGIN
+        INSERT INTO cache_versions (scope, version) SELECT 'all', 1 WHERE 'all' IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS cache_versions_users_update AFTER UPDATE ON users
+        BEGIN
+        INSERT INTO cache_versions (scope, version) SELECT 'all', 1 WHERE 'all' IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS cache_versions_users_delete AFTER DELETE ON users
+        BEGIN
+        INSERT INTO cache_versions (scope, version) SELECT 'all', 1 WHERE 'all' IS NOT NULL
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+    ''',
+]
+
+
+def _add_cache_versions(cursor):
+    for statement in _CACHE_VERSIONS_V16:
+        cursor.execute(statement)
+
+
+MIGRATIONS = [
+    (1, 'Add violation_records columns missing from older databases', _add_legacy_columns),
+    (2, 'Secondary indexes for dashboard, list and stats queries', [
+        # officer.dashboard / officer.payments / api.get_statistics
+        'CREATE INDEX IF NOT EXISTS idx_violations_officer_created ON violation_records (officer_id, created_at)',
+        # user.dashboard, Violation.get_by_user, submit_appeal ownership check
+        'CREATE INDEX IF NOT EXISTS idx_violations_user_created ON violation_records (user_id, created_at)',
+        # "collected" aggregates: SUM(total_fine) WHERE payment_status = 'paid'
+        'CREATE INDEX IF NOT EXISTS idx_violations_payment_fine ON violation_records (payment_status, total_fine)',
+        # admin recent activity and the unfiltered ORDER BY created_at DESC lists
+        'CREATE INDEX IF NOT EXISTS idx_violations_created ON violation_records (created_at)',
+        # admin.dashboard pending count and manage_appeals ordering
+        'CREATE INDEX IF NOT EXISTS idx_appeals_status_created ON appeals (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_appeals_user_created ON appeals (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_appeals_violation ON appeals (violation_id)',
+        # api.get_notifications
+        'CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications (user_id, created_at)',
+        # User.get_all(role=...)
+        'CREATE INDEX IF NOT EXISTS idx_users_role_created ON users (role, created_at)',
+    ]),
+    (3, 'Rule conditions on traffic_laws and the app_state version table', _add_law_rules),
+    (4, 'Resume checkpoints for bulk violation ingest', [
+        '''
+        CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+            source TEXT PRIMARY KEY,
+            row_offset INTEGER NOT NULL,
+            updated_at TIMESTAMP
+        )
+        ''',
+    ]),
+    (5, 'Trigger-maintained violation_stats summary table', _add_violation_stats),
+    (6, 'Indexes for keyset pagination of the unfiltered user and appeal lists', [
+        # (created_at, rowid) keyset seeks for admin.manage_users and admin.manage_appeals
+        'CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_appeals_created ON appeals (created_at)',
+    ]),
+    (7, 'Hourly and daily report rollups with dirty-day tracking', _add_report_rollups),
+    (8, 'FTS5 search index over violation_records', _add_violation_search),
+    (9, 'Normalized plate/license keys and the trigram lookup_keys index', _add_lookup_keys),
+    (10, 'Monthly per-plate and per-license offense counters for repeat offenders', _add_offense_counters),
+    (11, 'violation_items: one row per law broken, backfilled from the violations text', _add_violation_items),
+    (12, 'Trigger-maintained unread notification counts per user', _add_notification_unread),
+    (13, 'appeals.fine and the partial index behind the pending-appeal triage queue', _add_appeal_queue),
+    (14, 'payment_transactions: statement lines already applied by reconciliation', _add_payment_transactions),
+    (15, 'Index on (payment_status, created_at) for the overdue sweeper', [
+        'CREATE INDEX IF NOT EXISTS idx_violations_payment_created ON violation_records (payment_status, created_at)',
+        "INSERT OR IGNORE INTO app_state (key, value) VALUES ('overdue_swept_at', 0)",
+    ]),
+    (16, 'Trigger-maintained cache_versions keying the template fragment cache', _add_cache_versions),
+    (17, 'Partial index of unpaid, undismissed fines replacing the overdue sweep index', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_violations_sweepable ON violation_records (payment_status, created_at)
+        WHERE payment_status = 'unpaid' AND status != 'dismissed' AND total_fine > 0
+        ''',
+        'DROP INDEX IF EXISTS idx_violations_payment_created',
+    ]),
+]
+
+
+# Query shapes from routes/*.py that must be answered from an index.
+# Checked by `python migrate_db.py --check-plans`.
+INDEXED_QUERIES = {
+    'officer violations': (
+        'SELECT vr.* FROM violation_records vr WHERE vr.officer_id = ? ORDER BY vr.created_at DESC', (1,)),
+    'officer collected': (
+        'SELECT SUM(total_fine) FROM violation_records WHERE officer_id = ? AND payment_status = "paid"', (1,)),
+    'user violations': (
+        'SELECT * FROM violation_records WHERE user_id = ? ORDER BY created_at DESC', (1,)),
+    'user unpaid': (
+        'SELECT SUM(total_fine) FROM violation_records WHERE user_id = ? AND payment_status = "unpaid"', (1,)),
+    'collected total': (
+        'SELECT SUM(total_fine) FROM violation_records WHERE payment_status = "paid"', ()),
+    'recent activity': (
+        'SELECT vr.id FROM violation_records vr LEFT JOIN officers o ON vr.officer_id = o.id '
+        'LEFT JOIN users u ON o.user_id = u.id ORDER BY vr.created_at DESC LIMIT 10', ()),
+    'pending appeals': (
+        'SELECT COUNT(*) FROM appeals WHERE status = "pending"', ()),
+    'user appeals': (
+        'SELECT a.*, vr.total_fine FROM appeals a JOIN violation_records vr ON a.violation_id = vr.id '
+        'WHERE a.user_id = ? ORDER BY a.created_at DESC', (1,)),
+    'notifications': (
+        'SELECT * FROM notifications WHERE user_id = ? ORDER BY created_at DESC LIMIT 10', (1,)),
+    'users by role': (
+        'SELECT * FROM users WHERE role = ? ORDER BY created_at DESC', ('officer',)),
+    'violations page': (
+        'SELECT vr.* FROM violation_records vr WHERE (vr.created_at, vr.id) < (?, ?) '
+        'ORDER BY vr.created_at DESC, vr.id DESC LIMIT 51', ('2025-01-01', 1)),
+    'officer violations page': (
+        'SELECT vr.* FROM violation_records vr WHERE vr.officer_id = ? AND (vr.created_at, vr.id) < (?, ?) '
+        'ORDER BY vr.created_at DESC, vr.id DESC LIMIT 51', (1, '2025-01-01', 1)),
+    'user violations previous page': (
+        'SELECT vr.* FROM violation_records vr WHERE vr.user_id = ? AND (vr.created_at, vr.id) > (?, ?) '
+        'ORDER BY vr.created_at ASC, vr.id ASC LIMIT 51', (1, '2025-01-01', 1)),
+    'users page': (
+        'SELECT * FROM users WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT 51',
+        ('2025-01-01', 1)),
+    'report day': (
+        'SELECT created_at, total_fine FROM violation_records WHERE created_at >= ? AND created_at < ?',
+        ('2025-01-01', '2025-01-02')),
+    'report day payments': (
+        'SELECT payment_date, total_fine FROM violation_records '
+        'WHERE payment_date >= ? AND payment_date < ? AND payment_status = "paid"', ('2025-01-01', '2025-01-02')),
+    'report series': (
+        'SELECT bucket, SUM(violations) FROM report_rollups WHERE granularity = "day" AND dimension = "all" '
+        'AND key = "" AND bucket >= ? AND bucket < ? GROUP BY 1 ORDER BY 1', ('2025-01-01', '2025-02-01')),
+    'appeals page': (
+        'SELECT a.* FROM appeals a WHERE (a.created_at, a.id) < (?, ?) '
+        'ORDER BY a.created_at DESC, a.id DESC LIMIT 51', ('2025-01-01', 1)),
+    'plate lookup': (
+        'SELECT COUNT(*), SUM(CASE WHEN payment_status != "paid" AND status != "dismissed" THEN total_fine END), '
+        'MAX(created_at) FROM violation_records WHERE plate_key = ?', ('PP2A1234',)),
+    'license lookup recent': (
+        'SELECT * FROM violation_records WHERE license_key = ? ORDER BY created_at DESC LIMIT 5', ('L1234',)),
+    'lookup open appeals': (
+        'SELECT COUNT(*) FROM violation_records av CROSS JOIN appeals a ON a.violation_id = av.id '
+        'WHERE av.plate_key = ? AND a.status = "pending"', ('PP2A1234',)),
+    'prior offenses': (
+        'SELECT SUM(offenses) FROM offense_counters WHERE kind = "plate" AND key = ? AND month >= ?',
+        ('PP2A1234', '2025-01')),
+    'law stats': (
+        'SELECT law_code, COUNT(*), SUM(fine) FROM violation_items WHERE law_code IS NOT NULL GROUP BY law_code', ()),
+    'page items': (
+        'SELECT * FROM violation_items WHERE violation_id IN (?, ?) ORDER BY violation_id, position', (1, 2)),
+    'violations by law page': (
+        'SELECT vr.*, vi.violation_id FROM violation_items vi CROSS JOIN violation_records vr ON vr.id = vi.violation_id '
+        'WHERE vi.law_code = ? AND (vi.created_at, vi.violation_id) < (?, ?) '
+        'ORDER BY vi.created_at DESC, vi.violation_id DESC LIMIT 51', ('TL001', '2025-01-01', 1)),
+    'reconcile plates': (
+        'SELECT id, user_id, plate_key, total_fine, payment_status, status, created_at FROM violation_records '
+        'WHERE plate_key IN (?, ?) AND payment_status != "paid"',
+        ('PP2A1234', 'PP2B5678')),
+    'reconcile transactions': (
+        'SELECT txn_id FROM payment_transactions WHERE txn_id IN (?, ?)', ('T1', 'T2')),
+    'overdue sweep': (
+        "UPDATE violation_records SET payment_status = 'overdue' WHERE id IN (SELECT id FROM violation_records "
+        "WHERE payment_status = 'unpaid' AND status != 'dismissed' AND total_fine > 0 AND created_at < ? "
+        "ORDER BY created_at LIMIT 500)", ('2025-01-01',)),
+}
+
+
+def get_schema_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn, target=None):
+    """Apply every pending migration up to target; returns the versions applied"""
+    current = get_schema_version(conn)
+    conn.commit()
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            # Another process may have migrated while we waited for the lock
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            if callable(steps):
+                steps(cursor)
+            else:
+                for statement in steps:
+                    cursor.execute(statement)
+            cursor.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                           (version, description, datetime.now()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def explain(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query"""
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+
+
+def check_query_plans(conn, queries=None):
+    """Return {name: plan} for every query that needs a full scan or a temp sort"""
+    failures = {}
+    for name, (sql, params) in (queries or INDEXED_QUERIES).items():
+        try:
+            plan = explain(conn, sql, params)
+        except sqlite3.OperationalError as e:
+            failures[name] = [str(e)]  # e.g. a table from a migration not applied yet
+            continue
+        for detail in plan:
+            full_scan = detail.startswith('SCAN') and 'USING' not in detail
+            if full_scan or 'TEMP B-TREE' in detail:
+                failures[name] = plan
+                break
+    return failures
@@ -0,0 +1,151 @@
+"""Keyset pagination on (created_at, id).
+
+List pages are addressed by an opaque cursor holding the created_at and id of
+the row at the edge of the current page, so every page is one index seek plus
+LIMIT rows no matter how deep into the table it is:
+
+    ?after=<cursor>   rows older than the cursor (next page)
+    ?before=<cursor>  rows newer than the cursor (previous page)
+    ?limit=50         page size, capped at Config.MAX_PAGE_SIZE
+"""
+import base64
+import json
+from flask import abort, request
+from config import Config
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_key(*values):
+    """Opaque cursor for a row's sort key"""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_key(token, *types):
+    """Return the sort key from a cursor, checking each value's type, or raise InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('invalid page cursor')
+    if not isinstance(values, list) or len(values) != len(types) or \
+            not all(isinstance(value, kind) for value, kind in zip(values, types)):
+        raise InvalidCursor('invalid page cursor')
+    return tuple(values)
+
+
+def encode_cursor(created_at, row_id):
+    return encode_key(created_at, row_id)
+
+
+def decode_cursor(token):
+    """Return (created_at, id) from a cursor or raise InvalidCursor"""
+    return decode_key(token, str, int)
+
+
+class Page:
+    """One page of rows plus the cursors for its neighbours"""
+
+    def __init__(self, items, limit, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.limit = limit
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def to_dict(self):
+        return {
+            'items': [dict(row) for row in self.items],
+            'limit': self.limit,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor
+        }
+
+
+def page_args():
+    """Read after/before/limit from the query string; 400 on a bad cursor"""
+    try:
+        limit = int(request.args.get('limit', Config.PAGE_SIZE))
+    except ValueError:
+        limit = Config.PAGE_SIZE
+    limit = max(1, min(limit, Config.MAX_PAGE_SIZE))
+    try:
+        after = request.args.get('after')
+        before = request.args.get('before')
+        return {
+            'after': decode_cursor(after) if after else None,
+            'before': decode_cursor(before) if before and not after else None,
+            'limit': limit
+        }
+    except InvalidCursor as e:
+        abort(400, str(e))
+
+
+def page_key(after=None, before=None, limit=None, **filters):
+    """Fragment cache key for one page: the parsed page_args() plus its filters.
+
+    Built from validated values, so URLs that spell the same page differently
+    (parameter order, junk parameters, aliases) share one cache entry.
+    """
+    return encode_key(after, before, limit, sorted((name, value) for name, value in filters.items()
+                                                   if value is not None))
+
+
+def wants_json():
+    """True for ?format=json or an Accept header preferring JSON over HTML"""
+    if request.args.get('format') == 'json':
+        return True
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+
+def paginate(cursor, select, conditions=(), params=(), after=None, before=None, limit=None,
+             created='created_at', row_id='id'):
+    """Run select (everything up to WHERE) one page at a time, newest first.
+
+    created/row_id name the ordering columns as they appear in the query,
+    e.g. 'vr.created_at' and 'vr.id' when the table is aliased.
+    """
+    limit = limit or Config.PAGE_SIZE
+    conditions = list(conditions)
+    params = list(params)
+    if after:
+        conditions.append(f'({created}, {row_id}) < (?, ?)')
+        params.extend(after)
+    elif before:
+        conditions.append(f'({created}, {row_id}) > (?, ?)')
+        params.extend(before)
+    direction = 'ASC' if before and not after else 'DESC'
+
+    sql = select
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY {created} {direction}, {row_id} {direction} LIMIT ?'
+    cursor.execute(sql, params + [limit + 1])
+    rows = cursor.fetchall()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'ASC':
+        rows.reverse()
+    if not rows:
+        return Page(rows, limit)
+
+    created_key = created.rsplit('.', 1)[-1]
+    id_key = row_id.rsplit('.', 1)[-1]
+    first = encode_cursor(rows[0][created_key], rows[0][id_key])
+    last = encode_cursor(rows[-1][created_key], rows[-1][id_key])
+    if direction == 'ASC':
+        # Walking backwards: there is always a page after this one
+        return Page(rows, limit, next_cursor=last, prev_cursor=first if more else None)
+    return Page(rows, limit, next_cursor=last if more else None, prev_cursor=first if after else None)
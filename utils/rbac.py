@@ -1,14 +1,165 @@
+"""Role-based access control compiled to integer bitmasks.
+
+Config.ROLE_PERMISSIONS and Config.ROLE_HIERARCHY are compiled once, when this
+module is imported, into a Policy: every permission name gets a bit and every
+role a mask of its own permissions plus those of each role below it in the
+hierarchy (admin includes officer includes user). Checking a permission is
+then an AND and a compare on ints.
+
+Permission expressions are compiled the same way, once, where a decorator is
+applied, so a misspelt permission fails at startup rather than per request:
+
+    @permission_required('create_violations')
+    @permission_required(any_of('view_all', 'view_violations'))
+    @permission_required(all_of('manage_appeals', any_of('view_all', 'view_reports')))
+
+The signed-in user's role bit and permission mask are worked out once per
+request and kept on flask.g (see current_principal()).
+"""
+from collections import namedtuple
+from flask import g, session
 from config import Config
 
+
+class UnknownPermission(ValueError):
+    pass
+
+
+# What the signed-in user may do; one shared instance per role, memoized on flask.g
+Principal = namedtuple('Principal', 'signed_in role role_bit permissions')
+
+
+class Policy:
+    """Bit assignments and per-role masks for one permissions/hierarchy config"""
+
+    def __init__(self, role_permissions, hierarchy):
+        names = sorted({name for names in role_permissions.values() for name in names})
+        self.bits = {name: 1 << i for i, name in enumerate(names)}
+        roles = sorted(set(role_permissions) | set(hierarchy))
+        self.role_bits = {role: 1 << i for i, role in enumerate(roles)}
+        self.levels = {role: hierarchy.get(role, 0) for role in roles}
+
+        own = {role: self.mask(role_permissions.get(role, ())) for role in roles}
+        self.masks = {}
+        self.manages = {}
+        for role in roles:
+            level = self.levels[role]
+            below = [other for other in roles if self.levels[other] < level]
+            # Roles outside the hierarchy (level 0) only get their own permissions
+            inherited = below if level else []
+            self.masks[role] = own[role] | _union(own[other] for other in inherited)
+            self.manages[role] = _union(self.role_bits[other] for other in below)
+        self.principals = {role: Principal(True, role, self.role_bits[role], self.masks[role]) for role in roles}
+
+    def mask(self, names):
+        try:
+            return _union(self.bits[name] for name in names)
+        except KeyError as e:
+            raise UnknownPermission(f'unknown permission: {e.args[0]}')
+
+
+def _union(masks):
+    result = 0
+    for mask in masks:
+        result |= mask
+    return result
+
+
+POLICY = Policy(Config.ROLE_PERMISSIONS, Config.ROLE_HIERARCHY)
+
+
+class Expression:
+    """A compiled permission expression, held when any one of its terms is held in full.
+
+    Each term is a mask of permissions that must all be present, so any_of()
+    concatenates terms and all_of() combines them pairwise.
+    """
+
+    __slots__ = ('terms',)
+
+    def __init__(self, terms):
+        self.terms = tuple(sorted(set(terms)))
+
+    def allows(self, mask):
+        for term in self.terms:
+            if mask & term == term:
+                return True
+        return False
+
+    def __repr__(self):
+        names = {bit: name for name, bit in POLICY.bits.items()}
+        return ' | '.join('(' + ' & '.join(names[bit] for bit in names if term & bit) + ')'
+                          for term in self.terms)
+
+
+_compiled = {}
+
+
+def compile_expression(expression):
+    """Expression for a permission name or an any_of()/all_of() expression"""
+    if isinstance(expression, Expression):
+        return expression
+    compiled = _compiled.get(expression)
+    if compiled is None:
+        if not isinstance(expression, str):
+            raise TypeError('a permission expression is a name, any_of() or all_of()')
+        compiled = _compiled[expression] = Expression([POLICY.mask((expression,))])
+    return compiled
+
+
+def any_of(*expressions):
+    """Held when at least one of the expressions is held"""
+    return Expression([term for expression in expressions for term in compile_expression(expression).terms])
+
+
+def all_of(*expressions):
+    """Held when every one of the expressions is held"""
+    terms = [0]
+    for expression in expressions:
+        terms = [term | other for term in terms for other in compile_expression(expression).terms]
+    return Expression(terms)
+
+
+def role_mask(roles):
+    """Mask of role bits for role_required(); unknown roles never match"""
+    return _union(POLICY.role_bits.get(role, 0) for role in roles)
+
+
+ANONYMOUS = Principal(False, None, 0, 0)
+_NO_ROLE = Principal(True, None, 0, 0)
+
+
+def current_principal():
+    """The session user's Principal, looked up once per request and kept on flask.g.
+
+    Code that changes session['role'] mid-request should call forget_principal().
+    """
+    principal = g.get('_rbac_principal')
+    if principal is None:
+        principal = POLICY.principals.get(session.get('role'), _NO_ROLE) if 'user_id' in session else ANONYMOUS
+        g._rbac_principal = principal
+    return principal
+
+
+def forget_principal():
+    g.pop('_rbac_principal', None)
+
+
+def has_permission(expression):
+    """Whether the signed-in user holds a permission expression"""
+    return compile_expression(expression).allows(current_principal().permissions)
+
+
 def check_permission(role, permission):
-    """Check if a role has a specific permission"""
-    permissions = Config.ROLE_PERMISSIONS.get(role, [])
-    return permission in permissions
+    """Check if a role has a specific permission (or permission expression)"""
+    return compile_expression(permission).allows(POLICY.masks.get(role, 0))
+
 
 def get_role_hierarchy(role):
     """Get hierarchy level of a role"""
-    return Config.ROLE_HIERARCHY.get(role, 0)
+    return POLICY.levels.get(role, 0)
+
 
 def can_manage_user(admin_role, target_role):
     """Check if admin can manage a user of target_role"""
-    return get_role_hierarchy(admin_role) > get_role_hierarchy(target_role)
+    return bool(POLICY.manages.get(admin_role, 0) & POLICY.role_bits.get(target_role, 0))